@@ -1,30 +1,29 @@
 from __future__ import annotations
 
 import argparse
-from datetime import datetime
+import sys
 from pathlib import Path
 
 import pandas as pd
 
 
-def _parse_ts(s: str) -> datetime | None:
-    s = (s or "").strip()
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
+def _ensure_repo_root_on_sys_path() -> None:
+    # Repo root is the parent of this folder (analysis/).
+    root = Path(__file__).resolve().parents[1]
+    root_str = str(root)
+    if root_str not in sys.path:
+        sys.path.insert(0, root_str)
+
+
+_ensure_repo_root_on_sys_path()
+
+from mp_power.timebase import add_time_columns
 
 
 def add_time(df: pd.DataFrame) -> pd.DataFrame:
     out = df.copy()
-    if "ts_pc" in out.columns:
-        ts = out["ts_pc"].astype(str).map(_parse_ts)
-        if hasattr(ts, "dt") and ts.notna().any():
-            out["ts"] = ts
-            out["t_s"] = (ts - ts.iloc[0]).dt.total_seconds()
-            return out
+    if add_time_columns(out, datetime_col="ts"):
+        return out
 
     if "dt_s" in out.columns:
         dt = pd.to_numeric(out["dt_s"], errors="coerce").fillna(0.0)
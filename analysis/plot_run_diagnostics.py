@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from dataclasses import dataclass
-from datetime import datetime
 from pathlib import Path
 
 import matplotlib
@@ -12,14 +12,23 @@ import matplotlib.pyplot as plt
 import pandas as pd
 
 
-def _parse_ts(s: str) -> datetime | None:
-    s = (s or "").strip()
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
+def _ensure_repo_root_on_sys_path() -> None:
+    # Repo root is the parent of this folder (analysis/).
+    root = Path(__file__).resolve().parents[1]
+    root_str = str(root)
+    if root_str not in sys.path:
+        sys.path.insert(0, root_str)
+
+
+_ensure_repo_root_on_sys_path()
+
+from mp_power.downsample import SeriesPyramid
+from mp_power.downsample import downsample_xy
+from mp_power.downsample import load_pyramid
+from mp_power.downsample import plot_points
+from mp_power.timebase import add_time_columns
+
+PLOT_DPI = 170
 
 
 def _to_num(df: pd.DataFrame, col: str) -> pd.Series:
@@ -55,13 +64,11 @@ def _infer_label(df: pd.DataFrame, fallback: str) -> tuple[str, float | None]:
 
 def add_time_index(df: pd.DataFrame) -> pd.DataFrame:
     out = df.copy()
-    if "ts_pc" in out.columns:
-        ts = out["ts_pc"].astype(str).map(_parse_ts)
-        if hasattr(ts, "dt") and ts.notna().any():
-            out["ts"] = ts
-            out["t_s"] = (ts - ts.iloc[0]).dt.total_seconds()
+    if add_time_columns(out, datetime_col="ts"):
+        if out["ts"].notna().all():
+            # Time-based rolling windows need a complete DatetimeIndex.
             out = out.set_index("ts", drop=False)
-            return out
+        return out
 
     # Fallback to cumulative dt_s
     dt_s = _to_num(out, "dt_s").fillna(0.0)
@@ -107,29 +114,23 @@ def add_derived(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def _load_perfetto_timeseries(report_dir: Path) -> pd.DataFrame | None:
+def _load_perfetto_timeseries(report_dir: Path) -> SeriesPyramid | None:
+    """Min/max pyramid of perfetto_android_power_timeseries.csv (built and cached on first use)."""
     ts_path = report_dir / "perfetto_android_power_timeseries.csv"
     if not ts_path.exists():
         return None
     try:
-        pf = pd.read_csv(ts_path)
+        return load_pyramid(ts_path, time_col="t_s")
     except Exception:
         return None
 
-    if "t_s" not in pf.columns:
-        return None
-
-    # Coerce numerics; keep only relevant columns if present.
-    keep = [c for c in ["t_s", "batt.charge_uah", "batt.current_ua", "batt.voltage_uv", "power_mw_calc"] if c in pf.columns]
-    pf = pf[keep].copy()
-    for c in keep:
-        pf[c] = pd.to_numeric(pf[c], errors="coerce")
 
-    # Add discharge-from-start for easier comparison with charge_counter steps.
-    if "batt.charge_uah" in pf.columns and pf["batt.charge_uah"].notna().any():
-        start = float(pf["batt.charge_uah"].dropna().iloc[0])
-        pf["batt.discharge_uah"] = start - pf["batt.charge_uah"]
-    return pf
+def _plot_ds(ax: plt.Axes, x: object, y: object, n_px: int, *, step: bool = False, **kw: object) -> None:
+    xs, ys = downsample_xy(x, y, n_px)
+    if step:
+        ax.step(xs, ys, where="post", **kw)
+    else:
+        ax.plot(xs, ys, **kw)
 
 
 def _rolling_mean(s: pd.Series, df: pd.DataFrame, seconds: int) -> pd.Series:
@@ -140,22 +141,25 @@ def _rolling_mean(s: pd.Series, df: pd.DataFrame, seconds: int) -> pd.Series:
     return s.rolling(n, min_periods=1).mean()
 
 
-def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s: int, perfetto_ts: pd.DataFrame | None = None) -> None:
+def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s: int, perfetto_ts: SeriesPyramid | None = None) -> None:
     cols = set(df.columns)
 
     fig, axes = plt.subplots(6, 1, figsize=(12, 16), sharex=True)
-    x = df["t_s"] if "t_s" in cols else range(len(df))
+    x = df["t_s"] if "t_s" in cols else pd.Series(range(len(df)), dtype=float)
+    n_px = plot_points(fig, axes[0], dpi=PLOT_DPI)
 
     # 1) charge_counter (step-like)
     if "charge_counter_uAh" in cols:
-        axes[0].step(x, df["charge_counter_uAh"], where="post", label="charge_counter_uAh")
+        _plot_ds(axes[0], x, df["charge_counter_uAh"], n_px, step=True, label="charge_counter_uAh")
 
     # If perfetto android.power exists, overlay discharge curve (usually much higher sample rate)
-    if perfetto_ts is not None and "batt.discharge_uah" in perfetto_ts.columns and perfetto_ts["batt.discharge_uah"].notna().any():
+    if perfetto_ts is not None and perfetto_ts.has("batt.charge_uah"):
+        # Discharge-from-start for easier comparison with charge_counter steps.
+        pf_t, pf_charge = perfetto_ts.envelope("batt.charge_uah", n_px)
         ax0b = axes[0].twinx()
         ax0b.plot(
-            perfetto_ts["t_s"],
-            perfetto_ts["batt.discharge_uah"],
+            pf_t,
+            perfetto_ts.first["batt.charge_uah"] - pf_charge,
             label="perfetto discharge_uAh (from batt.charge_uah)",
             color="tab:green",
             alpha=0.7,
@@ -169,7 +173,7 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     # 2) d_charge per sample
     if "d_charge_uAh" in cols:
-        axes[1].plot(x, df["d_charge_uAh"], label="d_charge_uAh", color="tab:purple")
+        _plot_ds(axes[1], x, df["d_charge_uAh"], n_px, label="d_charge_uAh", color="tab:purple")
     axes[1].axhline(0, color="black", linewidth=0.8)
     axes[1].set_ylabel("uAh/step")
     axes[1].grid(True, alpha=0.3)
@@ -177,41 +181,42 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     # 3) discharge power (raw)
     if "batt_discharge_power_mW_energy" in cols and df["batt_discharge_power_mW_energy"].notna().any():
-        axes[2].plot(x, df["batt_discharge_power_mW_energy"], label="P_discharge (mW) from energy", color="tab:green", alpha=0.7)
-        axes[2].plot(
+        _plot_ds(axes[2], x, df["batt_discharge_power_mW_energy"], n_px, label="P_discharge (mW) from energy", color="tab:green", alpha=0.7)
+        _plot_ds(
+            axes[2],
             x,
             _rolling_mean(df["batt_discharge_power_mW_energy"], df, rolling_s),
+            n_px,
             label=f"P_discharge rolling mean ({rolling_s}s)",
             color="tab:green",
             linewidth=2.0,
         )
     if "batt_discharge_power_mW_cc" in cols and df["batt_discharge_power_mW_cc"].notna().any():
-        axes[2].plot(x, df["batt_discharge_power_mW_cc"], label="P_discharge (mW) from charge_counter", color="tab:olive", alpha=0.35)
+        _plot_ds(axes[2], x, df["batt_discharge_power_mW_cc"], n_px, label="P_discharge (mW) from charge_counter", color="tab:olive", alpha=0.35)
 
     # Screen estimate (if available) as an explanatory component
     if "screen_power_mW_est" in cols and df["screen_power_mW_est"].notna().any():
-        axes[2].plot(x, df["screen_power_mW_est"], label="P_screen est (mW) from power_profile", color="tab:orange", alpha=0.25)
-        axes[2].plot(
+        _plot_ds(axes[2], x, df["screen_power_mW_est"], n_px, label="P_screen est (mW) from power_profile", color="tab:orange", alpha=0.25)
+        _plot_ds(
+            axes[2],
             x,
             _rolling_mean(df["screen_power_mW_est"], df, rolling_s),
+            n_px,
             label=f"P_screen est rolling mean ({rolling_s}s)",
             color="tab:orange",
             linewidth=2.0,
         )
 
     # Perfetto power (preferred when available)
-    if perfetto_ts is not None and "power_mw_calc" in perfetto_ts.columns and perfetto_ts["power_mw_calc"].notna().any():
-        pfp = perfetto_ts["power_mw_calc"]
+    if perfetto_ts is not None and perfetto_ts.has("power_mw_calc"):
         axes[2].plot(
-            perfetto_ts["t_s"],
-            pfp,
+            *perfetto_ts.envelope("power_mw_calc", n_px),
             label="P_discharge (mW) perfetto calc",
             color="tab:pink",
             alpha=0.25,
         )
         axes[2].plot(
-            perfetto_ts["t_s"],
-            pfp.rolling(max(1, int(rolling_s / 0.25)), min_periods=1).mean(),
+            *perfetto_ts.rolling_mean("power_mw_calc", rolling_s, n_px),
             label=f"P_perfetto rolling mean (~{rolling_s}s)",
             color="tab:pink",
             linewidth=2.0,
@@ -219,24 +224,30 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     # If current_now/current_average exist, plot them (often much smoother than charge_counter deltas)
     if "batt_discharge_power_mW_current_now" in cols and df["batt_discharge_power_mW_current_now"].notna().any():
-        axes[2].plot(
+        _plot_ds(
+            axes[2],
             x,
             df["batt_discharge_power_mW_current_now"],
+            n_px,
             label="P_discharge (mW) from current_now",
             color="tab:cyan",
             alpha=0.35,
         )
-        axes[2].plot(
+        _plot_ds(
+            axes[2],
             x,
             _rolling_mean(df["batt_discharge_power_mW_current_now"], df, rolling_s),
+            n_px,
             label=f"P_current_now rolling mean ({rolling_s}s)",
             color="tab:cyan",
             linewidth=2.0,
         )
     if "batt_discharge_power_mW_current_avg" in cols and df["batt_discharge_power_mW_current_avg"].notna().any():
-        axes[2].plot(
+        _plot_ds(
+            axes[2],
             x,
             df["batt_discharge_power_mW_current_avg"],
+            n_px,
             label="P_discharge (mW) from current_average",
             color="tab:blue",
             alpha=0.25,
@@ -247,10 +258,12 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     # 4) CPU power
     if "cpu_power_mW_total" in cols and df["cpu_power_mW_total"].notna().any():
-        axes[3].plot(x, df["cpu_power_mW_total"], label="cpu_power_mW_total", color="tab:blue", alpha=0.7)
-        axes[3].plot(
+        _plot_ds(axes[3], x, df["cpu_power_mW_total"], n_px, label="cpu_power_mW_total", color="tab:blue", alpha=0.7)
+        _plot_ds(
+            axes[3],
             x,
             _rolling_mean(df["cpu_power_mW_total"], df, rolling_s),
+            n_px,
             label=f"cpu_power rolling mean ({rolling_s}s)",
             color="tab:blue",
             linewidth=2.0,
@@ -261,21 +274,21 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     # 5) voltage / thermal
     if "battery_voltage_mv" in cols and df["battery_voltage_mv"].notna().any():
-        axes[4].plot(x, df["battery_voltage_mv"], label="battery_voltage_mv", color="tab:red")
+        _plot_ds(axes[4], x, df["battery_voltage_mv"], n_px, label="battery_voltage_mv", color="tab:red")
     thermal_cols = [c for c in df.columns if c.startswith("thermal_") and c.endswith("_C")]
     if thermal_cols:
         for c in thermal_cols:
-            axes[4].plot(x, df[c], label=c, alpha=0.6)
+            _plot_ds(axes[4], x, df[c], n_px, label=c, alpha=0.6)
     axes[4].set_ylabel("mV / C")
     axes[4].grid(True, alpha=0.3)
     axes[4].legend(loc="best", ncols=2)
 
     # 6) brightness / dt
     if "brightness" in cols and df["brightness"].notna().any():
-        axes[5].plot(x, df["brightness"], label="brightness", color="tab:orange")
+        _plot_ds(axes[5], x, df["brightness"], n_px, label="brightness", color="tab:orange")
     if "dt_s" in cols and df["dt_s"].notna().any():
         ax2 = axes[5].twinx()
-        ax2.plot(x, df["dt_s"], label="dt_s", color="tab:gray", alpha=0.4)
+        _plot_ds(ax2, x, df["dt_s"], n_px, label="dt_s", color="tab:gray", alpha=0.4)
         ax2.set_ylabel("dt_s")
         ax2.legend(loc="upper right")
     axes[5].set_ylabel("brightness")
@@ -284,7 +297,7 @@ def plot_single_run(df: pd.DataFrame, info: RunInfo, out_path: Path, rolling_s:
 
     axes[-1].set_xlabel("t (s)")
     fig.tight_layout()
-    fig.savefig(out_path, dpi=170)
+    fig.savefig(out_path, dpi=PLOT_DPI)
     plt.close(fig)
 
 
@@ -295,6 +308,7 @@ def plot_overlay_power(
     power_source: str = "preferred",
 ) -> None:
     fig, axes = plt.subplots(3, 1, figsize=(12, 10), sharex=True)
+    n_px = plot_points(fig, axes[0], dpi=PLOT_DPI)
 
     for df, info in runs:
         x = df["t_s"]
@@ -303,23 +317,23 @@ def plot_overlay_power(
         if ps in ("cc", "charge_counter", "charge-counter"):
             p = df.get("batt_discharge_power_mW_cc")
             if p is not None and pd.to_numeric(p, errors="coerce").notna().any():
-                axes[0].plot(x, _rolling_mean(pd.to_numeric(p, errors="coerce"), df, rolling_s), label=f"{info.label} (charge_counter)")
+                _plot_ds(axes[0], x, _rolling_mean(pd.to_numeric(p, errors="coerce"), df, rolling_s), n_px, label=f"{info.label} (charge_counter)")
         else:
             # Prefer current_now if present; fallback to energy-derived
             if "batt_discharge_power_mW_current_now" in df.columns and df["batt_discharge_power_mW_current_now"].notna().any():
                 p = df["batt_discharge_power_mW_current_now"]
-                axes[0].plot(x, _rolling_mean(p, df, rolling_s), label=f"{info.label} (current_now)")
+                _plot_ds(axes[0], x, _rolling_mean(p, df, rolling_s), n_px, label=f"{info.label} (current_now)")
             else:
                 p = df["batt_discharge_power_mW_energy"]
                 if p.notna().any():
-                    axes[0].plot(x, _rolling_mean(p, df, rolling_s), label=f"{info.label} (energy)")
+                    _plot_ds(axes[0], x, _rolling_mean(p, df, rolling_s), n_px, label=f"{info.label} (energy)")
 
         cpu = df["cpu_power_mW_total"]
         if cpu.notna().any():
-            axes[1].plot(x, _rolling_mean(cpu, df, rolling_s), label=info.label)
+            _plot_ds(axes[1], x, _rolling_mean(cpu, df, rolling_s), n_px, label=info.label)
 
         if "thermal_battery_C" in df.columns and pd.to_numeric(df["thermal_battery_C"], errors="coerce").notna().any():
-            axes[2].plot(x, df["thermal_battery_C"], label=info.label)
+            _plot_ds(axes[2], x, df["thermal_battery_C"], n_px, label=info.label)
 
     axes[0].set_ylabel(f"P_discharge rolling mean (mW, {rolling_s}s)")
     axes[1].set_ylabel(f"CPU power rolling mean (mW, {rolling_s}s)")
@@ -331,7 +345,7 @@ def plot_overlay_power(
         ax.legend(loc="best", ncols=2)
 
     fig.tight_layout()
-    fig.savefig(out_path, dpi=170)
+    fig.savefig(out_path, dpi=PLOT_DPI)
     plt.close(fig)
 
 
@@ -378,6 +392,7 @@ def plot_cumulative_discharge_normalized(
     rows: list[dict[str, object]] = []
 
     fig, ax = plt.subplots(1, 1, figsize=(12, 6))
+    n_px = plot_points(fig, ax, dpi=PLOT_DPI)
     for df, info in runs:
         cum = _cumulative_discharge_uAh(df)
         t_s = pd.to_numeric(df["t_s"], errors="coerce")
@@ -395,7 +410,7 @@ def plot_cumulative_discharge_normalized(
             continue
         dn = cum / final
 
-        ax.step(tn, dn, where="post", label=info.label)
+        _plot_ds(ax, tn, dn, n_px, step=True, label=info.label)
 
         # Quantify how early the discharge accumulates
         row: dict[str, object] = {
@@ -424,7 +439,7 @@ def plot_cumulative_discharge_normalized(
     ax.grid(True, alpha=0.3)
     ax.legend(loc="best", ncols=2)
     fig.tight_layout()
-    fig.savefig(out_path, dpi=170)
+    fig.savefig(out_path, dpi=PLOT_DPI)
     plt.close(fig)
 
     return pd.DataFrame(rows)
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import subprocess
+import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO, Callable
 
 
 def default_adb_candidates() -> list[str]:
@@ -76,6 +79,146 @@ def adb_exec_out(adb: str, serial: str | None, args: list[str], timeout_s: float
     return proc.returncode, proc.stdout, proc.stderr.decode("utf-8", errors="replace")
 
 
+def adb_exec_out_stream(
+    adb: str,
+    serial: str | None,
+    args: list[str],
+    sink: BinaryIO,
+    *,
+    timeout_s: float,
+    chunk_size: int = 1 << 20,
+    on_chunk: Callable[[bytes], None] | None = None,
+) -> tuple[int, int, str]:
+    """Like adb_exec_out, but streams stdout into `sink` chunk by chunk instead of buffering it.
+
+    Returns (rc, bytes_written, stderr). On timeout the adb process is killed and rc is 124;
+    bytes already written stay in `sink` so the caller can resume.
+    """
+    cmd = [adb]
+    if serial:
+        cmd += ["-s", serial]
+    cmd += ["exec-out", *args]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert proc.stdout is not None and proc.stderr is not None
+
+    timed_out = threading.Event()
+
+    def on_timeout() -> None:
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout_s, on_timeout)
+    timer.daemon = True
+    timer.start()
+    written = 0
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            sink.write(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+            written += len(chunk)
+        err = proc.stderr.read().decode("utf-8", errors="replace")
+        rc = proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+    if timed_out.is_set():
+        return 124, written, f"TimeoutExpired after {timeout_s:.0f}s. {err}".strip()
+    return rc, written, err
+
+
+def remote_file_size(adb: str, serial: str | None, remote: str, timeout_s: float = 10.0) -> int | None:
+    rc, out, _ = adb_shell(adb, serial, ["stat", "-c", "%s", remote], timeout_s=timeout_s)
+    if rc != 0:
+        return None
+    try:
+        return int(out.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return None
+
+
+@dataclass(frozen=True)
+class PullResult:
+    remote: str
+    local: Path
+    size_bytes: int
+    remote_size: int | None
+    sha256: str
+    attempts: int
+    resumed: bool
+
+
+def pull_file_exec_out(
+    adb: str,
+    serial: str | None,
+    remote: str,
+    local: Path,
+    *,
+    retries: int = 3,
+    timeout_s: float | None = None,
+    min_rate_bps: float = 256 * 1024,
+    chunk_size: int = 1 << 20,
+) -> PullResult:
+    """Binary-safe pull via `adb exec-out cat`, streamed to disk while hashing.
+
+    The remote size (`stat -c %s`) is checked after each attempt. An interrupted transfer is
+    resumed with `tail -c +N` from the bytes already on disk rather than restarted. Without an
+    explicit timeout, each attempt gets 60 s plus the size at `min_rate_bps` (slow Wi-Fi debugging).
+    """
+    remote_size = remote_file_size(adb, serial, remote)
+    if timeout_s is None:
+        timeout_s = 60.0 + (float(remote_size) / float(min_rate_bps) if remote_size else 0.0)
+
+    local.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    written = 0
+    resumed = False
+    last_err = ""
+    attempts = 0
+    with local.open("wb") as f:
+        for attempt in range(1, int(retries) + 2):
+            attempts = attempt
+            if written == 0:
+                args = ["cat", remote]
+            else:
+                args = ["tail", "-c", f"+{written + 1}", remote]
+                resumed = True
+            rc, n, err = adb_exec_out_stream(
+                adb, serial, args, f, timeout_s=float(timeout_s), chunk_size=chunk_size, on_chunk=h.update
+            )
+            written += n
+            if rc == 0 and (remote_size is None or written == remote_size):
+                break
+
+            last_err = err.strip() or f"exit={rc}"
+            if remote_size is not None and written > remote_size:
+                # Stream is inconsistent with the file on device: start over.
+                last_err = f"received {written} bytes > remote size {remote_size}"
+                f.seek(0)
+                f.truncate()
+                h = hashlib.sha256()
+                written = 0
+            elif rc == 0:
+                last_err = f"short read: {written}/{remote_size} bytes"
+            time.sleep(min(5.0, 0.5 * attempt))
+        else:
+            raise RuntimeError(f"pull {remote} failed after {attempts} attempts: {last_err}")
+
+    return PullResult(
+        remote=remote,
+        local=local,
+        size_bytes=written,
+        remote_size=remote_size,
+        sha256=h.hexdigest(),
+        attempts=attempts,
+        resumed=resumed,
+    )
+
+
 def list_devices(adb: str, timeout_s: float) -> list[tuple[str, str]]:
     """Return [(serial, state)] from `adb devices` (state is usually 'device', 'offline', 'unauthorized')."""
     rc, out, err = run_adb(adb, ["devices"], timeout_s=timeout_s)
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from statistics import NormalDist
+
+from mp_power.live import CsvTail
+from mp_power.timebase import cell_to_ns
+from mp_power.timebase import time_column
+
+
+# Sequential stopping for pipeline_run --stop-when-converged: the run CSV is tailed while the sampler
+# writes it, each interval contributes (dt, charge-counter discharge energy), and the mean discharge
+# power gets a batch-means confidence interval. Sampling ends once the CI half-width is below the
+# target (after a minimum time), or at the maximum duration.
+
+
+@dataclass
+class ConvergenceConfig:
+    min_s: float = 120.0
+    rel: float = 0.01  # CI half-width target relative to the mean (0 disables)
+    abs_mw: float = 5.0  # CI half-width target in mW (0 disables); either target is enough
+    confidence: float = 0.95
+    max_batches: int = 20
+    min_batches: int = 10
+    skip_s: float = 0.0  # warm-up excluded from the estimate
+
+
+@dataclass
+class ConvergenceStatus:
+    elapsed_s: float = 0.0
+    rows: int = 0
+    batches: int = 0
+    mean_mW: float | None = None
+    half_width_mW: float | None = None
+    target_mW: float | None = None
+    lag1_autocorr: float | None = None
+    converged: bool = False
+    converged_at_s: float | None = None
+    config: dict = field(default_factory=dict)
+
+
+def t_quantile(p: float, dof: int) -> float:
+    """Student-t quantile (Cornish-Fisher expansion around the normal quantile; ~1e-3 for dof >= 5)."""
+    z = NormalDist().inv_cdf(p)
+    v = float(max(1, dof))
+    g1 = (z**3 + z) / 4.0
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96.0
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384.0
+    return z + g1 / v + g2 / v**2 + g3 / v**3
+
+
+def batch_means_ci(
+    dt_s: list[float], energy_mj: list[float], *, confidence: float = 0.95, max_batches: int = 20, min_batches: int = 10
+) -> tuple[float | None, float | None, int, float | None]:
+    """Mean power (mW) and CI half-width from per-interval (dt, energy) pairs.
+
+    Contiguous intervals are grouped into at most `max_batches` batches of equal row count (the oldest
+    remainder rows are left out of the batches, not of the mean); each batch mean is energy/time. The
+    half-width is inflated by sqrt((1+r)/(1-r)) for a positive lag-1 autocorrelation r of the batch
+    means, so slow drift (warm-up, thermal) keeps the interval open. Returns
+    (mean, half_width, batches, r); half_width is None with fewer than `min_batches` batches.
+    """
+    total_s = sum(dt_s)
+    if total_s <= 0:
+        return None, None, 0, None
+    mean = sum(energy_mj) / total_s
+    n = len(dt_s)
+    b = min(int(max_batches), n)
+    if b < max(2, int(min_batches)):
+        return mean, None, b, None
+    size = n // b
+    start = n - b * size
+    means: list[float] = []
+    for i in range(b):
+        lo = start + i * size
+        t = sum(dt_s[lo : lo + size])
+        if t <= 0:
+            return mean, None, b, None
+        means.append(sum(energy_mj[lo : lo + size]) / t)
+    m = sum(means) / b
+    var = sum((x - m) ** 2 for x in means) / (b - 1)
+    half = t_quantile(0.5 + float(confidence) / 2.0, b - 1) * math.sqrt(var / b)
+    r = None
+    if var > 0:
+        r = sum((means[i] - m) * (means[i + 1] - m) for i in range(b - 1)) / (var * (b - 1))
+        if r > 0:
+            half *= math.sqrt((1 + min(r, 0.9)) / (1 - min(r, 0.9)))
+    return mean, half, b, r
+
+
+class ConvergenceMonitor:
+    """Tail a run CSV and decide when mean discharge power has converged."""
+
+    def __init__(self, run_csv: Path, cfg: ConvergenceConfig) -> None:
+        self.cfg = cfg
+        self._tail = CsvTail(run_csv)
+        self._idx: dict[str, int] | None = None
+        self._time_col: str | None = None
+        self._first_ns: int | None = None
+        self._prev_ns: int | None = None
+        self._prev_cc: int | None = None
+        self._dt: list[float] = []
+        self._e: list[float] = []
+        self.status = ConvergenceStatus(config=asdict(cfg))
+
+    def _add_row(self, row: list[str]) -> None:
+        assert self._idx is not None and self._time_col is not None
+
+        def cell(name: str) -> str:
+            i = self._idx.get(name)  # type: ignore[union-attr]
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        ns = cell_to_ns(self._time_col, cell(self._time_col))
+        if ns is None:
+            return
+        if self._first_ns is None:
+            self._first_ns = ns
+        self.status.rows += 1
+        self.status.elapsed_s = (ns - self._first_ns) / 1e9
+        try:
+            cc: int | None = int(float(cell("charge_counter_uAh")))
+            v_mv: float | None = float(cell("battery_voltage_mv"))
+        except ValueError:
+            cc, v_mv = None, None
+        if cc is None or v_mv is None:
+            # Skip the interval; the next valid one spans the gap (same as enrich).
+            return
+        prev_ns, prev_cc = self._prev_ns, self._prev_cc
+        self._prev_ns, self._prev_cc = ns, cc
+        if prev_ns is None or prev_cc is None or ns <= prev_ns:
+            return
+        if (prev_ns - self._first_ns) / 1e9 < float(self.cfg.skip_s):
+            return
+        self._dt.append((ns - prev_ns) / 1e9)
+        self._e.append(-(cc - prev_cc) * v_mv * 0.0036)
+
+    def poll(self, *, final: bool = False) -> ConvergenceStatus:
+        text = self._tail.read_complete(final=final)
+        if self._idx is None:
+            header = self._tail.header
+            if header is None:
+                return self.status
+            self._idx = {c: i for i, c in enumerate(header)}
+            self._time_col = time_column(header)
+            if self._time_col is None:
+                raise RuntimeError("run CSV has neither ts_ns nor ts_pc")
+        if text:
+            for row in csv.reader(io.StringIO(text)):
+                if row:
+                    self._add_row(row)
+
+        s = self.status
+        s.mean_mW, s.half_width_mW, s.batches, s.lag1_autocorr = batch_means_ci(
+            self._dt,
+            self._e,
+            confidence=self.cfg.confidence,
+            max_batches=self.cfg.max_batches,
+            min_batches=self.cfg.min_batches,
+        )
+        targets = [float(self.cfg.abs_mw)] if self.cfg.abs_mw > 0 else []
+        if self.cfg.rel > 0 and s.mean_mW is not None:
+            targets.append(float(self.cfg.rel) * abs(s.mean_mW))
+        s.target_mW = max(targets) if targets else None
+        if (
+            not s.converged
+            and s.elapsed_s >= float(self.cfg.min_s)
+            and s.half_width_mW is not None
+            and s.target_mW is not None
+            and s.half_width_mW <= s.target_mW
+        ):
+            s.converged = True
+            s.converged_at_s = round(s.elapsed_s, 3)
+        return s
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        obj = asdict(self.status)
+        obj["written_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def describe(s: ConvergenceStatus) -> str:
+    def fmt(v: float | None, spec: str = ".1f") -> str:
+        return "n/a" if v is None else format(v, spec)
+
+    return (
+        f"t={s.elapsed_s:.0f}s mean={fmt(s.mean_mW)}mW ±{fmt(s.half_width_mW)}mW "
+        f"(target {fmt(s.target_mW)}mW, {s.batches} batches, r1={fmt(s.lag1_autocorr, '.2f')})"
+    )
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from mp_power.profiling import span
+
+
+# Stage executor for pipeline_run: stages declare deps, input files and output files; a stage runs on a
+# worker thread as soon as its deps finish, and is skipped when its cache key (stage name + params +
+# sha256 of every input + dep keys) matches the cache file and all outputs still exist.
+
+STAGE_CACHE_VERSION = 1
+STAGE_CACHE_NAME = "stage_cache.json"
+STAGE_TIMINGS_NAME = "stage_timings.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    # None marks a stage satisfied outside the graph (e.g. live enrichment already wrote the output).
+    fn: Callable[[], object] | None
+    deps: tuple[str, ...] = ()
+    inputs: tuple[Path, ...] = ()
+    outputs: tuple[Path, ...] = ()
+    params: object = None  # JSON-serialisable; anything besides the inputs that changes the outputs
+    cache: bool = True  # False for device-bound or print-only stages
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str  # ran | cached | external | skipped | error
+    seconds: float = 0.0
+    started_s: float | None = None  # offset from the graph start
+    key: str = ""
+    deps: list[str] = field(default_factory=list)
+    error: str = ""
+
+
+def _sha256_file(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for b in iter(lambda: f.read(chunk), b""):
+            h.update(b)
+    return h.hexdigest()
+
+
+def stage_key(stage: Stage, dep_keys: dict[str, str]) -> str:
+    h = hashlib.sha256()
+    h.update(f"stage-v{STAGE_CACHE_VERSION}\n{stage.name}\n".encode("utf-8"))
+    h.update(json.dumps(stage.params, sort_keys=True, default=str).encode("utf-8"))
+    for p in stage.inputs:
+        h.update(f"\n{Path(p).as_posix()}\n".encode("utf-8"))
+        h.update((_sha256_file(p) if Path(p).is_file() else "<missing>").encode("utf-8"))
+    for d in stage.deps:
+        h.update(f"\ndep:{d}={dep_keys.get(d, '')}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_stage_cache(path: Path) -> dict[str, str]:
+    """stage name -> cache key; {} when the cache file is missing, unreadable or from another version."""
+    try:
+        obj = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if not isinstance(obj, dict) or obj.get("version") != STAGE_CACHE_VERSION:
+        return {}
+    keys = obj.get("stages")
+    return {str(k): str(v) for k, v in keys.items()} if isinstance(keys, dict) else {}
+
+
+def _call_stage(name: str, fn: Callable[[], object]) -> object:
+    # Stage spans are the roots of the sub-stage spans recorded on the worker thread (e.g. enrich/compute).
+    with span(name):
+        return fn()
+
+
+def _write_json_atomic(path: Path, obj: object) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class StageGraph:
+    """A small DAG of pipeline stages run on a thread pool with a content-hash cache."""
+
+    def __init__(self, *, cache_path: Path | None = None, jobs: int = 4, force: bool = False) -> None:
+        self.cache_path = cache_path
+        self.jobs = max(1, int(jobs))
+        self.force = bool(force)
+        self.stages: dict[str, Stage] = {}
+        self.results: dict[str, StageResult] = {}  # filled as stages finish (also when run() raises)
+
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"duplicate stage: {stage.name}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def _check(self) -> None:
+        for s in self.stages.values():
+            for d in s.deps:
+                if d not in self.stages:
+                    raise ValueError(f"stage {s.name} depends on unknown stage {d}")
+        # Kahn's algorithm: every stage must become ready eventually.
+        indeg = {n: len(s.deps) for n, s in self.stages.items()}
+        ready = [n for n, k in indeg.items() if k == 0]
+        seen = 0
+        while ready:
+            n = ready.pop()
+            seen += 1
+            for m, s in self.stages.items():
+                if n in s.deps:
+                    indeg[m] -= 1
+                    if indeg[m] == 0:
+                        ready.append(m)
+        if seen != len(self.stages):
+            raise ValueError("stage graph has a cycle")
+
+    def run(self) -> dict[str, StageResult]:
+        """Run every stage; re-raises the first stage failure after the running stages finish."""
+        self._check()
+        cache = {} if self.cache_path is None else load_stage_cache(self.cache_path)
+        results = self.results = {}
+        keys: dict[str, str] = {}
+        t0 = time.perf_counter()
+        running: dict[Future, str] = {}
+        started: dict[str, float] = {}
+        failure: BaseException | None = None
+
+        def finish(name: str, status: str, *, error: str = "") -> None:
+            st = started.get(name)
+            results[name] = StageResult(
+                name=name,
+                status=status,
+                seconds=round(time.perf_counter() - t0 - st, 3) if st is not None else 0.0,
+                started_s=round(st, 3) if st is not None else None,
+                key=keys.get(name, ""),
+                deps=list(self.stages[name].deps),
+                error=error,
+            )
+
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="stage") as pool:
+            while len(results) < len(self.stages):
+                for name, s in self.stages.items():
+                    if name in results or name in started:
+                        continue
+                    if any(results.get(d) is not None and results[d].status in ("error", "skipped") for d in s.deps):
+                        finish(name, "skipped", error="dependency failed")
+                        continue
+                    if failure is not None or not all(d in results for d in s.deps):
+                        continue
+                    if s.fn is None:
+                        finish(name, "external")
+                        continue
+                    keys[name] = stage_key(s, keys)
+                    if (
+                        s.cache
+                        and not self.force
+                        and cache.get(name) == keys[name]
+                        and all(Path(o).exists() for o in s.outputs)
+                    ):
+                        finish(name, "cached")
+                        print(f"Stage {name}: cached")
+                        continue
+                    started[name] = time.perf_counter() - t0
+                    running[pool.submit(_call_stage, name, s.fn)] = name
+
+                if not running:
+                    if failure is not None:
+                        # Nothing left that can run; everything else waits on a failed stage or was never started.
+                        for name in self.stages:
+                            if name not in results:
+                                finish(name, "skipped", error="pipeline stopped")
+                    continue
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    exc = fut.exception()
+                    if exc is None:
+                        finish(name, "ran")
+                        if self.stages[name].cache:
+                            cache[name] = keys[name]
+                    else:
+                        finish(name, "error", error=f"{type(exc).__name__}: {exc}")
+                        cache.pop(name, None)
+                        if failure is None:
+                            failure = exc
+
+        if self.cache_path is not None:
+            try:
+                _write_json_atomic(self.cache_path, {"version": STAGE_CACHE_VERSION, "stages": cache})
+            except Exception as e:
+                print(f"WARN: could not write stage cache {self.cache_path}: {e}")
+        if failure is not None:
+            raise failure
+        return results
+
+
+def write_stage_timings(results: list[StageResult], path: Path, *, profile: dict | None = None) -> Path:
+    """Write per-stage status/timing rows (JSON) for the report dir, plus the --profile spans if given."""
+    obj: dict[str, object] = {
+        "written_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        # Sum of stage run times; exceeds the wall time when stages overlap.
+        "busy_s": round(sum(r.seconds for r in results if r.status == "ran"), 3),
+        "stages": [asdict(r) for r in results],
+    }
+    if profile is not None:
+        obj["profile"] = profile
+    _write_json_atomic(path, obj)
+    return path
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import csv
+import html
+import io
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from mp_power.live import CsvTail
+from mp_power.timebase import TS_PC_COL
+from mp_power.timebase import cell_to_ns
+from mp_power.timebase import time_column
+
+
+THERMAL_STATUS_NAMES = ("none", "light", "moderate", "severe", "critical", "emergency", "shutdown")
+BATTERY_STATUS_CHARGING = 2
+_SPARK = "▁▂▃▄▅▆▇█"
+
+
+@dataclass
+class DashboardSnapshot:
+    rows: int = 0
+    elapsed_s: float = 0.0
+    last_row_age_s: float | None = None
+    interval_s: float | None = None
+    window_s: float = 60.0
+    discharge_mW: float | None = None  # charge_counter deltas over the window
+    current_now_mW: float | None = None  # batteryproperties current_now, window mean
+    cpu_mW: float | None = None  # live-enriched CPU energy over the window
+    screen_mW: float | None = None
+    perfetto_mW: float | None = None  # latest parsed long-capture segment
+    perfetto_segments: int = 0
+    battery_level: str = ""
+    voltage_mv: str = ""
+    brightness: str = ""
+    display_state: str = ""
+    thermal_status: int | None = None
+    battery_temp_C: float | None = None
+    hottest: tuple[str, float] | None = None
+    charger_connected: bool | None = None  # from the latest row that reports it
+    adb_error_rate: float = 0.0
+    last_adb_error: str = ""
+    history_discharge: list[float] = field(default_factory=list)
+    history_cpu: list[float] = field(default_factory=list)
+    alerts: list[str] = field(default_factory=list)
+    updated_at: str = ""
+
+
+def _f(v: str | None) -> float | None:
+    try:
+        return float(v) if v not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def _ts(col: str, v: str | None) -> float | None:
+    ns = cell_to_ns(col, v)
+    return ns / 1e9 if ns is not None else None
+
+
+def _rate(window: deque, i_num: int) -> float | None:
+    dt = sum(w[1] for w in window if w[i_num] is not None)
+    if dt <= 0:
+        return None
+    return sum(w[i_num] for w in window if w[i_num] is not None) / dt
+
+
+def sparkline(values: list[float]) -> str:
+    vals = [v for v in values if v == v]
+    if not vals:
+        return ""
+    lo, hi = min(vals), max(vals)
+    span = hi - lo or 1.0
+    return "".join(_SPARK[min(len(_SPARK) - 1, int((v - lo) / span * len(_SPARK)))] if v == v else " " for v in values)
+
+
+class LiveDashboard:
+    """Rolling view of a run that is still being sampled.
+
+    Follows the sampler CSV (and the live-enriched CSV / Perfetto long-capture segments when
+    present) incrementally: each poll only parses bytes appended since the previous one.
+    `render_text` / `render_html` turn the latest snapshot into a terminal screen or a
+    self-refreshing HTML page.
+    """
+
+    def __init__(
+        self,
+        run_csv: Path,
+        *,
+        enriched_csv: Path | None = None,
+        perfetto_dir: Path | None = None,
+        html_out: Path | None = None,
+        terminal: bool = False,
+        window_s: float = 60.0,
+        refresh_s: float = 2.0,
+        history: int = 120,
+        stale_after_s: float = 15.0,
+    ) -> None:
+        self.run_csv = run_csv
+        self.enriched_csv = enriched_csv
+        self.perfetto_dir = perfetto_dir
+        self.html_out = html_out
+        self.terminal = terminal
+        self.refresh_s = float(refresh_s)
+        self.stale_after_s = float(stale_after_s)
+
+        self.snap = DashboardSnapshot(window_s=float(window_s))
+        self._run_tail = CsvTail(run_csv)
+        self._enr_tail = CsvTail(enriched_csv) if enriched_csv is not None else None
+        self._idx: dict[str, int] = {}
+        self._enr_idx: dict[str, int] = {}
+        self._time_col = TS_PC_COL
+        self._enr_time_col = TS_PC_COL
+        self._thermal_cols: list[str] = []
+        self._t_first: float | None = None
+        self._prev: tuple[float, float | None, float | None] | None = None  # (t, charge_uAh, voltage_mV)
+        # (t, dt, discharge_mJ, current_now_mJ, adb_error)
+        self._win: deque[tuple[float, float, float | None, float | None, bool]] = deque()
+        # (t, dt, cpu_mJ, screen_mJ)
+        self._enr_win: deque[tuple[float, float, float | None, float | None]] = deque()
+        self._history: deque[tuple[float, float]] = deque(maxlen=int(history))
+        self._last_row_mono: float | None = None
+        self._dts: deque[float] = deque(maxlen=50)
+        self._seg_sizes: dict[Path, int] = {}
+        self._seg_done: set[Path] = set()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---- ingestion ----
+
+    def _rows(self, tail: CsvTail, final: bool) -> tuple[list[str] | None, list[list[str]]]:
+        text = tail.read_complete(final=final)
+        return tail.header, (list(csv.reader(io.StringIO(text))) if text else [])
+
+    def _ingest_run(self, final: bool) -> None:
+        header, rows = self._rows(self._run_tail, final)
+        if header is None:
+            return
+        if not self._idx:
+            self._idx = {c: i for i, c in enumerate(header)}
+            self._thermal_cols = [c for c in header if c.startswith("thermal_") and c.endswith("_C")]
+            self._time_col = time_column(header) or TS_PC_COL
+        idx = self._idx
+        s = self.snap
+
+        def get(row: list[str], col: str) -> str:
+            i = idx.get(col)
+            return row[i] if i is not None and i < len(row) else ""
+
+        for row in rows:
+            s.rows += 1
+            t = _ts(self._time_col, get(row, self._time_col))
+            err = get(row, "adb_error").strip()
+            if err:
+                s.last_adb_error = err.splitlines()[0][:120]
+            for col, attr in (
+                ("battery_level", "battery_level"),
+                ("battery_voltage_mv", "voltage_mv"),
+                ("brightness", "brightness"),
+                ("display_state", "display_state"),
+            ):
+                v = get(row, col)
+                if v != "":
+                    setattr(s, attr, v)
+            st = _f(get(row, "thermal_status"))
+            if st is not None:
+                s.thermal_status = int(st)
+            bt = _f(get(row, "battery_temp_deciC"))
+            if bt is not None:
+                s.battery_temp_C = bt / 10.0
+            temps = [(c[len("thermal_") : -len("_C")], _f(get(row, c))) for c in self._thermal_cols]
+            temps = [(n, v) for n, v in temps if v is not None]
+            if temps:
+                s.hottest = max(temps, key=lambda nv: nv[1])
+            # The sampler writes the *_powered flags as 1/0 and battery_plugged as the plug type (0 = unplugged);
+            # battery_status alone misses a plugged-in phone that reports "full".
+            powered = [_f(get(row, c)) for c in ("battery_ac_powered", "battery_usb_powered", "battery_wireless_powered")]
+            plugged = _f(get(row, "battery_plugged"))
+            status = _f(get(row, "battery_status"))
+            if any(v is not None for v in powered) or plugged is not None or status is not None:
+                s.charger_connected = (
+                    any(v == 1 for v in powered) or plugged not in (None, 0) or status == BATTERY_STATUS_CHARGING
+                )
+
+            if t is None:
+                continue
+            if self._t_first is None:
+                self._t_first = t
+            charge = _f(get(row, "charge_counter_uAh"))
+            volt = _f(get(row, "battery_voltage_mv"))
+            cur = _f(get(row, "batteryproperties_current_now_uA"))
+            if self._prev is not None and t > self._prev[0]:
+                dt = t - self._prev[0]
+                self._dts.append(dt)
+                p_charge = self._prev[1]
+                dis = None
+                if charge is not None and p_charge is not None and volt is not None:
+                    dis = -(charge - p_charge) * 3.6 * volt / 1000.0
+                cur_mj = (-cur * volt / 1e6) * dt if cur is not None and volt is not None else None
+                self._win.append((t, dt, dis, cur_mj, bool(err)))
+            self._prev = (t, charge, volt)
+            s.elapsed_s = t - self._t_first
+        if rows:
+            self._last_row_mono = time.monotonic()
+
+    def _ingest_enriched(self, final: bool) -> None:
+        if self._enr_tail is None:
+            return
+        header, rows = self._rows(self._enr_tail, final)
+        if header is None:
+            return
+        if not self._enr_idx:
+            self._enr_idx = {c: i for i, c in enumerate(header)}
+            self._enr_time_col = time_column(header) or TS_PC_COL
+        idx = self._enr_idx
+
+        def get(row: list[str], col: str) -> str:
+            i = idx.get(col)
+            return row[i] if i is not None and i < len(row) else ""
+
+        for row in rows:
+            t, dt = _ts(self._enr_time_col, get(row, self._enr_time_col)), _f(get(row, "dt_s"))
+            if t is None or dt is None or dt <= 0:
+                continue
+            self._enr_win.append((t, dt, _f(get(row, "cpu_energy_mJ_total")), _f(get(row, "screen_energy_mJ_est"))))
+
+    def _ingest_perfetto(self, final: bool) -> None:
+        if self.perfetto_dir is None or not self.perfetto_dir.exists():
+            return
+        for p in sorted(self.perfetto_dir.glob("seg_*/perfetto_android_power_timeseries.csv")):
+            if p in self._seg_done:
+                continue
+            size = p.stat().st_size
+            # The segment parser writes the CSV in one go; take it once its size held for a poll.
+            if self._seg_sizes.get(p) != size and not final:
+                self._seg_sizes[p] = size
+                continue
+            self._seg_done.add(p)
+            vals: list[float] = []
+            with p.open("r", encoding="utf-8", newline="") as f:
+                for r in csv.DictReader(f):
+                    v = _f(r.get("power_mw_calc"))
+                    if v is not None:
+                        vals.append(v)
+            self.snap.perfetto_segments += 1
+            if vals:
+                self.snap.perfetto_mW = sum(vals) / len(vals)
+
+    def poll(self, *, final: bool = False) -> DashboardSnapshot:
+        self._ingest_run(final)
+        self._ingest_enriched(final)
+        self._ingest_perfetto(final)
+        s = self.snap
+
+        if self._prev is not None:
+            t_end = self._prev[0]
+            while self._win and t_end - self._win[0][0] >= s.window_s:
+                self._win.popleft()
+            while self._enr_win and t_end - self._enr_win[0][0] >= s.window_s:
+                self._enr_win.popleft()
+        s.discharge_mW = _rate(self._win, 2)
+        s.current_now_mW = _rate(self._win, 3)
+        s.cpu_mW = _rate(self._enr_win, 2)
+        s.screen_mW = _rate(self._enr_win, 3)
+        s.adb_error_rate = sum(1 for w in self._win if w[4]) / len(self._win) if self._win else 0.0
+        if self._dts:
+            s.interval_s = sorted(self._dts)[len(self._dts) // 2]
+        if self._last_row_mono is not None:
+            s.last_row_age_s = time.monotonic() - self._last_row_mono
+
+        if s.discharge_mW is not None or s.cpu_mW is not None:
+            nan = float("nan")
+            self._history.append((s.discharge_mW if s.discharge_mW is not None else nan, s.cpu_mW if s.cpu_mW is not None else nan))
+        s.history_discharge = [h[0] for h in self._history]
+        s.history_cpu = [h[1] for h in self._history]
+
+        s.alerts = ["charger connected"] if s.charger_connected else []
+        stale_s = max(self.stale_after_s, 5.0 * (s.interval_s or 0.0))
+        if s.last_row_age_s is not None and s.last_row_age_s > stale_s and not final:
+            s.alerts.append(f"no new rows for {s.last_row_age_s:.0f}s")
+        if s.adb_error_rate > 0.1:
+            s.alerts.append(f"adb errors in {s.adb_error_rate:.0%} of rows")
+        if s.thermal_status is not None and s.thermal_status >= 2:
+            s.alerts.append(f"thermal status {self._thermal_name(s.thermal_status)}")
+        s.updated_at = time.strftime("%H:%M:%S")
+        return s
+
+    # ---- rendering ----
+
+    @staticmethod
+    def _thermal_name(status: int | None) -> str:
+        if status is None:
+            return "n/a"
+        name = THERMAL_STATUS_NAMES[status] if 0 <= status < len(THERMAL_STATUS_NAMES) else "?"
+        return f"{status} ({name})"
+
+    def _lines(self, s: DashboardSnapshot) -> list[tuple[str, str]]:
+        def mw(v: float | None) -> str:
+            return "n/a" if v is None else f"{v:.0f} mW"
+
+        age = "n/a" if s.last_row_age_s is None else f"{s.last_row_age_s:.0f}s ago"
+        lines = [
+            ("run", f"{self.run_csv.name}  rows={s.rows}  t={s.elapsed_s:.0f}s  last row {age}"),
+            (f"discharge ({s.window_s:.0f}s)", mw(s.discharge_mW) + "  (charge_counter)"),
+        ]
+        if s.current_now_mW is not None:
+            lines.append(("current_now", mw(s.current_now_mW)))
+        if self._enr_tail is not None:
+            lines.append((f"cpu ({s.window_s:.0f}s)", mw(s.cpu_mW) + "  (live enrich)"))
+            lines.append(("screen est", mw(s.screen_mW)))
+        if self.perfetto_dir is not None:
+            lines.append(("perfetto", f"{mw(s.perfetto_mW)}  (last of {s.perfetto_segments} segments)"))
+        hot = f"  hottest {s.hottest[0]}={s.hottest[1]:.1f}C" if s.hottest else ""
+        batt_t = f"{s.battery_temp_C:.1f}C" if s.battery_temp_C is not None else "n/a"
+        lines += [
+            ("thermal", f"status {self._thermal_name(s.thermal_status)}  battery {batt_t}{hot}"),
+            ("screen", f"brightness={s.brightness or 'n/a'}  display={s.display_state or 'n/a'}"),
+            ("battery", f"level={s.battery_level or 'n/a'}%  voltage={s.voltage_mv or 'n/a'} mV"),
+            ("adb errors", f"{s.adb_error_rate:.0%}" + (f"  last: {s.last_adb_error}" if s.last_adb_error else "")),
+        ]
+        return lines
+
+    def render_text(self, s: DashboardSnapshot | None = None) -> str:
+        s = s or self.snap
+        out = [f"mp_power live  {s.updated_at}"]
+        out += [f"  {k:<18} {v}" for k, v in self._lines(s)]
+        if s.history_discharge:
+            out.append(f"  {'discharge trend':<18} {sparkline(s.history_discharge)}")
+        if self._enr_tail is not None and s.history_cpu:
+            out.append(f"  {'cpu trend':<18} {sparkline(s.history_cpu)}")
+        out.append("  ALERTS: " + "; ".join(s.alerts) if s.alerts else "  ok")
+        return "\n".join(out) + "\n"
+
+    def render_html(self, s: DashboardSnapshot | None = None) -> str:
+        s = s or self.snap
+
+        def svg(values: list[float], color: str) -> str:
+            pts = [(i, v) for i, v in enumerate(values) if v == v]
+            if len(pts) < 2:
+                return ""
+            lo, hi = min(v for _, v in pts), max(v for _, v in pts)
+            span, n = (hi - lo) or 1.0, max(1, len(values) - 1)
+            poly = " ".join(f"{i / n * 600:.1f},{70 - (v - lo) / span * 60:.1f}" for i, v in pts)
+            return (
+                f'<svg width="600" height="80"><polyline fill="none" stroke="{color}" stroke-width="2" points="{poly}"/>'
+                f'<text x="4" y="12" font-size="11">{hi:.0f}</text><text x="4" y="78" font-size="11">{lo:.0f}</text></svg>'
+            )
+
+        rows = "".join(f"<tr><th>{html.escape(k)}</th><td>{html.escape(v)}</td></tr>" for k, v in self._lines(s))
+        alerts = (
+            "".join(f'<p class="alert">{html.escape(a)}</p>' for a in s.alerts) if s.alerts else '<p class="ok">ok</p>'
+        )
+        refresh = f'<meta http-equiv="refresh" content="{max(1, int(round(self.refresh_s)))}">' if not self._stop.is_set() else ""
+        return (
+            "<!doctype html><html><head><meta charset=\"utf-8\">"
+            f"{refresh}<title>mp_power live: {html.escape(self.run_csv.name)}</title>"
+            "<style>body{font-family:monospace;margin:1em}th{text-align:left;padding-right:1em}"
+            ".alert{color:#b00;font-weight:bold}.ok{color:#080}</style></head><body>"
+            f"<h3>mp_power live &middot; {html.escape(s.updated_at)}</h3>{alerts}<table>{rows}</table>"
+            f"<h4>discharge mW (rolling {s.window_s:.0f}s)</h4>{svg(s.history_discharge, '#2a2')}"
+            + (f"<h4>cpu mW (rolling {s.window_s:.0f}s)</h4>{svg(s.history_cpu, '#22a')}" if self._enr_tail is not None else "")
+            + "</body></html>\n"
+        )
+
+    def write(self, s: DashboardSnapshot | None = None) -> None:
+        if self.html_out is not None:
+            try:
+                self.html_out.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.html_out.with_suffix(".tmp")
+                tmp.write_text(self.render_html(s), encoding="utf-8")
+                tmp.replace(self.html_out)
+            except Exception:
+                pass
+        if self.terminal:
+            text = self.render_text(s)
+            if sys.stdout.isatty():
+                sys.stdout.write("\x1b[H\x1b[2J" + text)
+            else:
+                sys.stdout.write(text)
+            sys.stdout.flush()
+
+    # ---- background loop ----
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="live-dashboard", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.write(self.poll())
+            except Exception:
+                # The page keeps its last good state; the run itself must not notice.
+                pass
+            self._stop.wait(self.refresh_s)
+
+    def stop(self, timeout_s: float | None = 10.0) -> DashboardSnapshot:
+        """Stop refreshing and write a final (non-refreshing) page."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout_s)
+        try:
+            self.write(self.poll(final=True))
+        except Exception:
+            pass
+        return self.snap
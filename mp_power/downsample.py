@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+PYRAMID_VERSION = 1
+PYRAMID_SUFFIX = ".pyramid.npz"
+# Buckets per level, finest first. 16384 buckets keep a 24 h run at ~5 s per bucket.
+PYRAMID_LEVELS = (16384, 4096, 1024)
+DOWNSAMPLE_METHODS = ("minmax", "lttb")
+
+# Rows of a level array: per-bucket aggregates for one column.
+_COUNT, _SUM, _MIN, _MAX, _T_MIN, _T_MAX = range(6)
+
+
+def plot_points(fig: object, ax: object | None = None, *, dpi: float | None = None) -> int:
+    """Horizontal pixels available to `ax` (or the whole figure) when saved at `dpi`."""
+    dpi = float(dpi if dpi is not None else fig.dpi)  # type: ignore[attr-defined]
+    width_in = float(fig.get_figwidth())  # type: ignore[attr-defined]
+    if ax is not None:
+        width_in *= float(ax.get_position().width)  # type: ignore[attr-defined]
+    return max(16, int(width_in * dpi))
+
+
+def _finite_xy(x: object, y: object) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    xa = np.asarray(pd.to_numeric(pd.Series(np.asarray(x)), errors="coerce"), dtype=float)
+    ya = np.asarray(pd.to_numeric(pd.Series(np.asarray(y)), errors="coerce"), dtype=float)
+    idx = np.flatnonzero(np.isfinite(xa) & np.isfinite(ya))
+    return xa, ya, idx
+
+
+def _bucket_of(x: np.ndarray, x0: float, x1: float, n: int) -> np.ndarray:
+    span = x1 - x0
+    if not span > 0:
+        return np.zeros(len(x), dtype=np.int64)
+    b = np.floor((x - x0) / span * n).astype(np.int64)
+    return np.clip(b, 0, n - 1)
+
+
+def _group_extrema(b: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(bucket ids, position of min, position of max) per non-empty bucket; y must be finite."""
+    order = np.lexsort((y, b))
+    bs = b[order]
+    starts = np.flatnonzero(np.r_[True, bs[1:] != bs[:-1]])
+    ends = np.r_[starts[1:], len(bs)] - 1
+    return bs[starts], order[starts], order[ends]
+
+
+def minmax_indices(x: object, y: object, n_buckets: int) -> np.ndarray:
+    """Indices keeping the first/last point and the min and max of each x bucket.
+
+    x is split into `n_buckets` equal-width buckets (one per output pixel), so every spike that
+    would light a pixel survives. Points with a non-finite x or y are dropped.
+    """
+    xa, ya, idx = _finite_xy(x, y)
+    if len(idx) <= 2 * max(1, int(n_buckets)) + 2:
+        return idx
+    xv, yv = xa[idx], ya[idx]
+    b = _bucket_of(xv, float(xv.min()), float(xv.max()), int(n_buckets))
+    _, i_min, i_max = _group_extrema(b, yv)
+    keep = np.unique(np.r_[0, i_min, i_max, len(idx) - 1])
+    return idx[keep]
+
+
+def lttb_indices(x: object, y: object, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: `n_out` indices that best preserve the visual shape."""
+    xa, ya, idx = _finite_xy(x, y)
+    n = len(idx)
+    n_out = int(n_out)
+    if n_out < 3 or n <= n_out:
+        return idx
+    xv, yv = xa[idx], ya[idx]
+    every = (n - 2) / (n_out - 2)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        cx, cy = xv[nlo:nhi].mean(), yv[nlo:nhi].mean()
+        area = np.abs((xv[a] - cx) * (yv[lo:hi] - yv[a]) - (xv[a] - xv[lo:hi]) * (cy - yv[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return idx[out]
+
+
+def downsample_xy(x: object, y: object, n_out: int, *, method: str = "minmax") -> tuple[np.ndarray, np.ndarray]:
+    """(x, y) reduced to roughly `n_out` horizontal pixels; short series pass through unchanged."""
+    xa = np.asarray(pd.to_numeric(pd.Series(np.asarray(x)), errors="coerce"), dtype=float)
+    ya = np.asarray(pd.to_numeric(pd.Series(np.asarray(y)), errors="coerce"), dtype=float)
+    limit = 2 * int(n_out) + 2 if method == "minmax" else int(n_out)
+    if len(xa) <= limit:
+        # Keep NaN gaps as matplotlib line breaks when nothing is dropped.
+        return xa, ya
+    if method == "minmax":
+        keep = minmax_indices(xa, ya, n_out)
+    elif method == "lttb":
+        keep = lttb_indices(xa, ya, n_out)
+    else:
+        raise ValueError(f"unknown downsample method: {method} (expected one of {DOWNSAMPLE_METHODS})")
+    return xa[keep], ya[keep]
+
+
+# -----------------------------
+# Multi-resolution pyramid
+# -----------------------------
+
+
+@dataclass
+class SeriesPyramid:
+    """Per-bucket count/sum/min/max (with the time of each extreme) at a few fixed resolutions.
+
+    Levels are built once from the raw timeseries; a render picks the coarsest level that still
+    has at least one bucket per pixel, so plot cost no longer depends on the run length.
+    """
+
+    time_col: str
+    t0: float
+    t1: float
+    levels: dict[int, dict[str, np.ndarray]] = field(default_factory=dict)
+    first: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def columns(self) -> list[str]:
+        if not self.levels:
+            return []
+        return list(next(iter(self.levels.values())).keys())
+
+    def has(self, col: str) -> bool:
+        return col in self.first and self.first[col] == self.first[col]
+
+    def level_for(self, n_px: int) -> int:
+        ok = [n for n in self.levels if n >= int(n_px)]
+        return min(ok) if ok else max(self.levels)
+
+    def _bucket_t(self, n: int) -> np.ndarray:
+        width = (self.t1 - self.t0) / n if self.t1 > self.t0 else 0.0
+        return self.t0 + (np.arange(n) + 0.5) * width
+
+    def envelope(self, col: str, n_px: int) -> tuple[np.ndarray, np.ndarray]:
+        """Min/max line (two points per non-empty bucket, at their real times) for `n_px` pixels."""
+        agg = self.levels[self.level_for(n_px)][col]
+        m = agg[_COUNT] > 0
+        t_min, t_max = agg[_T_MIN][m], agg[_T_MAX][m]
+        v_min, v_max = agg[_MIN][m], agg[_MAX][m]
+        min_first = t_min <= t_max
+        t = np.column_stack([np.where(min_first, t_min, t_max), np.where(min_first, t_max, t_min)]).ravel()
+        v = np.column_stack([np.where(min_first, v_min, v_max), np.where(min_first, v_max, v_min)]).ravel()
+        return t, v
+
+    def mean(self, col: str) -> float | None:
+        agg = self.levels[min(self.levels)][col]
+        n = float(agg[_COUNT].sum())
+        return float(agg[_SUM].sum() / n) if n > 0 else None
+
+    def rolling_mean(self, col: str, window_s: float, n_px: int) -> tuple[np.ndarray, np.ndarray]:
+        """Time-window rolling mean from the finest level's bucket sums, reduced to `n_px` pixels."""
+        n = max(self.levels)
+        agg = self.levels[n][col]
+        width = (self.t1 - self.t0) / n if self.t1 > self.t0 else 0.0
+        w = max(1, int(round(float(window_s) / width))) if width > 0 else 1
+        cs = np.r_[0.0, np.cumsum(agg[_SUM])]
+        cn = np.r_[0.0, np.cumsum(agg[_COUNT])]
+        hi = np.arange(1, n + 1)
+        lo = np.maximum(0, hi - w)
+        cnt = cn[hi] - cn[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            y = np.where(cnt > 0, (cs[hi] - cs[lo]) / cnt, np.nan)
+        t = self._bucket_t(n)
+        m = agg[_COUNT] > 0
+        return downsample_xy(t[m], y[m], n_px)
+
+
+def build_pyramid(
+    t: object, columns: dict[str, object], *, time_col: str = "t_s", levels: tuple[int, ...] = PYRAMID_LEVELS
+) -> SeriesPyramid:
+    ta = np.asarray(pd.to_numeric(pd.Series(np.asarray(t)), errors="coerce"), dtype=float)
+    tf = ta[np.isfinite(ta)]
+    t0 = float(tf.min()) if len(tf) else 0.0
+    t1 = float(tf.max()) if len(tf) else 0.0
+    pyr = SeriesPyramid(time_col=time_col, t0=t0, t1=t1)
+
+    data: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    for col, values in columns.items():
+        ya = np.asarray(pd.to_numeric(pd.Series(np.asarray(values)), errors="coerce"), dtype=float)
+        idx = np.flatnonzero(np.isfinite(ta) & np.isfinite(ya))
+        data[col] = (idx, ta[idx], ya[idx])
+        pyr.first[col] = float(ya[idx[0]]) if len(idx) else float("nan")
+
+    for n in sorted({int(n) for n in levels if int(n) > 0}, reverse=True):
+        level: dict[str, np.ndarray] = {}
+        for col, (idx, tv, yv) in data.items():
+            agg = np.full((6, n), np.nan)
+            agg[_COUNT] = 0.0
+            agg[_SUM] = 0.0
+            if len(idx):
+                b = _bucket_of(tv, t0, t1, n)
+                agg[_COUNT] = np.bincount(b, minlength=n)
+                agg[_SUM] = np.bincount(b, weights=yv, minlength=n)
+                ub, i_min, i_max = _group_extrema(b, yv)
+                agg[_MIN, ub], agg[_T_MIN, ub] = yv[i_min], tv[i_min]
+                agg[_MAX, ub], agg[_T_MAX, ub] = yv[i_max], tv[i_max]
+            level[col] = agg
+        pyr.levels[n] = level
+    return pyr
+
+
+def pyramid_path(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.name + PYRAMID_SUFFIX)
+
+
+def _source_meta(csv_path: Path) -> dict[str, int]:
+    st = csv_path.stat()
+    return {"size": int(st.st_size), "mtime_ns": int(st.st_mtime_ns)}
+
+
+def write_pyramid(
+    csv_path: Path,
+    df: pd.DataFrame | None = None,
+    *,
+    time_col: str = "t_s",
+    columns: list[str] | None = None,
+    levels: tuple[int, ...] = PYRAMID_LEVELS,
+) -> SeriesPyramid:
+    """Build the pyramid of `csv_path` (or of `df`, its already-loaded contents) and save it next to it."""
+    if df is None:
+        df = pd.read_csv(csv_path)
+    if time_col not in df.columns:
+        raise ValueError(f"{csv_path}: missing time column {time_col!r}")
+    if columns is None:
+        columns = [c for c in df.columns if c != time_col and pd.to_numeric(df[c], errors="coerce").notna().any()]
+    pyr = build_pyramid(df[time_col], {c: df[c] for c in columns}, time_col=time_col, levels=levels)
+
+    meta = {
+        "version": PYRAMID_VERSION,
+        "source": _source_meta(csv_path),
+        "time_col": time_col,
+        "t0": pyr.t0,
+        "t1": pyr.t1,
+        "first": pyr.first,
+        "levels": sorted(pyr.levels),
+        "columns": list(columns),
+    }
+    arrays = {f"L{n}/{c}": a for n, level in pyr.levels.items() for c, a in level.items()}
+    out = pyramid_path(csv_path)
+    tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        np.savez_compressed(f, __meta__=np.array(json.dumps(meta)), **arrays)
+    tmp.replace(out)
+    return pyr
+
+
+def read_pyramid(csv_path: Path, *, time_col: str = "t_s") -> SeriesPyramid | None:
+    """The saved pyramid if it exists and still matches the CSV's size/mtime, else None."""
+    path = pyramid_path(csv_path)
+    if not path.exists() or not csv_path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["__meta__"]))
+            if meta.get("version") != PYRAMID_VERSION or meta.get("time_col") != time_col:
+                return None
+            if meta.get("source") != _source_meta(csv_path):
+                return None
+            pyr = SeriesPyramid(
+                time_col=time_col,
+                t0=float(meta["t0"]),
+                t1=float(meta["t1"]),
+                first={k: float(v) for k, v in meta.get("first", {}).items()},
+            )
+            for n in meta["levels"]:
+                pyr.levels[int(n)] = {c: z[f"L{n}/{c}"] for c in meta["columns"]}
+        return pyr
+    except Exception:
+        return None
+
+
+def load_pyramid(csv_path: Path, *, time_col: str = "t_s", build: bool = True) -> SeriesPyramid | None:
+    """Cached pyramid for `csv_path`, (re)built from the CSV when stale or missing (build=True)."""
+    pyr = read_pyramid(csv_path, time_col=time_col)
+    if pyr is not None or not build or not csv_path.exists():
+        return pyr
+    try:
+        df = pd.read_csv(csv_path)
+    except Exception:
+        return None
+    if time_col not in df.columns:
+        return None
+    try:
+        return write_pyramid(csv_path, df, time_col=time_col)
+    except OSError:
+        # Read-only report dir: still usable in memory.
+        columns = [c for c in df.columns if c != time_col and pd.to_numeric(df[c], errors="coerce").notna().any()]
+        return build_pyramid(df[time_col], {c: df[c] for c in columns}, time_col=time_col)
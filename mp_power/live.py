@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from mp_power.pipeline_ops import DEFAULT_SCENARIO_PARAMS
+from mp_power.pipeline_ops import EnrichPlan
+from mp_power.pipeline_ops import EnrichState
+from mp_power.pipeline_ops import _coerce_numeric
+from mp_power.pipeline_ops import enrich_frame
+from mp_power.pipeline_ops import enrich_inputs_hash
+from mp_power.pipeline_ops import enrich_out_fields
+from mp_power.pipeline_ops import load_enrich_plan
+from mp_power.pipeline_ops import load_estimators
+
+
+class CsvTail:
+    """Incremental reader for a CSV that another process is still appending to.
+
+    Only complete records are returned: text up to the last newline that is not inside a quoted
+    field (adb error messages can carry embedded newlines). Partial tails stay buffered.
+    """
+
+    def __init__(self, path: Path, *, read_bytes: int = 1 << 20) -> None:
+        self.path = path
+        self.read_bytes = int(read_bytes)
+        self.header_line: str | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._offset = 0
+        self._buf = ""
+
+    def _read_available(self) -> None:
+        if not self.path.exists():
+            return
+        size = self.path.stat().st_size
+        if size < self._offset:
+            raise RuntimeError(f"{self.path} shrank while tailing ({size} < {self._offset} bytes)")
+        if size == self._offset:
+            return
+        with self.path.open("rb") as f:
+            f.seek(self._offset)
+            while True:
+                chunk = f.read(self.read_bytes)
+                if not chunk:
+                    break
+                self._offset += len(chunk)
+                self._buf += self._decoder.decode(chunk)
+
+    def _split_complete(self) -> str:
+        cut = -1
+        quotes = 0
+        start = 0
+        while True:
+            nl = self._buf.find("\n", start)
+            if nl < 0:
+                break
+            quotes += self._buf.count('"', start, nl)
+            if quotes % 2 == 0:
+                cut = nl
+            start = nl + 1
+        if cut < 0:
+            return ""
+        done, self._buf = self._buf[: cut + 1], self._buf[cut + 1 :]
+        return done
+
+    def read_complete(self, *, final: bool = False) -> str:
+        """New complete records as text (header excluded); final=True also flushes a partial tail."""
+        self._read_available()
+        text = self._split_complete()
+        if final and self._buf.strip():
+            text += self._buf + ("" if self._buf.endswith("\n") else "\n")
+            self._buf = ""
+        if self.header_line is None and text:
+            nl = text.find("\n")
+            self.header_line, text = text[: nl + 1], text[nl + 1 :]
+            if self.header_line.startswith("\ufeff"):
+                self.header_line = self.header_line[1:]
+        return text
+
+    @property
+    def header(self) -> list[str] | None:
+        if self.header_line is None:
+            return None
+        return next(csv.reader([self.header_line]), [])
+
+
+@dataclass
+class LiveSummary:
+    rows: int = 0
+    duration_s: float = 0.0
+    cpu_energy_mJ: float = 0.0
+    screen_energy_mJ: float = 0.0
+    discharge_energy_mJ: float = 0.0
+    cpu_mW: float | None = None
+    screen_mW: float | None = None
+    discharge_mW: float | None = None
+    window_s: float = 60.0
+    window_cpu_mW: float | None = None
+    window_screen_mW: float | None = None
+    window_discharge_mW: float | None = None
+    updated_at: str = ""
+    final: bool = False
+    # enrich_inputs_hash() of the map/tables/profile/estimators used; "" when they could not be hashed.
+    enrich_inputs: str = ""
+    errors: list[str] = field(default_factory=list)
+
+
+def _cell_float(v: str) -> float | None:
+    try:
+        return float(v) if v != "" else None
+    except ValueError:
+        return None
+
+
+class LiveEnricher:
+    """Enrich a run CSV while the sampler is still writing it.
+
+    Each poll tails the new complete rows, enriches them with the same vectorized kernel and plan
+    as `enrich` (previous timestamp/charge carried across polls) and appends them to `out_csv`.
+    A rolling summary (mean CPU / screen / discharge mW, overall and over the last `window_s`)
+    is rewritten to `summary_json` after every poll.
+    """
+
+    def __init__(
+        self,
+        run_csv: Path,
+        out_csv: Path,
+        *,
+        map_json: Path = Path("artifacts/android/power_profile/policy_cluster_map.json"),
+        clusters_dir: Path = Path("artifacts/android/power_profile"),
+        profile_json: Path = Path("artifacts/android/power_profile/power_profile.json"),
+        estimators: list[str] | str | None = None,
+        scenario_params: Path = DEFAULT_SCENARIO_PARAMS,
+        summary_json: Path | None = None,
+        poll_s: float = 2.0,
+        window_s: float = 60.0,
+        log_every_s: float = 0.0,
+    ) -> None:
+        self.run_csv = run_csv
+        self.out_csv = out_csv
+        self.map_json = map_json
+        self.clusters_dir = clusters_dir
+        self.profile_json = profile_json
+        self.summary_json = summary_json
+        self.poll_s = float(poll_s)
+        self.log_every_s = float(log_every_s)
+
+        self.estimators = load_estimators(estimators, profile_json=profile_json, scenario_params=scenario_params)
+        self.summary = LiveSummary(window_s=float(window_s))
+        try:
+            self.summary.enrich_inputs = enrich_inputs_hash(
+                map_json=map_json,
+                clusters_dir=clusters_dir,
+                profile_json=profile_json,
+                estimators=estimators,
+                scenario_params=scenario_params,
+            )
+        except Exception:
+            pass
+        self._tail = CsvTail(run_csv)
+        self._state = EnrichState()
+        self._plan: EnrichPlan | None = None
+        self._numeric_cols: list[str] = []
+        self._out_idx: dict[str, int] = {}
+        self._fout: io.TextIOWrapper | None = None
+        self._writer = None
+        # (dt_s, cpu_mJ, screen_mJ, discharge_mJ) per row with a usable dt, newest last.
+        self._window: deque[tuple[float, float, float, float]] = deque()
+        self._last_log_t = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="live-enrich", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout_s: float | None = 10.0) -> None:
+        """Abort without draining (sampling failed); the partial output is left as is."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout_s)
+        with self._lock:
+            self._close()
+
+    def finish(self, timeout_s: float | None = 60.0) -> LiveSummary:
+        """Stop polling, drain whatever the sampler wrote last and close the outputs."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout_s)
+            if self._thread.is_alive():
+                raise RuntimeError("live enrichment did not stop in time")
+        try:
+            self.poll(final=True)
+        except Exception as e:
+            self.summary.errors.append(f"final poll: {e}")
+        finally:
+            self._close()
+        self.summary.final = True
+        self._write_summary()
+        if self._plan is None:
+            raise RuntimeError(f"no header was ever read from {self.run_csv}")
+        return self.summary
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.poll()
+            except Exception as e:
+                # Keep tailing; the final poll or a post-run enrich can still succeed.
+                msg = f"{type(e).__name__}: {e}"
+                if not self.summary.errors or self.summary.errors[-1] != msg:
+                    self.summary.errors.append(msg)
+
+    def _open(self, header: list[str]) -> None:
+        plan = load_enrich_plan(
+            header, map_json=self.map_json, clusters_dir=self.clusters_dir, profile_json=self.profile_json
+        )
+        want = [c for c in ("battery_voltage_mv", "charge_counter_uAh", "brightness") if c in plan.header]
+        want += [c.name for c in plan.columns if c.name not in want]
+        self._plan = plan
+        self._numeric_cols = want
+        out_fields = enrich_out_fields(plan, self.estimators)
+        self._out_idx = {c: i for i, c in enumerate(out_fields)}
+        self.out_csv.parent.mkdir(parents=True, exist_ok=True)
+        self._fout = self.out_csv.open("w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._fout)
+        self._writer.writerow(out_fields)
+        self._fout.flush()
+
+    def _close(self) -> None:
+        if self._fout is not None:
+            self._fout.close()
+            self._fout = None
+
+    def poll(self, *, final: bool = False) -> int:
+        """Enrich rows appended since the last poll; returns how many were written."""
+        with self._lock:
+            text = self._tail.read_complete(final=final)
+            if self._plan is None:
+                header = self._tail.header
+                if header is None:
+                    return 0
+                self._open(header)
+            assert self._plan is not None and self._writer is not None and self._fout is not None
+            if not text.strip():
+                return 0
+
+            block = self._tail.header_line + text  # type: ignore[operator]
+            df = pd.read_csv(io.StringIO(block), dtype=str, keep_default_na=False, na_filter=False)
+            if self._numeric_cols:
+                num = _coerce_numeric(
+                    pd.read_csv(io.StringIO(block), usecols=self._numeric_cols, float_precision="round_trip")
+                )
+            else:
+                num = pd.DataFrame(index=range(len(df)))
+            columns = enrich_frame(df, num, self._plan, self._state, estimators=self.estimators)
+            self._writer.writerows(zip(*columns))
+            self._fout.flush()
+            self._update_summary(columns)
+            self._write_summary()
+            self._maybe_log()
+            return len(df)
+
+    def _update_summary(self, columns: list[list[str]]) -> None:
+        def col(name: str) -> list[str]:
+            i = self._out_idx.get(name)
+            return columns[i] if i is not None else [""] * len(columns[0])
+
+        s = self.summary
+        for dt_v, cpu_v, scr_v, dis_v in zip(
+            col("dt_s"), col("cpu_energy_mJ_total"), col("screen_energy_mJ_est"), col("battery_discharge_energy_mJ")
+        ):
+            s.rows += 1
+            dt = _cell_float(dt_v)
+            if dt is None or dt <= 0:
+                continue
+            cpu = _cell_float(cpu_v) or 0.0
+            scr = _cell_float(scr_v) or 0.0
+            dis = _cell_float(dis_v) or 0.0
+            s.duration_s += dt
+            s.cpu_energy_mJ += cpu
+            s.screen_energy_mJ += scr
+            s.discharge_energy_mJ += dis
+            self._window.append((dt, cpu, scr, dis))
+
+        win_dt = sum(w[0] for w in self._window)
+        while self._window and win_dt - self._window[0][0] >= s.window_s:
+            win_dt -= self._window.popleft()[0]
+
+        if s.duration_s > 0:
+            s.cpu_mW = s.cpu_energy_mJ / s.duration_s
+            s.screen_mW = s.screen_energy_mJ / s.duration_s
+            s.discharge_mW = s.discharge_energy_mJ / s.duration_s
+        if win_dt > 0:
+            s.window_cpu_mW = sum(w[1] for w in self._window) / win_dt
+            s.window_screen_mW = sum(w[2] for w in self._window) / win_dt
+            s.window_discharge_mW = sum(w[3] for w in self._window) / win_dt
+        s.updated_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    def _write_summary(self) -> None:
+        if self.summary_json is None:
+            return
+        try:
+            self.summary_json.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.summary_json.with_suffix(".tmp")
+            tmp.write_text(json.dumps(asdict(self.summary), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+            tmp.replace(self.summary_json)
+        except Exception:
+            pass
+
+    def _maybe_log(self) -> None:
+        if self.log_every_s <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_log_t < self.log_every_s:
+            return
+        self._last_log_t = now
+        s = self.summary
+
+        def fmt(v: float | None) -> str:
+            return "n/a" if v is None else f"{v:.0f}"
+
+        print(
+            f"Live: rows={s.rows} t={s.duration_s:.0f}s "
+            f"cpu={fmt(s.window_cpu_mW)}mW screen={fmt(s.window_screen_mW)}mW "
+            f"discharge={fmt(s.window_discharge_mW)}mW (last {s.window_s:.0f}s)"
+        )
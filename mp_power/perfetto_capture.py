@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from mp_power.adb import adb_shell
+from mp_power.adb import pull_file_exec_out
+from mp_power.pipeline_ops import CpuPowerSummary
+from mp_power.pipeline_ops import PolicyMarkersSummary
+from mp_power.pipeline_ops import summarize_battery_counters
+from mp_power.pipeline_ops import summarize_power_rails
+from mp_power.pipeline_ops import write_battery_counter_outputs
+from mp_power.pipeline_ops import write_cpu_power_outputs
+from mp_power.pipeline_ops import write_power_rails_outputs
+from mp_power.profiling import span
+
+
+# (segment trace, segment out_dir) -> None; raises on failure.
+SegmentParser = Callable[[Path, Path], object]
+
+
+def segment_config_text(ds_text: str, *, duration_ms: int, file_write_period_ms: int = 2500) -> str:
+    """Perfetto config for one long-capture segment.
+
+    With write_into_file the service drains the buffer to the output file every
+    file_write_period_ms, so the ring only has to hold one drain period instead of the run.
+    """
+    lines = [
+        f"duration_ms: {int(duration_ms)}",
+        "write_into_file: true",
+        f"file_write_period_ms: {int(file_write_period_ms)}",
+        "flush_period_ms: 1000",
+        "buffers: {\n  size_kb: 8192\n  fill_policy: RING_BUFFER\n}",
+    ]
+    return "\n".join(lines) + "\n" + ds_text.rstrip("\n") + "\n"
+
+
+@dataclass
+class SegmentResult:
+    index: int
+    remote_path: str
+    local_trace: str | None
+    out_dir: str
+    duration_ms: int
+    size_bytes: int = 0
+    parsed: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+
+class SegmentedPerfettoCapture:
+    """Back-to-back Perfetto sessions, each pulled and parsed in the background.
+
+    One session per segment (perfetto has no in-session rotation). While segment N+1 records,
+    a single worker pulls segment N via exec-out, removes it from the device, and runs
+    `parsers` on it into `local_dir/seg_NNN/`. Memory per parse is bounded by the segment size.
+    """
+
+    def __init__(
+        self,
+        adb: str,
+        serial: str | None,
+        *,
+        ds_text: str,
+        total_s: float,
+        segment_s: float,
+        remote_prefix: str,
+        local_dir: Path,
+        parsers: dict[str, SegmentParser],
+        file_write_period_ms: int = 2500,
+        keep_traces: bool = True,
+    ) -> None:
+        if segment_s <= 0:
+            raise ValueError("segment_s must be > 0")
+        self.adb = adb
+        self.serial = serial
+        self.ds_text = ds_text
+        self.total_s = float(total_s)
+        self.segment_s = float(segment_s)
+        self.remote_prefix = remote_prefix
+        self.local_dir = local_dir
+        self.parsers = parsers
+        self.file_write_period_ms = int(file_write_period_ms)
+        self.keep_traces = keep_traces
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="perfetto-seg")
+        self._futures: list[Future[SegmentResult]] = []
+        self._proc: subprocess.Popen[bytes] | None = None
+        self._lock = threading.Lock()  # orders segment starts against stop(early=True)
+        self._remote: str | None = None  # remote path of the segment currently recording
+        self._errors: list[str] = []
+
+    def start(self) -> None:
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="perfetto-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self, *, early: bool = False) -> None:
+        """Do not start further segments.
+
+        The current segment finishes on its own duration, or with early=True is interrupted now
+        (perfetto finalizes the trace on SIGINT) so it is pulled and parsed like any other.
+        """
+        with self._lock:
+            self._stop.set()
+            remote = self._remote
+        if early and remote is not None:
+            rc, out, err = adb_shell(self.adb, self.serial, ["pkill", "-INT", "-f", remote], timeout_s=10.0)
+            if rc != 0:
+                print(f"WARN: could not stop perfetto segment early (it runs to its full duration): {err or out}")
+
+    def kill(self) -> None:
+        self._stop.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+
+    def join(self, timeout_s: float | None = None) -> list[SegmentResult]:
+        if self._thread is not None:
+            self._thread.join(timeout=timeout_s)
+            if self._thread.is_alive():
+                self.kill()
+                raise RuntimeError("perfetto long capture did not finish in time")
+        results = [f.result() for f in self._futures]
+        self._pool.shutdown(wait=True)
+        if self._errors:
+            raise RuntimeError("; ".join(self._errors))
+
+        index = [asdict(r) for r in results]
+        (self.local_dir / "segments.json").write_text(
+            json.dumps(index, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        return results
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.total_s
+        idx = 0
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining < 1.0:
+                break
+            seg_ms = int(round(min(self.segment_s, remaining) * 1000.0))
+            remote = f"{self.remote_prefix}_seg{idx:03d}.pftrace"
+            cfg_text = segment_config_text(self.ds_text, duration_ms=seg_ms, file_write_period_ms=self.file_write_period_ms)
+            if idx == 0:
+                (self.local_dir / "perfetto_segment.pbtxt").write_text(cfg_text, encoding="utf-8")
+
+            cmd = [self.adb]
+            if self.serial:
+                cmd += ["-s", self.serial]
+            cmd += ["shell", "perfetto", "--txt", "-c", "-", "-o", remote]
+            try:
+                with self._lock:
+                    if self._stop.is_set():
+                        break
+                    self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    self._remote = remote
+                seg_t0 = time.monotonic()
+                stdout_b, stderr_b = self._proc.communicate(input=cfg_text.encode("utf-8"), timeout=seg_ms / 1000.0 + 30.0)
+            except subprocess.TimeoutExpired:
+                self.kill()
+                self._errors.append(f"segment {idx}: perfetto did not finish in time")
+                break
+            except Exception as e:
+                self._errors.append(f"segment {idx}: failed to start perfetto: {e}")
+                break
+            finally:
+                self._remote = None
+
+            rc = self._proc.returncode
+            if rc not in (0, None):
+                msg = (stderr_b or stdout_b or b"").decode("utf-8", errors="replace").strip()
+                self._errors.append(f"segment {idx}: perfetto failed (exit={rc}): {msg}")
+                break
+
+            # An early stop cuts the last segment short; record what was actually captured.
+            seg_ms = min(seg_ms, int(round((time.monotonic() - seg_t0) * 1000.0)))
+            self._futures.append(self._pool.submit(self._collect, idx, remote, seg_ms))
+            idx += 1
+
+    def _collect(self, idx: int, remote: str, seg_ms: int) -> SegmentResult:
+        seg_dir = self.local_dir / f"seg_{idx:03d}"
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        local = self.local_dir / f"seg_{idx:03d}.pftrace"
+        res = SegmentResult(index=idx, remote_path=remote, local_trace=str(local), out_dir=str(seg_dir), duration_ms=seg_ms)
+
+        try:
+            with span("perfetto_segment_pull"):
+                pulled = pull_file_exec_out(self.adb, self.serial, remote, local)
+        except Exception as e:
+            pulled = None
+            res.errors.append(f"pull failed: {e}")
+        adb_shell(self.adb, self.serial, ["rm", "-f", remote], timeout_s=10.0)
+        if pulled is None or pulled.size_bytes == 0:
+            if pulled is not None:
+                res.errors.append("pull failed: empty trace")
+            res.local_trace = None
+            return res
+        res.size_bytes = pulled.size_bytes
+
+        for name, parser in self.parsers.items():
+            try:
+                with span(f"perfetto_segment_parse.{name}"):
+                    parser(local, seg_dir)
+                res.parsed.append(name)
+            except Exception as e:
+                res.errors.append(f"{name}: {type(e).__name__}: {e}")
+
+        if not self.keep_traces:
+            try:
+                local.unlink()
+                res.local_trace = None
+            except Exception:
+                pass
+        print(f"Perfetto: segment {idx:03d} pulled ({res.size_bytes} bytes) parsed={','.join(res.parsed) or '-'}")
+        return res
+
+
+# -----------------------------
+# Stitching
+# -----------------------------
+
+
+def _read_segment_csvs(results: list[SegmentResult], name: str) -> list[pd.DataFrame]:
+    frames: list[pd.DataFrame] = []
+    for r in sorted(results, key=lambda x: x.index):
+        p = Path(r.out_dir) / name
+        if p.exists():
+            df = pd.read_csv(p)
+            if not df.empty:
+                frames.append(df)
+    return frames
+
+
+def _read_segment_jsons(results: list[SegmentResult], name: str) -> list[tuple[int, dict]]:
+    out: list[tuple[int, dict]] = []
+    for r in sorted(results, key=lambda x: x.index):
+        p = Path(r.out_dir) / name
+        if p.exists():
+            out.append((r.index, json.loads(p.read_text(encoding="utf-8"))))
+    return out
+
+
+def _with_global_t(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values("ts", kind="stable").drop_duplicates(subset="ts", keep="last").reset_index(drop=True)
+    t0 = int(df["ts"].iloc[0])
+    t_s = (pd.to_numeric(df["ts"], errors="coerce") - t0) / 1e9
+    if "t_s" in df.columns:
+        df["t_s"] = t_s
+    else:
+        df.insert(1, "t_s", t_s)
+    return df
+
+
+def stitch_battery_counters(results: list[SegmentResult], out_dir: Path, *, label: str) -> bool:
+    frames = _read_segment_csvs(results, "perfetto_android_power_timeseries.csv")
+    if not frames:
+        return False
+    ts = _with_global_t(pd.concat(frames, ignore_index=True))
+    summary = summarize_battery_counters(ts, label=label, trace_path=str(Path(results[0].out_dir).parent))
+    write_battery_counter_outputs(summary, ts, out_dir)
+    return True
+
+
+def stitch_cpu_power(results: list[SegmentResult], out_dir: Path) -> bool:
+    frames = _read_segment_csvs(results, "perfetto_cpu_power_timeseries.csv")
+    parts = _read_segment_jsons(results, "perfetto_cpu_power_summary.json")
+    if not frames or not parts:
+        return False
+    ts = _with_global_t(pd.concat(frames, ignore_index=True))
+    res_frames = _read_segment_csvs(results, "perfetto_cpu_residency.csv")
+    residency = pd.DataFrame()
+    if res_frames:
+        keys = ["cpu", "policy", "cluster", "kind", "state"]
+        residency = pd.concat(res_frames, ignore_index=True).groupby(keys, as_index=False)["residency_s"].sum()
+
+    def add(into: dict[str, float], src: dict[str, float]) -> None:
+        for k, v in src.items():
+            into[k] = into.get(k, 0.0) + float(v)
+
+    duration = 0.0
+    energy = 0.0
+    v_weighted = 0.0
+    cov_weighted = 0.0
+    by_cluster: dict[str, float] = {}
+    active: dict[str, float] = {}
+    idle: dict[str, float] = {}
+    unknown: dict[str, float] = {}
+    sources: set[str] = set()
+    notes: list[str] = []
+    for idx, s in parts:
+        d = float(s["duration_s"])
+        duration += d
+        energy += float(s["energy_mj_total"])
+        v_weighted += float(s["voltage_v_mean"] or 0.0) * d
+        cov_weighted += float(s["coverage"]) * d
+        add(by_cluster, s["energy_mj_by_cluster"])
+        add(active, s["active_s_by_cpu"])
+        add(idle, s["idle_s_by_cpu"])
+        add(unknown, s["unknown_s_by_cpu"])
+        sources.add(str(s["voltage_source"]))
+        notes.extend(f"seg_{idx:03d}: {n}" for n in s.get("notes", []))
+
+    summary = CpuPowerSummary(
+        trace_path=str(Path(results[0].out_dir).parent),
+        out_dir=str(out_dir),
+        bin_ms=float(parts[0][1]["bin_ms"]),
+        duration_s=duration,
+        n_cpus=max(int(s["n_cpus"]) for _, s in parts),
+        voltage_source=sources.pop() if len(sources) == 1 else "mixed",
+        voltage_v_mean=v_weighted / duration if duration > 0 else None,
+        energy_mj_total=energy,
+        cpu_power_mw_mean=energy / duration if duration > 0 else None,
+        energy_mj_by_cluster=by_cluster,
+        coverage=cov_weighted / duration if duration > 0 else 0.0,
+        active_s_by_cpu=active,
+        idle_s_by_cpu=idle,
+        unknown_s_by_cpu=unknown,
+        notes=notes,
+    )
+    write_cpu_power_outputs(summary, ts, residency, out_dir)
+    return True
+
+
+def stitch_power_rails(results: list[SegmentResult], out_dir: Path) -> bool:
+    frames = _read_segment_csvs(results, "perfetto_power_rails_timeseries.csv")
+    tables = _read_segment_csvs(results, "perfetto_power_rails_summary.csv")
+    if not frames or not tables:
+        return False
+
+    # Cumulative energy restarts at 0 in each segment; carry the running total forward.
+    offsets: dict[str, float] = {}
+    shifted: list[pd.DataFrame] = []
+    for df in frames:
+        df = df.copy()
+        for c in [c for c in df.columns if c.endswith("_energy_mj")]:
+            base = offsets.get(c, 0.0)
+            df[c] = pd.to_numeric(df[c], errors="coerce") + base
+            last = df[c].dropna()
+            offsets[c] = float(last.iloc[-1]) if not last.empty else base
+        shifted.append(df)
+    ts = _with_global_t(pd.concat(shifted, ignore_index=True))
+
+    tab = pd.concat(tables, ignore_index=True)
+    per_rail = tab.groupby("rail", as_index=False).agg(
+        track=("track", "first"),
+        n_samples=("n_samples", "sum"),
+        duration_s=("duration_s", "sum"),
+        sample_period_s_median=("sample_period_s_median", "median"),
+        n_resets=("n_resets", "sum"),
+        energy_mj=("energy_mj", "sum"),
+        power_mw_p95=("power_mw_p95", "max"),
+    )
+    per_rail.insert(
+        per_rail.columns.get_loc("power_mw_p95"),
+        "power_mw_mean",
+        per_rail["energy_mj"] / per_rail["duration_s"].where(per_rail["duration_s"] > 0),
+    )
+    duration_s = float(ts["t_s"].iloc[-1]) if len(ts) else 0.0
+    summary = summarize_power_rails(
+        per_rail,
+        duration_s,
+        trace_path=str(Path(results[0].out_dir).parent),
+        out_dir=str(out_dir),
+        notes=["stitched from segments; power_mw_p95 is the max over segments"],
+    )
+    write_power_rails_outputs(summary, ts, per_rail, out_dir)
+    return True
+
+
+def stitch_policy_markers(results: list[SegmentResult], out_dir: Path) -> bool:
+    parts = _read_segment_jsons(results, "perfetto_policy_markers_summary.json")
+    if not parts:
+        return False
+    frames = _read_segment_csvs(results, "perfetto_policy_markers.csv")
+    markers = pd.DataFrame()
+    if frames:
+        markers = pd.concat(frames, ignore_index=True).sort_values("ts", kind="stable").reset_index(drop=True)
+        markers["t_s"] = (pd.to_numeric(markers["ts"], errors="coerce") - int(markers["ts"].iloc[0])) / 1e9
+    markers.to_csv(out_dir / "perfetto_policy_markers.csv", index=False, encoding="utf-8")
+
+    notes: list[str] = []
+    for idx, s in parts:
+        notes.extend(f"seg_{idx:03d}: {n}" for n in s.get("notes", []))
+    summary = PolicyMarkersSummary(
+        trace_path=str(Path(results[0].out_dir).parent),
+        out_dir=str(out_dir),
+        keywords=list(parts[0][1].get("keywords", [])),
+        n_markers=int(len(markers)),
+        notes=notes,
+    )
+    (out_dir / "perfetto_policy_markers_summary.json").write_text(
+        json.dumps(asdict(summary), ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+    return True
+
+
+def stitch_segments(results: list[SegmentResult], out_dir: Path, *, label: str) -> list[str]:
+    """Merge per-segment extractor outputs into the single-trace output files in `out_dir`."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    done: list[str] = []
+    if not results:
+        return done
+    if stitch_battery_counters(results, out_dir, label=label):
+        done.append("android_power")
+    if stitch_power_rails(results, out_dir):
+        done.append("power_rails")
+    if stitch_policy_markers(results, out_dir):
+        done.append("policy_markers")
+    if stitch_cpu_power(results, out_dir):
+        done.append("cpu_power")
+    return done
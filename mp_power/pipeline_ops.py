@@ -5,12 +5,22 @@ import csv
 import json
 import os
 import re
-import sys
 from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable
 
-import pandas as pd
+from mp_power.profiling import profiled
+from mp_power.profiling import span
+from mp_power.timebase import TS_PC_COL
+from mp_power.timebase import cell_to_ns
+from mp_power.timebase import elapsed_s
+from mp_power.timebase import run_ts_ns
+from mp_power.timebase import step_s
+from mp_power.timebase import time_column
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 # -----------------------------
@@ -156,6 +166,13 @@ def write_power_profile_outputs(profile: PowerProfile, out_dir: Path) -> None:
 # -----------------------------
 
 
+def _open_trace(trace: Path):
+    """TraceProcessor context for `trace`; a pooled server when mp_power.trace_pool is configured."""
+    from mp_power.trace_pool import open_trace
+
+    return open_trace(trace)
+
+
 @dataclass(frozen=True)
 class BatteryCounterSummary:
     label: str
@@ -179,63 +196,25 @@ class BatteryCounterSummary:
     energy_mwh: float | None
 
 
-def parse_perfetto_android_power_counters(
-    trace: Path,
-    out_dir: Path | None = None,
-    label: str = "",
-    no_timeseries: bool = False,
-) -> BatteryCounterSummary:
+def _infer_voltage_scale(voltage_raw: pd.Series) -> float:
     import numpy as np
-    from perfetto.trace_processor import TraceProcessor
-
-    def infer_voltage_scale(voltage_raw: pd.Series) -> float:
-        v = pd.to_numeric(voltage_raw, errors="coerce")
-        med = float(v.dropna().median()) if v.notna().any() else float("nan")
-        if np.isfinite(med) and med < 100_000:
-            return 1e-3
-        return 1e-6
-
-    def load_batt_counters(tp: TraceProcessor) -> pd.DataFrame:
-        df = tp.query(
-            """
-            select
-              c.ts as ts,
-              ct.name as name,
-              c.value as value
-            from counter c
-            join counter_track ct on ct.id = c.track_id
-            where ct.name glob 'batt.*'
-            order by c.ts
-            """
-        ).as_pandas_dataframe()
-
-        if df.empty:
-            return df
-
-        def last(series: pd.Series) -> float:
-            s = pd.to_numeric(series, errors="coerce").dropna()
-            return float(s.iloc[-1])
-
-        piv = df.pivot_table(index="ts", columns="name", values="value", aggfunc=last).reset_index()
-        piv = piv.sort_values("ts").reset_index(drop=True)
-
-        t0 = int(piv["ts"].iloc[0])
-        piv.insert(1, "t_s", (piv["ts"] - t0) / 1e9)
-        return piv
-
-    if not trace.exists():
-        raise FileNotFoundError(f"Trace not found: {trace}")
+    import pandas as pd
 
-    out_dir = out_dir or trace.parent
-    out_dir.mkdir(parents=True, exist_ok=True)
+    v = pd.to_numeric(voltage_raw, errors="coerce")
+    med = float(v.dropna().median()) if v.notna().any() else float("nan")
+    if np.isfinite(med) and med < 100_000:
+        return 1e-3
+    return 1e-6
 
-    label = label or trace.stem
 
-    with TraceProcessor(trace=str(trace)) as tp:
-        ts = load_batt_counters(tp)
+def summarize_battery_counters(ts: pd.DataFrame, *, label: str, trace_path: str) -> BatteryCounterSummary:
+    """Summary of a batt.* counter timeseries (one row per ts, columns per counter, plus t_s).
 
-    if ts.empty:
-        raise RuntimeError("No batt.* counter tracks found in trace.")
+    Adds a `power_mw_calc` column to `ts` in place. Shared by the single-trace parser and the
+    segment stitcher of the long-capture mode.
+    """
+    import numpy as np
+    import pandas as pd
 
     charge = ts.get("batt.charge_uah")
     current = ts.get("batt.current_ua")
@@ -243,7 +222,7 @@ def parse_perfetto_android_power_counters(
 
     voltage_v = None
     if voltage_raw is not None:
-        voltage_to_v = infer_voltage_scale(voltage_raw)
+        voltage_to_v = _infer_voltage_scale(voltage_raw)
         voltage_v = pd.to_numeric(voltage_raw, errors="coerce") * float(voltage_to_v)
 
     power_mw = None
@@ -282,9 +261,9 @@ def parse_perfetto_android_power_counters(
     v_mean = float(pd.to_numeric(voltage_v, errors="coerce").mean()) if voltage_v is not None else None
     p_mean = float(pd.to_numeric(power_mw, errors="coerce").mean()) if power_mw is not None else None
 
-    summary = BatteryCounterSummary(
+    return BatteryCounterSummary(
         label=label,
-        trace_path=str(trace),
+        trace_path=trace_path,
         n_samples=int(len(ts)),
         duration_s=duration_s,
         sample_period_s_median=dt_med,
@@ -300,15 +279,86 @@ def parse_perfetto_android_power_counters(
         energy_mwh=energy_mwh,
     )
 
+
+def write_battery_counter_outputs(
+    summary: BatteryCounterSummary, ts: pd.DataFrame | None, out_dir: Path
+) -> None:
+    import pandas as pd
+
     out_json = out_dir / "perfetto_android_power_summary.json"
     out_csv = out_dir / "perfetto_android_power_summary.csv"
     out_json.write_text(json.dumps(asdict(summary), ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
     pd.DataFrame([asdict(summary)]).to_csv(out_csv, index=False, encoding="utf-8")
 
-    if not no_timeseries:
+    if ts is not None:
         out_ts = out_dir / "perfetto_android_power_timeseries.csv"
         ts.to_csv(out_ts, index=False, encoding="utf-8")
+        _write_timeseries_pyramid(out_ts, ts, time_col="t_s")
+
+
+def _write_timeseries_pyramid(csv_path: Path, ts: pd.DataFrame, *, time_col: str) -> None:
+    # Multi-resolution min/max pyramid next to the CSV so report/diagnostic plots skip the raw rows.
+    from mp_power.downsample import write_pyramid
+
+    try:
+        write_pyramid(csv_path, ts, time_col=time_col)
+    except Exception as e:
+        print(f"WARN: failed to write plot pyramid for {csv_path}: {e}")
+
+
+def parse_perfetto_android_power_counters(
+    trace: Path,
+    out_dir: Path | None = None,
+    label: str = "",
+    no_timeseries: bool = False,
+) -> BatteryCounterSummary:
+    import pandas as pd
+
+    def load_batt_counters(tp) -> pd.DataFrame:
+        df = tp.query(
+            """
+            select
+              c.ts as ts,
+              ct.name as name,
+              c.value as value
+            from counter c
+            join counter_track ct on ct.id = c.track_id
+            where ct.name glob 'batt.*'
+            order by c.ts
+            """
+        ).as_pandas_dataframe()
+
+        if df.empty:
+            return df
+
+        def last(series: pd.Series) -> float:
+            s = pd.to_numeric(series, errors="coerce").dropna()
+            return float(s.iloc[-1])
+
+        piv = df.pivot_table(index="ts", columns="name", values="value", aggfunc=last).reset_index()
+        piv = piv.sort_values("ts").reset_index(drop=True)
+
+        t0 = int(piv["ts"].iloc[0])
+        piv.insert(1, "t_s", (piv["ts"] - t0) / 1e9)
+        return piv
+
+    if not trace.exists():
+        raise FileNotFoundError(f"Trace not found: {trace}")
+
+    out_dir = out_dir or trace.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    label = label or trace.stem
+
+    with span("trace_query"), _open_trace(trace) as tp:
+        ts = load_batt_counters(tp)
+
+    if ts.empty:
+        raise RuntimeError("No batt.* counter tracks found in trace.")
 
+    summary = summarize_battery_counters(ts, label=label, trace_path=str(trace))
+    with span("write"):
+        write_battery_counter_outputs(summary, None if no_timeseries else ts, out_dir)
     return summary
 
 
@@ -327,7 +377,7 @@ def parse_perfetto_policy_markers(
     keywords: list[str] | None = None,
     max_rows: int = 20000,
 ) -> PolicyMarkersSummary:
-    from perfetto.trace_processor import TraceProcessor
+    import pandas as pd
 
     if not trace.exists():
         raise FileNotFoundError(f"Trace not found: {trace}")
@@ -353,7 +403,7 @@ def parse_perfetto_policy_markers(
     notes: list[str] = []
     markers = pd.DataFrame()
 
-    with TraceProcessor(trace=str(trace)) as tp:
+    with span("trace_query"), _open_trace(trace) as tp:
         cols = tp.query("pragma table_info(slice)").as_pandas_dataframe()
         colnames = set(str(x) for x in cols["name"].tolist()) if not cols.empty and "name" in cols.columns else set()
         cat_col = "category" if "category" in colnames else ("cat" if "cat" in colnames else None)
@@ -428,6 +478,558 @@ def parse_perfetto_policy_markers(
     return summary
 
 
+# cpu_idle "exit" marker (PWR_EVENT_EXIT = (u32)-1): the CPU left idle and is running.
+_CPU_IDLE_EXIT = 4294967295
+
+
+@dataclass(frozen=True)
+class CpuPowerSummary:
+    trace_path: str
+    out_dir: str
+    bin_ms: float
+    duration_s: float
+    n_cpus: int
+
+    voltage_source: str
+    voltage_v_mean: float | None
+
+    energy_mj_total: float
+    cpu_power_mw_mean: float | None
+    energy_mj_by_cluster: dict[str, float]
+
+    # CPU-time (s) with known freq + idle state, over total CPU-time in the window.
+    coverage: float
+    active_s_by_cpu: dict[str, float]
+    idle_s_by_cpu: dict[str, float]
+    unknown_s_by_cpu: dict[str, float]
+    notes: list[str]
+
+
+def _policy_for_cpu(cpu: int, policies: list[int]) -> int | None:
+    # cpufreq names each policy after its first CPU (policy0: cpu0-3, policy4: cpu4-6, ...).
+    owners = [p for p in policies if p <= cpu]
+    return max(owners) if owners else None
+
+
+def _load_cpu_freq_idle_events(tp) -> tuple[pd.DataFrame, pd.DataFrame, tuple[int, int] | None]:
+    events = tp.query(
+        """
+        select
+          c.ts as ts,
+          t.cpu as cpu,
+          t.name as name,
+          c.value as value
+        from counter c
+        join cpu_counter_track t on t.id = c.track_id
+        where t.name in ('cpufreq', 'cpuidle')
+        order by c.ts
+        """
+    ).as_pandas_dataframe()
+
+    volt = tp.query(
+        """
+        select c.ts as ts, c.value as value
+        from counter c
+        join counter_track ct on ct.id = c.track_id
+        where ct.name = 'batt.voltage_uv'
+        order by c.ts
+        """
+    ).as_pandas_dataframe()
+
+    bounds = None
+    try:
+        b = tp.query("select start_ts, end_ts from trace_bounds").as_pandas_dataframe()
+        if not b.empty:
+            bounds = (int(b["start_ts"].iloc[0]), int(b["end_ts"].iloc[0]))
+    except Exception:
+        bounds = None
+    return events, volt, bounds
+
+
+def compute_cpu_power_from_events(
+    events: pd.DataFrame,
+    *,
+    mapping: dict[int, int],
+    cluster_tables: dict[int, ClusterTable],
+    voltage: pd.DataFrame | None = None,
+    voltage_mv: float | None = None,
+    bounds: tuple[int, int] | None = None,
+    bin_ms: float = 50.0,
+) -> tuple[pd.DataFrame, pd.DataFrame, dict[str, object]]:
+    """Integrate per-CPU power over cpu_frequency/cpu_idle intervals.
+
+    `events` has columns ts (ns), cpu, name ('cpufreq' | 'cpuidle'), value. A CPU draws its
+    cluster's `core_power` current at the current frequency while not in an idle state, and
+    nothing while idle. Energy is integrated exactly between state changes (piecewise-constant
+    power, so the cumulative energy is piecewise-linear) and then resampled onto `bin_ms` bins.
+
+    Returns (timeseries, residency, stats).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if events.empty:
+        raise RuntimeError("No cpufreq/cpuidle counter tracks found in trace.")
+
+    ev = events.copy()
+    ev["ts"] = pd.to_numeric(ev["ts"], errors="coerce")
+    ev["cpu"] = pd.to_numeric(ev["cpu"], errors="coerce")
+    ev["value"] = pd.to_numeric(ev["value"], errors="coerce")
+    ev = ev.dropna(subset=["ts", "cpu", "value"]).sort_values("ts", kind="stable")
+    ev["ts"] = ev["ts"].astype("int64")
+    ev["cpu"] = ev["cpu"].astype(int)
+
+    if bounds is not None and bounds[1] > bounds[0]:
+        t_start, t_end = int(bounds[0]), int(bounds[1])
+    else:
+        t_start, t_end = int(ev["ts"].iloc[0]), int(ev["ts"].iloc[-1])
+    if t_end <= t_start:
+        raise RuntimeError("cpufreq/cpuidle events span an empty window.")
+
+    notes: list[str] = []
+
+    # Voltage as a step function (held backwards before the first sample).
+    v_ts = np.array([], dtype=np.int64)
+    v_val = np.array([], dtype=float)
+    voltage_source = "fixed"
+    if voltage is not None and not voltage.empty:
+        vv = pd.to_numeric(voltage["value"], errors="coerce")
+        vt = pd.to_numeric(voltage["ts"], errors="coerce")
+        ok = vv.notna() & vt.notna()
+        if ok.any():
+            med = float(vv[ok].median())
+            scale_mv = 1.0 if med < 100_000 else 1e-3  # mV vs uV, as in infer_voltage_scale()
+            v_ts = vt[ok].to_numpy(dtype=np.int64)
+            v_val = vv[ok].to_numpy(dtype=float) * scale_mv
+            voltage_source = "batt.voltage_uv"
+    if voltage_source == "fixed":
+        if voltage_mv is None or not np.isfinite(float(voltage_mv)) or float(voltage_mv) <= 0:
+            raise RuntimeError("No batt.voltage_uv counters in trace; pass voltage_mv.")
+        notes.append(f"voltage fixed at {float(voltage_mv):.1f} mV (no batt.voltage_uv in trace)")
+
+    policies = sorted(mapping.keys())
+    cpus = sorted(int(c) for c in ev["cpu"].unique())
+
+    by_cpu: dict[int, dict[str, tuple[np.ndarray, np.ndarray]]] = {}
+    for cpu in cpus:
+        sub = ev[ev["cpu"] == cpu]
+        by_cpu[cpu] = {}
+        for name in ("cpufreq", "cpuidle"):
+            s = sub[sub["name"] == name]
+            by_cpu[cpu][name] = (s["ts"].to_numpy(dtype=np.int64), s["value"].to_numpy(dtype=float))
+
+    edges = np.arange(t_start, t_end, int(max(1.0, float(bin_ms)) * 1e6), dtype=np.int64)
+    edges = np.append(edges, t_end)
+    total_bins = np.zeros(len(edges) - 1, dtype=float)
+    cluster_bins: dict[int, np.ndarray] = {}
+
+    residency_rows: list[dict[str, object]] = []
+    active_s: dict[str, float] = {}
+    idle_s: dict[str, float] = {}
+    unknown_s: dict[str, float] = {}
+
+    for cpu in cpus:
+        policy = _policy_for_cpu(cpu, policies)
+        if policy is None or mapping.get(policy) not in cluster_tables:
+            notes.append(f"cpu{cpu}: no policy/cluster mapping; skipped")
+            continue
+        cluster = mapping[policy]
+        table = cluster_tables[cluster]
+
+        f_ts, f_val = by_cpu[cpu]["cpufreq"]
+        if len(f_ts) == 0:
+            # cpu_frequency is per policy; borrow a sibling's events if this CPU has none.
+            for sib in cpus:
+                if sib != cpu and _policy_for_cpu(sib, policies) == policy and len(by_cpu[sib]["cpufreq"][0]):
+                    f_ts, f_val = by_cpu[sib]["cpufreq"]
+                    notes.append(f"cpu{cpu}: no cpufreq events; using cpu{sib}")
+                    break
+        i_ts, i_val = by_cpu[cpu]["cpuidle"]
+
+        bps = np.unique(np.concatenate([[t_start, t_end], f_ts, i_ts, v_ts]))
+        bps = bps[(bps >= t_start) & (bps <= t_end)]
+        seg_t = bps[:-1]
+        seg_dur_s = np.diff(bps).astype(float) / 1e9
+
+        fi = np.searchsorted(f_ts, seg_t, side="right") - 1
+        freq_known = fi >= 0
+        freq = np.where(freq_known, f_val[np.clip(fi, 0, None)] if len(f_val) else 0.0, 0.0)
+
+        if len(i_ts):
+            ii = np.searchsorted(i_ts, seg_t, side="right") - 1
+            idle_val = np.where(ii >= 0, i_val[np.clip(ii, 0, None)], np.nan)
+            running = (idle_val >= _CPU_IDLE_EXIT) | (idle_val < 0)
+            # Before the first event: an exit means the CPU was idling, an entry means it was running.
+            first_exit = bool(i_val[0] >= _CPU_IDLE_EXIT or i_val[0] < 0)
+            running = np.where(ii >= 0, running, not first_exit)
+        else:
+            idle_val = np.full(len(seg_t), np.nan)
+            running = np.ones(len(seg_t), dtype=bool)
+            notes.append(f"cpu{cpu}: no cpu_idle events; treated as always running")
+
+        cur_ma, _ = _lookup_current_ma(table, freq)
+
+        if len(v_ts):
+            vi = np.clip(np.searchsorted(v_ts, seg_t, side="right") - 1, 0, None)
+            v_mv = v_val[vi]
+        else:
+            v_mv = np.full(len(seg_t), float(voltage_mv))  # type: ignore[arg-type]
+
+        active = running & freq_known
+        p_mw = np.where(active, cur_ma * v_mv / 1000.0, 0.0)
+        e_mj = np.concatenate([[0.0], np.cumsum(p_mw * seg_dur_s)])
+        bin_e = np.diff(np.interp(edges.astype(float), bps.astype(float), e_mj))
+        total_bins += bin_e
+        cluster_bins.setdefault(cluster, np.zeros_like(total_bins))
+        cluster_bins[cluster] += bin_e
+
+        key = str(cpu)
+        active_s[key] = float(seg_dur_s[active].sum())
+        idle_s[key] = float(seg_dur_s[~running].sum())
+        unknown_s[key] = float(seg_dur_s[running & ~freq_known].sum())
+
+        if active.any():
+            f_act = freq[active].astype(np.int64)
+            for f in np.unique(f_act):
+                residency_rows.append(
+                    {
+                        "cpu": cpu,
+                        "policy": policy,
+                        "cluster": cluster,
+                        "kind": "freq_khz",
+                        "state": int(f),
+                        "residency_s": float(seg_dur_s[active][f_act == f].sum()),
+                    }
+                )
+        idle_mask = ~running & np.isfinite(idle_val)
+        if idle_mask.any():
+            st = idle_val[idle_mask].astype(np.int64)
+            for s in np.unique(st):
+                residency_rows.append(
+                    {
+                        "cpu": cpu,
+                        "policy": policy,
+                        "cluster": cluster,
+                        "kind": "idle_state",
+                        "state": int(s),
+                        "residency_s": float(seg_dur_s[idle_mask][st == s].sum()),
+                    }
+                )
+
+    width_s = np.diff(edges).astype(float) / 1e9
+    # dt_s is each bin's width (the last bin is usually shorter), so consumers integrate without guessing
+    # widths from the spacing of ts, which spans gaps between stitched segments.
+    ts_out = pd.DataFrame({"ts": edges[:-1], "t_s": (edges[:-1] - t_start) / 1e9, "dt_s": width_s})
+    ts_out["cpu_power_mw"] = total_bins / width_s
+    for cluster in sorted(cluster_bins):
+        ts_out[f"cpu_cluster{cluster}_power_mw"] = cluster_bins[cluster] / width_s
+
+    duration_s = (t_end - t_start) / 1e9
+    cpu_time = duration_s * max(1, len(active_s))
+    known = sum(active_s.values()) + sum(idle_s.values())
+    energy_total = float(total_bins.sum())
+
+    stats: dict[str, object] = {
+        "duration_s": float(duration_s),
+        "n_cpus": len(active_s),
+        "voltage_source": voltage_source,
+        "voltage_v_mean": float(np.mean(v_val) / 1000.0) if len(v_val) else float(voltage_mv) / 1000.0,  # type: ignore[arg-type]
+        "energy_mj_total": energy_total,
+        "cpu_power_mw_mean": energy_total / duration_s if duration_s > 0 else None,
+        "energy_mj_by_cluster": {str(c): float(b.sum()) for c, b in sorted(cluster_bins.items())},
+        "coverage": float(known / cpu_time) if cpu_time > 0 else 0.0,
+        "active_s_by_cpu": active_s,
+        "idle_s_by_cpu": idle_s,
+        "unknown_s_by_cpu": unknown_s,
+        "notes": notes,
+    }
+    return ts_out, pd.DataFrame(residency_rows), stats
+
+
+def parse_perfetto_cpu_power(
+    trace: Path,
+    out_dir: Path | None = None,
+    *,
+    map_json: Path = Path("artifacts/android/power_profile/policy_cluster_map.json"),
+    clusters_dir: Path = Path("artifacts/android/power_profile"),
+    voltage_mv: float | None = None,
+    bin_ms: float = 50.0,
+) -> CpuPowerSummary:
+    """Exact per-cluster CPU power from the ftrace cpu_frequency/cpu_idle events of a policy trace.
+
+    Complements the time_in_state estimate in `enrich_run_with_cpu_energy`, which only sees
+    2 s polls of per-policy frequency residency and no idle states.
+    """
+    if not trace.exists():
+        raise FileNotFoundError(f"Trace not found: {trace}")
+
+    out_dir = out_dir or trace.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    mapping = _load_mapping(map_json)
+    cluster_tables = {c: _load_cluster_csv(clusters_dir / f"cluster{c}_freq_power.csv") for c in sorted(set(mapping.values()))}
+
+    with span("trace_query"), _open_trace(trace) as tp:
+        events, volt, bounds = _load_cpu_freq_idle_events(tp)
+
+    ts, residency, stats = compute_cpu_power_from_events(
+        events,
+        mapping=mapping,
+        cluster_tables=cluster_tables,
+        voltage=volt,
+        voltage_mv=voltage_mv,
+        bounds=bounds,
+        bin_ms=bin_ms,
+    )
+
+    summary = CpuPowerSummary(trace_path=str(trace), out_dir=str(out_dir), bin_ms=float(bin_ms), **stats)  # type: ignore[arg-type]
+    write_cpu_power_outputs(summary, ts, residency, out_dir)
+    return summary
+
+
+def write_cpu_power_outputs(summary: CpuPowerSummary, ts: pd.DataFrame, residency: pd.DataFrame, out_dir: Path) -> None:
+    ts.to_csv(out_dir / "perfetto_cpu_power_timeseries.csv", index=False, encoding="utf-8")
+    _write_timeseries_pyramid(out_dir / "perfetto_cpu_power_timeseries.csv", ts, time_col="ts")
+    residency.to_csv(out_dir / "perfetto_cpu_residency.csv", index=False, encoding="utf-8")
+    (out_dir / "perfetto_cpu_power_summary.json").write_text(
+        json.dumps(asdict(summary), ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+
+
+@dataclass(frozen=True)
+class PowerRailsSummary:
+    trace_path: str
+    out_dir: str
+    n_rails: int
+    duration_s: float
+    energy_mj_total: float | None
+    power_mw_mean_total: float | None
+    energy_mj_by_rail: dict[str, float]
+    power_mw_mean_by_rail: dict[str, float]
+    n_resets_by_rail: dict[str, int]
+    notes: list[str]
+
+
+def _rail_name(track_name: str) -> str:
+    name = str(track_name)
+    for prefix in ("power.rails.", "power."):
+        if name.startswith(prefix):
+            name = name[len(prefix) :]
+            break
+    if name.endswith("_uws"):
+        name = name[: -len("_uws")]
+    return re.sub(r"[^0-9A-Za-z_]+", "_", name).strip("_").lower() or "rail"
+
+
+def compute_power_rails_from_counters(samples: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, list[str]]:
+    """Per-rail energy/power from cumulative ODPM energy counters (uWs).
+
+    `samples` has columns ts (ns), name, value. Each rail's energy is the sum of its counter
+    deltas; a negative delta is a counter reset (HAL restart) and contributes the new value.
+    Interval power is delta / dt and is attributed to the sample that closes the interval.
+    """
+    import numpy as np
+    import pandas as pd
+
+    notes: list[str] = []
+    if samples.empty:
+        return pd.DataFrame(columns=["ts", "t_s"]), pd.DataFrame(), ["no power.rails.* counters in trace"]
+
+    df = samples.copy()
+    df["ts"] = pd.to_numeric(df["ts"], errors="coerce")
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    df = df.dropna(subset=["ts", "value"])
+    df["rail"] = df["name"].map(_rail_name)
+
+    t0 = int(df["ts"].min())
+    wide: pd.DataFrame | None = None
+    rows: list[dict[str, object]] = []
+    for rail, g in df.groupby("rail", sort=True):
+        g = g.sort_values("ts").drop_duplicates(subset="ts", keep="last")
+        ts = g["ts"].to_numpy(dtype=np.int64)
+        e_uws = g["value"].to_numpy(dtype=float)
+        if len(ts) < 2:
+            notes.append(f"rail {rail}: fewer than 2 samples, skipped")
+            continue
+
+        d_uws = np.diff(e_uws)
+        resets = d_uws < 0
+        d_uws = np.where(resets, e_uws[1:], d_uws)
+        dt_s = np.diff(ts) / 1e9
+
+        energy_mj = np.concatenate([[0.0], np.cumsum(d_uws) / 1e3])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_mw = np.where(dt_s > 0, (d_uws / 1e3) / dt_s, np.nan)
+        power_mw = np.concatenate([[np.nan], p_mw])
+
+        part = pd.DataFrame(
+            {
+                "ts": ts,
+                f"rail_{rail}_energy_mj": energy_mj,
+                f"rail_{rail}_power_mw": power_mw,
+            }
+        )
+        wide = part if wide is None else wide.merge(part, on="ts", how="outer")
+
+        duration_s = float((ts[-1] - ts[0]) / 1e9)
+        total_mj = float(energy_mj[-1])
+        rows.append(
+            {
+                "rail": rail,
+                "track": str(g["name"].iloc[0]),
+                "n_samples": int(len(ts)),
+                "duration_s": duration_s,
+                "sample_period_s_median": float(np.median(dt_s)),
+                "n_resets": int(resets.sum()),
+                "energy_mj": total_mj,
+                "power_mw_mean": total_mj / duration_s if duration_s > 0 else None,
+                "power_mw_p95": float(np.nanpercentile(p_mw, 95)) if np.isfinite(p_mw).any() else None,
+            }
+        )
+
+    if wide is None:
+        return pd.DataFrame(columns=["ts", "t_s"]), pd.DataFrame(rows), notes
+
+    wide = wide.sort_values("ts").reset_index(drop=True)
+    # Rails are usually polled together; fill cumulative energy across the union of timestamps.
+    e_cols = [c for c in wide.columns if c.endswith("_energy_mj")]
+    wide[e_cols] = wide[e_cols].ffill()
+    p_cols = [c for c in wide.columns if c.endswith("_power_mw")]
+    wide["rails_power_mw_total"] = wide[p_cols].sum(axis=1, min_count=1)
+    wide.insert(1, "t_s", (wide["ts"] - t0) / 1e9)
+    return wide, pd.DataFrame(rows), notes
+
+
+def parse_perfetto_power_rails(trace: Path, out_dir: Path | None = None) -> PowerRailsSummary:
+    """Per-rail energy from android.power `collect_power_rails` (ODPM) counters.
+
+    Writes perfetto_power_rails_summary.csv/json and perfetto_power_rails_timeseries.csv next
+    to the battery counter outputs. Devices without ODPM produce no rail tracks.
+    """
+    if not trace.exists():
+        raise FileNotFoundError(f"Trace not found: {trace}")
+
+    out_dir = out_dir or trace.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with span("trace_query"), _open_trace(trace) as tp:
+        samples = tp.query(
+            """
+            select c.ts as ts, ct.name as name, c.value as value
+            from counter c
+            join counter_track ct on ct.id = c.track_id
+            where ct.name glob 'power.rails.*' or ct.name glob 'power.*_uws'
+            order by c.ts
+            """
+        ).as_pandas_dataframe()
+
+    ts, per_rail, notes = compute_power_rails_from_counters(samples)
+    if per_rail.empty:
+        raise RuntimeError("No power.rails.* counter tracks found in trace (device may not support ODPM).")
+
+    duration_s = float(ts["t_s"].iloc[-1]) if len(ts) else 0.0
+    summary = summarize_power_rails(per_rail, duration_s, trace_path=str(trace), out_dir=str(out_dir), notes=notes)
+    write_power_rails_outputs(summary, ts, per_rail, out_dir)
+    return summary
+
+
+def summarize_power_rails(
+    per_rail: pd.DataFrame, duration_s: float, *, trace_path: str, out_dir: str, notes: list[str]
+) -> PowerRailsSummary:
+    import pandas as pd
+
+    records = per_rail.to_dict("records")
+    energy_by_rail = {str(r["rail"]): float(r["energy_mj"]) for r in records}
+    power_by_rail = {str(r["rail"]): float(r["power_mw_mean"]) for r in records if pd.notna(r["power_mw_mean"])}
+    energy_total = float(sum(energy_by_rail.values()))
+    return PowerRailsSummary(
+        trace_path=trace_path,
+        out_dir=out_dir,
+        n_rails=int(len(per_rail)),
+        duration_s=float(duration_s),
+        energy_mj_total=energy_total,
+        power_mw_mean_total=energy_total / duration_s if duration_s > 0 else None,
+        energy_mj_by_rail=energy_by_rail,
+        power_mw_mean_by_rail=power_by_rail,
+        n_resets_by_rail={str(r["rail"]): int(r["n_resets"]) for r in records},
+        notes=notes,
+    )
+
+
+def write_power_rails_outputs(
+    summary: PowerRailsSummary, ts: pd.DataFrame, per_rail: pd.DataFrame, out_dir: Path
+) -> None:
+    per_rail.to_csv(out_dir / "perfetto_power_rails_summary.csv", index=False, encoding="utf-8")
+    ts.to_csv(out_dir / "perfetto_power_rails_timeseries.csv", index=False, encoding="utf-8")
+    (out_dir / "perfetto_power_rails_summary.json").write_text(
+        json.dumps(asdict(summary), ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+
+
+PERFETTO_EXTRACTORS = ("android_power", "power_rails", "policy_markers", "cpu_power")
+
+
+def parse_perfetto_batch(
+    traces: list[Path],
+    *,
+    extractors: list[str],
+    pool_size: int = 2,
+    bin_path: str | None = None,
+    map_json: Path = Path("artifacts/android/power_profile/policy_cluster_map.json"),
+    clusters_dir: Path = Path("artifacts/android/power_profile"),
+) -> pd.DataFrame:
+    """Run extractors over many traces on a shared pool of trace_processor_shell servers.
+
+    Outputs land next to each trace, as with the single-trace commands. Traces are processed
+    `pool_size` at a time; the Python side mostly waits on the servers' HTTP RPC.
+    """
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import pandas as pd
+
+    from mp_power.trace_pool import configure_pool
+
+    unknown = [e for e in extractors if e not in PERFETTO_EXTRACTORS]
+    if unknown:
+        raise ValueError(f"unknown extractors: {unknown} (known: {', '.join(PERFETTO_EXTRACTORS)})")
+
+    def run_one(trace: Path) -> list[dict[str, object]]:
+        rows: list[dict[str, object]] = []
+        for name in extractors:
+            t0 = time.perf_counter()
+            err = ""
+            try:
+                if name == "android_power":
+                    parse_perfetto_android_power_counters(trace, out_dir=trace.parent)
+                elif name == "power_rails":
+                    parse_perfetto_power_rails(trace, out_dir=trace.parent)
+                elif name == "policy_markers":
+                    parse_perfetto_policy_markers(trace, out_dir=trace.parent)
+                elif name == "cpu_power":
+                    parse_perfetto_cpu_power(trace, out_dir=trace.parent, map_json=map_json, clusters_dir=clusters_dir)
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"
+            rows.append(
+                {
+                    "trace": str(trace),
+                    "extractor": name,
+                    "ok": not err,
+                    "seconds": round(time.perf_counter() - t0, 3),
+                    "error": err,
+                }
+            )
+        return rows
+
+    configure_pool(pool_size, bin_path=bin_path)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(pool_size))) as ex:
+            results = list(ex.map(run_one, traces))
+    finally:
+        configure_pool(None)
+    return pd.DataFrame([r for rows in results for r in rows])
+
+
 # -----------------------------
 # Batterystats proto (schema-min)
 # -----------------------------
@@ -436,20 +1038,36 @@ def parse_perfetto_policy_markers(
 PROTO_PATH = Path(__file__).parent / "proto" / "android" / "os" / "batterystats_min.proto"
 GEN_DIR = Path(__file__).parent / "_generated"
 PROTO_ROOT = Path(__file__).parent / "proto"
+# The bindings are generated ahead of time (`python -m mp_power.pipeline_ops gen-proto`) and checked in; the
+# stamp holds the sha256 of the .proto they were generated from, so an edited schema is caught at import.
+GEN_MODULE = "mp_power._generated.android.os.batterystats_min_pb2"
+GEN_STAMP = GEN_DIR / "android" / "os" / "batterystats_min.proto.sha256"
 
 
-def _ensure_generated() -> None:
-    target = GEN_DIR / "android" / "os" / "batterystats_min_pb2.py"
-    if target.exists() and target.stat().st_mtime >= PROTO_PATH.stat().st_mtime:
-        return
+def _proto_sha256() -> str:
+    import hashlib
+
+    return hashlib.sha256(PROTO_PATH.read_bytes()).hexdigest()
+
+
+def proto_bindings_fresh() -> bool:
+    """True when the checked-in batterystats_min_pb2 was generated from the current .proto."""
+    try:
+        return GEN_STAMP.read_text(encoding="utf-8").strip() == _proto_sha256()
+    except FileNotFoundError:
+        return False
+
 
+def generate_proto_bindings() -> Path:
+    """Regenerate batterystats_min_pb2.py and its stamp with grpcio-tools (a build-time step, not run on load)."""
     try:
         from grpc_tools import protoc
     except Exception as e:
-        raise RuntimeError("grpcio-tools is required to generate proto bindings") from e
+        raise RuntimeError("grpcio-tools is required to generate proto bindings (pip install grpcio-tools)") from e
 
-    (GEN_DIR / "android" / "os").mkdir(parents=True, exist_ok=True)
-    for p in [GEN_DIR / "android" / "__init__.py", GEN_DIR / "android" / "os" / "__init__.py"]:
+    target = GEN_DIR / "android" / "os" / "batterystats_min_pb2.py"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for p in [GEN_DIR / "__init__.py", GEN_DIR / "android" / "__init__.py", GEN_DIR / "android" / "os" / "__init__.py"]:
         if not p.exists():
             p.write_text("", encoding="utf-8")
 
@@ -462,6 +1080,43 @@ def _ensure_generated() -> None:
     rc = protoc.main(args)
     if rc != 0 or not target.exists():
         raise RuntimeError(f"protoc failed with exit code {rc}")
+    GEN_STAMP.write_text(_proto_sha256() + "\n", encoding="utf-8")
+    return target
+
+
+_PB2 = None
+
+
+def _batterystats_min_pb2():
+    """The batterystats_min_pb2 module, imported once per process (no protoc, no sys.path changes)."""
+    global _PB2
+    if _PB2 is None:
+        import importlib
+
+        if not proto_bindings_fresh():
+            raise RuntimeError(
+                f"{GEN_MODULE} is stale or missing for {PROTO_PATH.name}; "
+                "regenerate with: python -m mp_power.pipeline_ops gen-proto"
+            )
+        try:
+            _PB2 = importlib.import_module(GEN_MODULE)
+        except Exception as e:
+            # e.g. a protobuf runtime older than the gencode (the module validates the version itself).
+            raise RuntimeError(
+                f"cannot import {GEN_MODULE} ({e}); upgrade protobuf or regenerate with: "
+                "python -m mp_power.pipeline_ops gen-proto"
+            ) from e
+    return _PB2
+
+
+def protobuf_backend() -> str:
+    """Active protobuf implementation: upb / cpp (native) or python (pure Python, much slower)."""
+    try:
+        from google.protobuf.internal import api_implementation
+
+        return str(api_implementation.Type())
+    except Exception:
+        return "unknown"
 
 
 @dataclass(frozen=True)
@@ -498,12 +1153,14 @@ def _get_int(obj, attr: str) -> int | None:
 
 
 def load_batterystats_min_snapshot(pb_path: Path) -> BsMinSnapshot:
-    _ensure_generated()
-    sys.path.insert(0, str(GEN_DIR))
-    from android.os import batterystats_min_pb2  # type: ignore
+    return load_batterystats_min_snapshot_bytes(pb_path.read_bytes())
+
 
-    dump = batterystats_min_pb2.BatteryStatsServiceDumpProto()
-    dump.ParseFromString(pb_path.read_bytes())
+@profiled("batterystats_proto_parse")
+def load_batterystats_min_snapshot_bytes(blob: bytes) -> BsMinSnapshot:
+    """Parse a `dumpsys batterystats --proto` blob already in memory (e.g. tee'd while streaming the dump)."""
+    dump = _batterystats_min_pb2().BatteryStatsServiceDumpProto()
+    dump.ParseFromString(blob)
 
     msg = dump.batterystats if dump.HasField("batterystats") else None
     system = msg.system if msg and msg.HasField("system") else None
@@ -527,6 +1184,29 @@ def load_batterystats_min_snapshot(pb_path: Path) -> BsMinSnapshot:
     )
 
 
+def parse_batterystats_min_batch(pb_paths: list[Path], out_csv: Path | None = None) -> list[dict[str, object]]:
+    """One row per .pb snapshot (path, ok, error and the BsMinSnapshot fields); optionally written as CSV."""
+    from dataclasses import fields
+
+    cols = ["path", "ok", "error", *(f.name for f in fields(BsMinSnapshot))]
+    rows: list[dict[str, object]] = []
+    for pb in pb_paths:
+        row: dict[str, object] = {"path": str(pb), "ok": 1, "error": ""}
+        try:
+            row.update(asdict(load_batterystats_min_snapshot(pb)))
+        except Exception as e:
+            row.update(ok=0, error=f"{type(e).__name__}: {e}")
+        rows.append(row)
+    if out_csv is not None:
+        out_csv.parent.mkdir(parents=True, exist_ok=True)
+        with out_csv.open("w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=cols)
+            w.writeheader()
+            for r in rows:
+                w.writerow({c: "" if r.get(c) is None else r.get(c) for c in cols})
+    return rows
+
+
 def diff_batterystats_min(a: BsMinSnapshot, b: BsMinSnapshot) -> dict[str, int | None]:
     out: dict[str, int | None] = {}
     a_dict = asdict(a)
@@ -581,9 +1261,14 @@ def write_batterystats_min_summary(
     out_json: Path,
     out_csv: Path,
     label: str | None = None,
+    start: BsMinSnapshot | None = None,
+    end: BsMinSnapshot | None = None,
 ) -> None:
-    end = load_batterystats_min_snapshot(end_pb)
-    start = load_batterystats_min_snapshot(start_pb) if start_pb else None
+    """Write the START/END delta summary; already-parsed snapshots skip re-reading the .pb files."""
+    if end is None:
+        end = load_batterystats_min_snapshot(end_pb)
+    if start is None and start_pb:
+        start = load_batterystats_min_snapshot(start_pb)
     delta = diff_batterystats_min(start, end) if start else None
     derived = derive_batterystats_min(delta)
 
@@ -639,6 +1324,24 @@ def _load_cluster_csv(path: Path) -> ClusterTable:
     return ClusterTable(freqs_khz=freqs, current_ma=current)
 
 
+def _lookup_current_ma(table: ClusterTable, freqs_khz):
+    """Vectorised freq -> current_ma; unmatched freqs take the nearest table entry (ties go low).
+
+    Returns (current_ma, matched) arrays.
+    """
+    import numpy as np
+
+    order = np.argsort(np.asarray(table.freqs_khz, dtype=np.int64), kind="stable")
+    tf = np.asarray(table.freqs_khz, dtype=np.int64)[order]
+    tc = np.asarray(table.current_ma, dtype=float)[order]
+
+    f = np.asarray(freqs_khz, dtype=np.int64)
+    hi = np.clip(np.searchsorted(tf, f, side="left"), 0, len(tf) - 1)
+    lo = np.clip(hi - 1, 0, len(tf) - 1)
+    pick = np.where(np.abs(f - tf[lo]) <= np.abs(tf[hi] - f), lo, hi)
+    return tc[pick], tf[pick] == f
+
+
 def _load_mapping(path: Path) -> dict[int, int]:
     obj = json.loads(path.read_text(encoding="utf-8"))
     mp = obj.get("mapping_policy_to_cluster") or {}
@@ -665,14 +1368,379 @@ def _load_power_profile_items(profile_json: Path) -> dict[str, float]:
     return out
 
 
-def _parse_ts(ts: str) -> datetime | None:
-    ts = (ts or "").strip()
-    if not ts:
-        return None
+ENRICH_ENGINES = ("vectorized", "rows")
+ENRICH_CHUNK_READERS = ("pandas", "arrow")
+
+# Bump when EnrichPlan's layout or the way it is compiled changes (invalidates cached plans).
+ENRICH_PLAN_VERSION = 1
+
+
+@dataclass(frozen=True)
+class EnrichPlanColumn:
+    index: int
+    name: str
+    policy: int
+    freq_khz: int
+    current_ma: float
+    # False: freq not in the cluster table; current_ma is the nearest entry's (ties go low).
+    matched: bool
+
+
+@dataclass(frozen=True)
+class EnrichPlan:
+    """Everything enrichment derives from the run header + policy map + power profile, compiled once."""
+
+    key: str
+    header: list[str]
+    out_fields: list[str]
+    policies: list[int]
+    columns: list[EnrichPlanColumn]
+    screen_on_ma: float | None
+    screen_full_ma: float | None
+
+    def policy_columns(self, policy: int) -> list[EnrichPlanColumn]:
+        return [c for c in self.columns if c.policy == policy]
+
+
+def compile_enrich_plan(
+    header: list[str],
+    *,
+    mapping: dict[int, int],
+    cluster_tables: dict[int, ClusterTable],
+    items_ma: dict[str, float],
+    key: str = "",
+) -> EnrichPlan:
+    columns: list[EnrichPlanColumn] = []
+    for policy in sorted(mapping.keys()):
+        table = cluster_tables[mapping[policy]]
+        # Last entry wins for duplicate freqs, as in a {freq: ma} dict.
+        lookup = {f: ma for f, ma in zip(table.freqs_khz, table.current_ma)}
+        dedup = ClusterTable(freqs_khz=list(lookup.keys()), current_ma=list(lookup.values()))
+
+        prefix = f"cpu_p{policy}_freq"
+        suffix = "_dt"
+        idx: list[int] = []
+        freqs: list[int] = []
+        for i, k in enumerate(header):
+            if not k.startswith(prefix) or not k.endswith(suffix):
+                continue
+            try:
+                freqs.append(int(k[len(prefix) : -len(suffix)]))
+            except Exception:
+                continue
+            idx.append(i)
+        if not idx:
+            continue
+
+        cur_ma, matched = _lookup_current_ma(dedup, freqs)
+        for i, f, ma, m in zip(idx, freqs, cur_ma.tolist(), matched.tolist()):
+            columns.append(
+                EnrichPlanColumn(index=i, name=header[i], policy=policy, freq_khz=f, current_ma=float(ma), matched=bool(m))
+            )
+
+    return EnrichPlan(
+        key=key,
+        header=list(header),
+        out_fields=_enrich_out_fields(list(header), mapping),
+        policies=sorted(mapping.keys()),
+        columns=columns,
+        screen_on_ma=items_ma.get("screen.on"),
+        screen_full_ma=items_ma.get("screen.full"),
+    )
+
+
+def load_enrich_plan(
+    header: list[str],
+    *,
+    map_json: Path,
+    clusters_dir: Path,
+    profile_json: Path,
+    cache_dir: Path | None = None,
+) -> EnrichPlan:
+    """Compiled plan for `header`, cached under clusters_dir/_enrich_plans keyed on content hashes.
+
+    The key covers the header, policy map, the referenced cluster tables and power_profile.json, so
+    a re-parsed profile or re-mapped policy invalidates stale plans automatically.
+    """
+    import hashlib
+
+    mapping = _load_mapping(map_json)
+    cluster_csvs = {c: clusters_dir / f"cluster{c}_freq_power.csv" for c in sorted(set(mapping.values()))}
+
+    h = hashlib.sha256()
+    h.update(f"enrich-plan-v{ENRICH_PLAN_VERSION}\n".encode("utf-8"))
+    h.update(json.dumps(list(header)).encode("utf-8"))
+    for p in [map_json, *cluster_csvs.values(), profile_json]:
+        h.update(f"\n{p.name}\n".encode("utf-8"))
+        h.update(p.read_bytes() if p.exists() else b"<missing>")
+    key = h.hexdigest()[:20]
+
+    cache_dir = cache_dir or (clusters_dir / "_enrich_plans")
+    cache_path = cache_dir / f"{key}.json"
+    if cache_path.exists():
+        try:
+            obj = json.loads(cache_path.read_text(encoding="utf-8"))
+            obj["columns"] = [EnrichPlanColumn(**c) for c in obj["columns"]]
+            plan = EnrichPlan(**obj)
+            if plan.header == list(header):
+                return plan
+        except Exception:
+            pass
+
+    plan = compile_enrich_plan(
+        list(header),
+        mapping=mapping,
+        cluster_tables={c: _load_cluster_csv(p) for c, p in cluster_csvs.items()},
+        items_ma=_load_power_profile_items(profile_json),
+        key=key,
+    )
     try:
-        return datetime.fromisoformat(ts)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(asdict(plan), ensure_ascii=False) + "\n", encoding="utf-8")
+        tmp.replace(cache_path)
     except Exception:
+        # Cache is an optimisation only (read-only checkout, concurrent writers, ...).
+        pass
+    return plan
+
+
+def _read_csv_header(run_csv: Path) -> list[str]:
+    with run_csv.open("r", encoding="utf-8", newline="") as f:
+        return list(next(csv.reader(f), []))
+
+
+def _enrich_out_fields(in_fields: list[str], mapping: dict[int, int]) -> list[str]:
+    out_fields = list(in_fields)
+    for policy in sorted(mapping.keys()):
+        for suffix in ["energy_mJ", "energy_mJ_matched", "energy_mJ_unmatched", "avg_power_mW"]:
+            col = f"cpu_policy{policy}_{suffix}"
+            if col not in out_fields:
+                out_fields.append(col)
+        col = f"cpu_policy{policy}_unmatched_dt_ms"
+        if col not in out_fields:
+            out_fields.append(col)
+    for col in ["cpu_energy_mJ_total", "battery_discharge_energy_mJ", "dt_s"]:
+        if col not in out_fields:
+            out_fields.append(col)
+
+    for col in ["screen_brightness_norm", "screen_power_mW_est", "screen_energy_mJ_est"]:
+        if col not in out_fields:
+            out_fields.append(col)
+    return out_fields
+
+
+# Component estimators: per-row current of a component from power_profile items_ma and the run's
+# state columns / scenario params. Each one adds {name}_power_mW_est and {name}_energy_mJ_est.
+# Screen stays built in above (shared with the row engine); these run in the vectorized pass only.
+
+DEFAULT_SCENARIO_PARAMS = Path("configs/scenario_params.csv")
+
+
+@dataclass
+class EstimatorInputs:
+    """What a component estimator can read for one block of rows (no extra file I/O)."""
+
+    df: pd.DataFrame
+    items_ma: dict[str, float]
+    scenario_params: dict[str, dict[str, float]]
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def column(self, name: str):
+        """Run CSV column as float64 (NaN when missing or unparseable)."""
+        import numpy as np
+        import pandas as pd
+
+        if name not in self.df.columns:
+            return np.full(len(self.df), np.nan)
+        return pd.to_numeric(self.df[name].str.strip(), errors="coerce").to_numpy(dtype=float)
+
+    def param(self, name: str, default: float = float("nan")):
+        """Per-row scenario-level parameter from configs/scenario_params.csv, keyed on `scenario`."""
+        import numpy as np
+        import pandas as pd
+
+        if "scenario" not in self.df.columns:
+            return np.full(len(self.df), default, dtype=float)
+        table = {s: p[name] for s, p in self.scenario_params.items() if name in p}
+        vals = self.df["scenario"].str.strip().map(table)
+        return pd.to_numeric(vals, errors="coerce").fillna(default).to_numpy(dtype=float)
+
+    def display_off(self):
+        """Explicit non-ON display_state (blank = unknown, not off), as in the screen estimate."""
+        import numpy as np
+
+        if "display_state" not in self.df.columns:
+            return np.zeros(len(self.df), dtype=bool)
+        st = self.df["display_state"].str.strip().str.upper()
+        return ((st != "") & (st != "ON")).to_numpy()
+
+    def device_idle(self):
+        """Doze per `dumpsys power` (sampler --policy-services power); False when not sampled."""
+        return self.column("policy_power_device_idle") == 1.0
+
+
+@dataclass(frozen=True)
+class ComponentEstimator:
+    name: str
+    # power_profile items_ma keys; all must exist or the estimator's columns stay blank.
+    items: tuple[str, ...]
+    # Run CSV columns / scenario params read (for docs and dependency tracking).
+    columns: tuple[str, ...]
+    params: tuple[str, ...]
+    # EstimatorInputs -> per-row current in mA (NaN = state unknown).
+    current_ma: Callable[[EstimatorInputs], object]
+
+    @property
+    def out_fields(self) -> list[str]:
+        return [f"{self.name}_power_mW_est", f"{self.name}_energy_mJ_est"]
+
+
+COMPONENT_ESTIMATORS: dict[str, ComponentEstimator] = {}
+
+
+def register_estimator(est: ComponentEstimator) -> ComponentEstimator:
+    COMPONENT_ESTIMATORS[est.name] = est
+    return est
+
+
+def _on(flag):
+    """Scenario flag -> 1.0 / 0.0, NaN stays NaN (unknown)."""
+    import numpy as np
+
+    flag = np.asarray(flag, dtype=float)
+    return np.where(np.isnan(flag), np.nan, (flag >= 0.5).astype(float))
+
+
+register_estimator(
+    ComponentEstimator(
+        name="wifi",
+        items=("wifi.on",),
+        columns=("scenario",),
+        params=("wifi_on",),
+        # Associated/idle current; traffic (wifi.active) is not observable from the sampler.
+        current_ma=lambda x: x.items_ma["wifi.on"] * _on(x.param("wifi_on", 1.0)),
+    )
+)
+register_estimator(
+    ComponentEstimator(
+        name="cellular",
+        items=("radio.on",),
+        columns=("scenario",),
+        params=("cellular_on",),
+        # radio.on is often a per-signal-level array in the overlay; then it is absent from items_ma.
+        current_ma=lambda x: x.items_ma["radio.on"] * _on(x.param("cellular_on", 1.0)),
+    )
+)
+register_estimator(
+    ComponentEstimator(
+        name="gps",
+        items=("gps.on",),
+        columns=("scenario", "policy_power_device_idle"),
+        params=("gps_on",),
+        # Location requests are deferred in doze.
+        current_ma=lambda x: x.items_ma["gps.on"] * _on(x.param("gps_on")) * ~x.device_idle(),
+    )
+)
+register_estimator(
+    ComponentEstimator(
+        name="bluetooth",
+        items=("bluetooth.on",),
+        columns=("scenario",),
+        params=("bluetooth_on",),
+        current_ma=lambda x: x.items_ma["bluetooth.on"] * _on(x.param("bluetooth_on")),
+    )
+)
+register_estimator(
+    ComponentEstimator(
+        name="camera",
+        items=("camera.avg",),
+        columns=("scenario", "display_state"),
+        params=("camera_on",),
+        # A camera session needs the display on.
+        current_ma=lambda x: x.items_ma["camera.avg"] * _on(x.param("camera_on", 0.0)) * ~x.display_off(),
+    )
+)
+
+
+@dataclass(frozen=True)
+class EnabledEstimators:
+    estimators: tuple[ComponentEstimator, ...]
+    items_ma: dict[str, float]
+    scenario_params: dict[str, dict[str, float]]
+
+    @property
+    def out_fields(self) -> list[str]:
+        return [c for e in self.estimators for c in e.out_fields]
+
+
+def _load_scenario_params_table(path: Path) -> dict[str, dict[str, float]]:
+    """scenario -> {param: value} for the numeric cells of configs/scenario_params.csv."""
+    if not path.exists():
+        return {}
+    out: dict[str, dict[str, float]] = {}
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            scen = str(row.get("scenario") or "").strip()
+            if not scen:
+                continue
+            vals: dict[str, float] = {}
+            for k, v in row.items():
+                if k is None or k == "scenario":
+                    continue
+                try:
+                    vals[str(k).strip()] = float(str(v).strip())
+                except ValueError:
+                    continue
+            out[scen] = vals
+    return out
+
+
+def load_estimators(
+    names: list[str] | str | None,
+    *,
+    profile_json: Path = Path("artifacts/android/power_profile/power_profile.json"),
+    scenario_params: Path = DEFAULT_SCENARIO_PARAMS,
+) -> EnabledEstimators | None:
+    """Resolve estimator names ("all" or a comma list) against the registry; None when empty."""
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",") if n.strip()]
+    if not names:
         return None
+    if names == ["all"]:
+        names = list(COMPONENT_ESTIMATORS.keys())
+    unknown = [n for n in names if n not in COMPONENT_ESTIMATORS]
+    if unknown:
+        raise ValueError(f"unknown estimators: {unknown} (registered: {sorted(COMPONENT_ESTIMATORS)})")
+    return EnabledEstimators(
+        estimators=tuple(COMPONENT_ESTIMATORS[n] for n in names),
+        items_ma=_load_power_profile_items(profile_json),
+        scenario_params=_load_scenario_params_table(scenario_params),
+    )
+
+
+def _run_estimators(enabled: EnabledEstimators, df: pd.DataFrame, v_f, v_ok, dt_rounded) -> dict[str, list[str]]:
+    import numpy as np
+
+    n = len(df)
+    x = EstimatorInputs(df=df, items_ma=enabled.items_ma, scenario_params=enabled.scenario_params)
+    dt = np.nan_to_num(dt_rounded)
+    dt_ok = ~np.isnan(dt_rounded) & (dt > 0)
+    out: dict[str, list[str]] = {}
+    for est in enabled.estimators:
+        p_col, e_col = est.out_fields
+        if any(k not in enabled.items_ma for k in est.items):
+            out[p_col] = [""] * n
+            out[e_col] = [""] * n
+            continue
+        ma = np.broadcast_to(np.asarray(est.current_ma(x), dtype=float), (n,))
+        ok = ~np.isnan(ma) & v_ok
+        p_mw = np.where(ok, np.nan_to_num(ma) * v_f / 1000.0, 0.0)
+        out[p_col] = _fmt_fixed(p_mw, ok)
+        out[e_col] = _fmt_fixed(p_mw * dt, ok & dt_ok)
+    return out
 
 
 def enrich_run_with_cpu_energy(
@@ -686,61 +1754,398 @@ def enrich_run_with_cpu_energy(
     charge_col: str = "charge_counter_uAh",
     brightness_col: str = "brightness",
     brightness_max: float = 255.0,
+    engine: str = "vectorized",
+    chunk_rows: int | None = None,
+    chunk_reader: str = "pandas",
+    estimators: list[str] | str | None = None,
+    scenario_params: Path = DEFAULT_SCENARIO_PARAMS,
 ) -> None:
-    mapping = _load_mapping(map_json)
+    """Add per-policy CPU energy, screen estimate and charge-counter discharge energy to a run CSV.
+
+    engine="vectorized" (default) computes whole columns with NumPy; engine="rows" is the original
+    per-row csv implementation, kept as the reference. Both write the same columns and values.
+
+    chunk_rows bounds the vectorized engine's memory for multi-GB soak runs: the CSV is read and
+    written `chunk_rows` rows at a time (pandas chunks, or Arrow record batches with
+    chunk_reader="arrow"), carrying the previous timestamp/charge across chunk boundaries.
+
+    estimators ("all" or names from COMPONENT_ESTIMATORS) adds per-component power/energy
+    estimates from power_profile items, run state columns and `scenario_params`.
+    """
+    if engine not in ENRICH_ENGINES:
+        raise ValueError(f"unknown enrich engine: {engine} (expected one of {ENRICH_ENGINES})")
+    if chunk_reader not in ENRICH_CHUNK_READERS:
+        raise ValueError(f"unknown chunk reader: {chunk_reader} (expected one of {ENRICH_CHUNK_READERS})")
+    if chunk_rows is not None and chunk_rows < 1:
+        raise ValueError("chunk_rows must be >= 1")
+    if chunk_rows and engine == "rows":
+        raise ValueError("chunk_rows applies to the vectorized engine (the row engine already streams)")
+    with span("plan"):
+        enabled = load_estimators(estimators, profile_json=profile_json, scenario_params=scenario_params)
+        if enabled is not None and engine == "rows":
+            raise ValueError("component estimators need the vectorized engine")
+
+        plan = load_enrich_plan(
+            _read_csv_header(run_csv), map_json=map_json, clusters_dir=clusters_dir, profile_json=profile_json
+        )
+    kwargs = dict(
+        voltage_col=voltage_col,
+        charge_col=charge_col,
+        brightness_col=brightness_col,
+        brightness_max=brightness_max,
+    )
+    if engine == "rows":
+        _enrich_rows(run_csv, out_csv, plan, **kwargs)  # type: ignore[arg-type]
+    else:
+        _enrich_vectorized(
+            run_csv,
+            out_csv,
+            plan,
+            chunk_rows=chunk_rows,
+            chunk_reader=chunk_reader,
+            estimators=enabled,
+            **kwargs,  # type: ignore[arg-type]
+        )
+
 
-    items_ma = _load_power_profile_items(profile_json)
-    screen_on_ma = items_ma.get("screen.on")
-    screen_full_ma = items_ma.get("screen.full")
+def _fmt_fixed(values, valid, digits: int = 3):
+    """'%.{digits}f' strings where valid, '' elsewhere (matches the row engine's f-strings)."""
+    import numpy as np
 
-    cluster_tables: dict[int, ClusterTable] = {}
-    for cluster in sorted(set(mapping.values())):
-        cluster_tables[cluster] = _load_cluster_csv(clusters_dir / f"cluster{cluster}_freq_power.csv")
+    spec = f".{digits}f"
+    vals = np.asarray(values, dtype=float).tolist()
+    ok = np.broadcast_to(np.asarray(valid, dtype=bool), (len(vals),)).tolist()
+    return [format(v, spec) if m else "" for v, m in zip(vals, ok)]
 
-    policy_lookup: dict[int, dict[int, float]] = {}
-    policy_freqs_sorted: dict[int, list[int]] = {}
-    for policy, cluster in mapping.items():
-        table = cluster_tables[cluster]
-        policy_lookup[policy] = {f: ma for f, ma in zip(table.freqs_khz, table.current_ma)}
-        policy_freqs_sorted[policy] = sorted(table.freqs_khz)
+
+def _read_numeric_columns(run_csv: Path, cols: list[str]) -> pd.DataFrame:
+    """Selected run CSV columns as float64 via the C parser; unparseable cells become NaN.
+
+    round_trip precision gives the same doubles as Python's float() on each cell.
+    """
+    import pandas as pd
+
+    if not cols:
+        return pd.DataFrame()
+    num = pd.read_csv(run_csv, usecols=cols, float_precision="round_trip", encoding="utf-8", low_memory=False)
+    return _coerce_numeric(num)
+
+
+def _coerce_numeric(num: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+
+    # Columns the C parser left as text (a garbage cell somewhere) fall back to per-cell coercion.
+    for c in num.columns:
+        if not pd.api.types.is_numeric_dtype(num[c]):
+            num[c] = pd.to_numeric(num[c].astype(str).str.strip(), errors="coerce")
+    return num.astype(float)
+
+
+def _float_or_nan(v: object) -> float:
+    try:
+        return float(v)  # type: ignore[arg-type]
+    except Exception:
+        return float("nan")
+
+
+def _iter_run_frames(
+    run_csv: Path,
+    numeric_cols: list[str],
+    *,
+    chunk_rows: int | None,
+    chunk_reader: str,
+):
+    """Yield (raw str frame, float64 frame of numeric_cols) for the whole run or per chunk."""
+    import pandas as pd
+
+    str_opts = dict(dtype=str, keep_default_na=False, na_filter=False, encoding="utf-8")
+    if not chunk_rows:
+        yield pd.read_csv(run_csv, **str_opts), _read_numeric_columns(run_csv, numeric_cols)
+        return
+
+    if chunk_reader == "arrow":
+        yield from _iter_run_frames_arrow(run_csv, numeric_cols, chunk_rows=chunk_rows)
+        return
+
+    # Two lockstep readers over the same file: raw strings for pass-through, C-parsed floats for math.
+    with pd.read_csv(run_csv, chunksize=chunk_rows, **str_opts) as str_it:
+        if not numeric_cols:
+            for df in str_it:
+                yield df, pd.DataFrame(index=range(len(df)))
+            return
+        with pd.read_csv(
+            run_csv, usecols=numeric_cols, float_precision="round_trip", encoding="utf-8", chunksize=chunk_rows
+        ) as num_it:
+            for df, num in zip(str_it, num_it):
+                yield df, _coerce_numeric(num)
+
+
+def _iter_run_frames_arrow(run_csv: Path, numeric_cols: list[str], *, chunk_rows: int):
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+
+    header = _read_csv_header(run_csv)
+    # Arrow batches by bytes; size blocks from the mean line length so a batch is ~chunk_rows rows.
+    with run_csv.open("rb") as f:
+        sample = f.read(1 << 20)
+    line_bytes = max(1, len(sample) // max(1, sample.count(b"\n")))
+    read_opts = pacsv.ReadOptions(block_size=max(1 << 16, int(chunk_rows * line_bytes)))
+    conv_opts = pacsv.ConvertOptions(
+        column_types={c: pa.string() for c in header},
+        strings_can_be_null=False,
+        quoted_strings_can_be_null=False,
+    )
+
+    def to_float(col) -> "np.ndarray":
+        try:
+            trimmed = pc.utf8_trim_whitespace(col)
+            blank = pc.equal(trimmed, "")
+            return pc.cast(pc.if_else(blank, pa.scalar(None, pa.string()), trimmed), pa.float64()).to_numpy(
+                zero_copy_only=False
+            )
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return np.array([_float_or_nan(v) for v in col.to_pylist()], dtype=float)
+
+    with pacsv.open_csv(run_csv, read_options=read_opts, convert_options=conv_opts) as reader:
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            df = batch.to_pandas()
+            num = pd.DataFrame({c: to_float(batch.column(c)) for c in numeric_cols}, index=df.index)
+            yield df, num
+
+
+def _trunc_int(values):
+    """int(float(x)) per cell as (int64 values, valid mask); NaN/inf (blank, garbage) are invalid."""
+    import numpy as np
+
+    v = np.asarray(values, dtype=float)
+    ok = np.isfinite(v)
+    return np.where(ok, np.trunc(np.where(ok, v, 0.0)), 0).astype(np.int64), ok
+
+
+@dataclass
+class EnrichState:
+    """Cross-row state carried between chunks: last parseable timestamp and charge counter."""
+
+    prev_t_ns: int | None = None
+    prev_charge_uah: int | None = None
+
+
+def _enrich_vectorized(
+    run_csv: Path,
+    out_csv: Path,
+    plan: EnrichPlan,
+    *,
+    voltage_col: str,
+    charge_col: str,
+    brightness_col: str,
+    brightness_max: float,
+    chunk_rows: int | None = None,
+    chunk_reader: str = "pandas",
+    estimators: EnabledEstimators | None = None,
+) -> None:
+    # Raw strings pass through untouched; numbers come from a C-parser read of the needed columns.
+    want = [c for c in (voltage_col, charge_col, brightness_col) if c in plan.header]
+    want += [c.name for c in plan.columns if c.name not in want]
+
+    state = EnrichState()
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    with out_csv.open("w", encoding="utf-8", newline="") as fout:
+        # Same dialect as csv.DictWriter in the row engine (excel: \r\n, minimal quoting).
+        writer = csv.writer(fout)
+        writer.writerow(enrich_out_fields(plan, estimators))
+        frames = _iter_run_frames(run_csv, want, chunk_rows=chunk_rows, chunk_reader=chunk_reader)
+        while True:
+            with span("read"):
+                item = next(frames, None)
+            if item is None:
+                break
+            df, num = item
+            with span("compute"):
+                columns = enrich_frame(
+                    df,
+                    num,
+                    plan,
+                    state,
+                    voltage_col=voltage_col,
+                    charge_col=charge_col,
+                    brightness_col=brightness_col,
+                    brightness_max=brightness_max,
+                    estimators=estimators,
+                )
+            with span("write"):
+                writer.writerows(zip(*columns))
+
+
+def enrich_frame(
+    df: pd.DataFrame,
+    num: pd.DataFrame,
+    plan: EnrichPlan,
+    state: EnrichState,
+    *,
+    voltage_col: str = "battery_voltage_mv",
+    charge_col: str = "charge_counter_uAh",
+    brightness_col: str = "brightness",
+    brightness_max: float = 255.0,
+    estimators: EnabledEstimators | None = None,
+) -> list[list[str]]:
+    """Enrich one block of consecutive run rows; returns columns in enrich_out_fields() order.
+
+    df holds the raw cells as str, num the float64 values of the numeric columns (NaN if blank or
+    unparseable). `state` supplies the rows preceding this block and is advanced past it.
+    """
+    import numpy as np
+    import pandas as pd
+
+    n = len(df)
+
+    def numeric(col: str):
+        if col in num.columns:
+            return num[col].to_numpy(dtype=float)
+        return np.full(n, np.nan)
+
+    # dt_s from ts_ns (or ts_pc), carrying the last parseable timestamp forward like the row engine.
+    t_ns, t_ok = run_ts_ns(df)
+    dt, dt_ok, state.prev_t_ns = step_s(t_ns, t_ok, state.prev_t_ns)
+    dt_ok &= dt >= 0
+    dt_s_str = _fmt_fixed(dt, dt_ok)
+    dt_rounded = np.array([float(s) if s else np.nan for s in dt_s_str], dtype=float)
+
+    v_mv, v_ok = _trunc_int(numeric(voltage_col))
+    v_f = v_mv.astype(float)
+
+    # Brightness -> [0, 1]; a literal 'nan' clamps to 1.0 as min(1.0, nan) does in the row engine.
+    if brightness_col in df.columns:
+        b = numeric(brightness_col)
+        b_ok = ~np.isnan(b)
+        b_nan = df[brightness_col].str.strip().str.lower().isin(["nan", "+nan", "-nan"]).to_numpy()
+        b_ok |= b_nan
+    else:
+        b = np.zeros(n, dtype=float)
+        b_ok = np.zeros(n, dtype=bool)
+    bmax = float(brightness_max) if float(brightness_max) > 0 else 255.0
+    b_norm = np.clip(np.where(np.isnan(b), 1.0, b / bmax), 0.0, 1.0)
+
+    new_cols: dict[str, list[str]] = {}
+    cpu_total = np.zeros(n, dtype=float)
+    for policy in plan.policies:
+        pcols = plan.policy_columns(policy)
+
+        if pcols:
+            d, _ = _trunc_int(num[[c.name for c in pcols]].to_numpy(dtype=float))
+            d = np.where(d > 0, d, 0)
+            sum_dt_ms = d.sum(axis=1)
+            # Accumulate column by column in header order: the same float operations as the row
+            # engine, so the '%.3f' output is identical rather than merely within rounding.
+            matched_mw_ms = np.zeros(n, dtype=float)
+            unmatched_mw_ms = np.zeros(n, dtype=float)
+            for j, c in enumerate(pcols):
+                term = (c.current_ma * v_f / 1000.0) * d[:, j].astype(float)
+                if c.matched:
+                    matched_mw_ms += term
+                else:
+                    unmatched_mw_ms += term
+        else:
+            sum_dt_ms = np.zeros(n, dtype=np.int64)
+            matched_mw_ms = np.zeros(n, dtype=float)
+            unmatched_mw_ms = np.zeros(n, dtype=float)
+
+        energy = (matched_mw_ms + unmatched_mw_ms) / 1000.0
+        cpu_total += np.where(v_ok, energy, 0.0)
+        unmatched_dt_ms = np.where(v_ok, 0, sum_dt_ms)
+
+        new_cols[f"cpu_policy{policy}_energy_mJ"] = _fmt_fixed(energy, v_ok)
+        new_cols[f"cpu_policy{policy}_energy_mJ_matched"] = _fmt_fixed(matched_mw_ms / 1000.0, v_ok)
+        new_cols[f"cpu_policy{policy}_energy_mJ_unmatched"] = _fmt_fixed(unmatched_mw_ms / 1000.0, v_ok)
+        new_cols[f"cpu_policy{policy}_unmatched_dt_ms"] = [str(x) for x in unmatched_dt_ms.tolist()]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg_p = (energy * 1000.0) / sum_dt_ms.astype(float)
+        new_cols[f"cpu_policy{policy}_avg_power_mW"] = _fmt_fixed(avg_p, (sum_dt_ms > 0) & v_ok)
+
+    new_cols["cpu_energy_mJ_total"] = _fmt_fixed(cpu_total, v_ok)
+    new_cols["dt_s"] = dt_s_str
+    new_cols["screen_brightness_norm"] = _fmt_fixed(b_norm, b_ok, digits=6)
+
+    # Screen: explicit non-ON display state -> 0; otherwise screen.on + screen.full * brightness.
+    if "display_state" in df.columns:
+        disp = df["display_state"].str.strip().str.upper()
+        screen_off = ((disp != "") & (disp != "ON")).to_numpy()
+    else:
+        screen_off = np.zeros(n, dtype=bool)
+    have_items = plan.screen_on_ma is not None and plan.screen_full_ma is not None
+    est_ok = ~screen_off & v_ok & b_ok & have_items
+    screen_mw = np.zeros(n, dtype=float)
+    if have_items:
+        screen_ma = float(plan.screen_on_ma) + float(plan.screen_full_ma) * b_norm  # type: ignore[arg-type]
+        screen_mw = np.where(est_ok, screen_ma * v_f / 1000.0, 0.0)
+    p_ok = screen_off | est_ok
+    new_cols["screen_power_mW_est"] = _fmt_fixed(screen_mw, p_ok)
+    e_ok = p_ok & ~np.isnan(dt_rounded) & (np.nan_to_num(dt_rounded) > 0)
+    new_cols["screen_energy_mJ_est"] = _fmt_fixed(screen_mw * np.nan_to_num(dt_rounded), e_ok)
+
+    # Charge-counter discharge energy against the last valid charge sample.
+    ch, ch_ok = _trunc_int(numeric(charge_col))
+    prev_ch = pd.Series(ch).where(ch_ok).ffill().shift(1)
+    if state.prev_charge_uah is not None:
+        prev_ch = prev_ch.fillna(float(state.prev_charge_uah))
+    if ch_ok.any():
+        state.prev_charge_uah = int(ch[ch_ok][-1])
+    pc_ok = prev_ch.notna().to_numpy()
+    d_uah = ch - prev_ch.fillna(0).to_numpy(dtype=np.int64)
+    discharge = (-d_uah.astype(float)) * v_f * 0.0036
+    new_cols["battery_discharge_energy_mJ"] = _fmt_fixed(discharge, ch_ok & pc_ok & v_ok)
+
+    if estimators is not None:
+        new_cols.update(_run_estimators(estimators, df, v_f, v_ok, dt_rounded))
+
+    return [new_cols[c] if c in new_cols else df[c].tolist() for c in enrich_out_fields(plan, estimators)]
+
+
+def enrich_out_fields(plan: EnrichPlan, estimators: EnabledEstimators | None = None) -> list[str]:
+    if estimators is None:
+        return plan.out_fields
+    return plan.out_fields + [c for c in estimators.out_fields if c not in plan.out_fields]
+
+
+def _enrich_rows(
+    run_csv: Path,
+    out_csv: Path,
+    plan: EnrichPlan,
+    *,
+    voltage_col: str,
+    charge_col: str,
+    brightness_col: str,
+    brightness_max: float,
+) -> None:
+    screen_on_ma = plan.screen_on_ma
+    screen_full_ma = plan.screen_full_ma
+    policy_columns = {policy: plan.policy_columns(policy) for policy in plan.policies}
 
     with run_csv.open("r", encoding="utf-8", newline="") as fin:
         reader = csv.DictReader(fin)
-        in_fields = list(reader.fieldnames or [])
-
-        out_fields = list(in_fields)
-        for policy in sorted(mapping.keys()):
-            for suffix in ["energy_mJ", "energy_mJ_matched", "energy_mJ_unmatched", "avg_power_mW"]:
-                col = f"cpu_policy{policy}_{suffix}"
-                if col not in out_fields:
-                    out_fields.append(col)
-            col = f"cpu_policy{policy}_unmatched_dt_ms"
-            if col not in out_fields:
-                out_fields.append(col)
-        for col in ["cpu_energy_mJ_total", "battery_discharge_energy_mJ", "dt_s"]:
-            if col not in out_fields:
-                out_fields.append(col)
-
-        for col in ["screen_brightness_norm", "screen_power_mW_est", "screen_energy_mJ_est"]:
-            if col not in out_fields:
-                out_fields.append(col)
+        out_fields = plan.out_fields
 
         out_csv.parent.mkdir(parents=True, exist_ok=True)
         with out_csv.open("w", encoding="utf-8", newline="") as fout:
             writer = csv.DictWriter(fout, fieldnames=out_fields)
             writer.writeheader()
 
-            prev_ts: datetime | None = None
+            time_col = time_column(reader.fieldnames or []) or TS_PC_COL
+            prev_ns: int | None = None
             prev_charge_uah: int | None = None
 
             for row in reader:
-                ts = _parse_ts(row.get("ts_pc", ""))
+                t_ns = cell_to_ns(time_col, row.get(time_col, ""))
                 dt_s = ""
-                if ts and prev_ts:
-                    dt = (ts - prev_ts).total_seconds()
+                if t_ns is not None and prev_ns is not None:
+                    dt = (t_ns - prev_ns) / 1e9
                     if dt >= 0:
                         dt_s = f"{dt:.3f}"
-                prev_ts = ts or prev_ts
+                prev_ns = t_ns if t_ns is not None else prev_ns
 
                 voltage_mv = None
                 v_raw = row.get(voltage_col, "")
@@ -762,23 +2167,15 @@ def enrich_run_with_cpu_energy(
 
                 cpu_total = 0.0
 
-                for policy in sorted(mapping.keys()):
-                    lookup = policy_lookup.get(policy, {})
-                    freqs_sorted = policy_freqs_sorted.get(policy, [])
-
+                for policy in plan.policies:
                     matched_mw_ms = 0.0
                     unmatched_mw_ms = 0.0
                     sum_dt_ms = 0
                     unmatched_dt_ms = 0
 
-                    prefix = f"cpu_p{policy}_freq"
-                    suffix = "_dt"
-                    for k, v in row.items():
-                        if not k.startswith(prefix) or not k.endswith(suffix):
-                            continue
-                        freq_s = k[len(prefix) : -len(suffix)]
+                    for col in policy_columns[policy]:
+                        v = row.get(col.name)
                         try:
-                            freq = int(freq_s)
                             dt_ms = int(float(v)) if v not in (None, "") else 0
                         except Exception:
                             continue
@@ -786,28 +2183,14 @@ def enrich_run_with_cpu_energy(
                             continue
                         sum_dt_ms += dt_ms
 
-                        cur_ma = lookup.get(freq)
-                        if cur_ma is None:
-                            if not freqs_sorted:
-                                unmatched_dt_ms += dt_ms
-                                continue
-                            nearest = min(freqs_sorted, key=lambda f: abs(f - freq))
-                            cur_ma = lookup.get(nearest)
-                            if cur_ma is None:
-                                unmatched_dt_ms += dt_ms
-                                continue
-                            if voltage_mv is None:
-                                unmatched_dt_ms += dt_ms
-                                continue
-                            power_mw = float(cur_ma) * float(voltage_mv) / 1000.0
-                            unmatched_mw_ms += power_mw * float(dt_ms)
-                            continue
-
                         if voltage_mv is None:
                             unmatched_dt_ms += dt_ms
                             continue
-                        power_mw = float(cur_ma) * float(voltage_mv) / 1000.0
-                        matched_mw_ms += power_mw * float(dt_ms)
+                        power_mw = col.current_ma * float(voltage_mv) / 1000.0
+                        if col.matched:
+                            matched_mw_ms += power_mw * float(dt_ms)
+                        else:
+                            unmatched_mw_ms += power_mw * float(dt_ms)
 
                     energy_mJ = (matched_mw_ms + unmatched_mw_ms) / 1000.0
                     energy_mJ_matched = matched_mw_ms / 1000.0
@@ -890,6 +2273,259 @@ def enrich_run_with_cpu_energy(
                 writer.writerow({k: row.get(k, "") for k in out_fields})
 
 
+# -----------------------------
+# Batch enrich (hash manifest)
+# -----------------------------
+
+ENRICH_MANIFEST_VERSION = 1
+ENRICH_MANIFEST_NAME = "enrich_manifest.json"
+
+
+@dataclass
+class EnrichManifestEntry:
+    run_name: str
+    run_csv: str
+    enriched_csv: str
+    # sha256 over the run CSV, policy map, cluster tables, power_profile items and plan version.
+    dep_hash: str
+    run_size: int
+    run_mtime_ns: int
+    run_sha256: str
+    status: str  # enriched | fresh | error
+    enriched_at: str = ""
+    seconds: float | None = None
+    error: str = ""
+
+
+def _sha256_file(path: Path, chunk: int = 1 << 20) -> str:
+    import hashlib
+
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for b in iter(lambda: f.read(chunk), b""):
+            h.update(b)
+    return h.hexdigest()
+
+
+def enrich_inputs_hash(
+    *,
+    map_json: Path,
+    clusters_dir: Path,
+    profile_json: Path,
+    estimators: list[str] | str | None = None,
+    scenario_params: Path = DEFAULT_SCENARIO_PARAMS,
+) -> str:
+    """Hash of everything enrichment reads besides the run itself.
+
+    power_profile.json contributes only its items_ma (what enrichment uses), so re-parsing the
+    profile without changing the items does not invalidate every run.
+    """
+    import hashlib
+
+    mapping = _load_mapping(map_json)
+    h = hashlib.sha256()
+    h.update(f"enrich-plan-v{ENRICH_PLAN_VERSION}\n".encode("utf-8"))
+    h.update(json.dumps({str(k): v for k, v in sorted(mapping.items())}, sort_keys=True).encode("utf-8"))
+    for c in sorted(set(mapping.values())):
+        p = clusters_dir / f"cluster{c}_freq_power.csv"
+        h.update(f"\n{p.name}\n".encode("utf-8"))
+        h.update(p.read_bytes() if p.exists() else b"<missing>")
+    h.update(b"\nitems_ma\n")
+    h.update(json.dumps(_load_power_profile_items(profile_json), sort_keys=True).encode("utf-8"))
+    enabled = load_estimators(estimators, profile_json=profile_json, scenario_params=scenario_params)
+    if enabled is not None:
+        h.update(b"\nestimators\n")
+        h.update(json.dumps([e.name for e in enabled.estimators]).encode("utf-8"))
+        h.update(json.dumps(enabled.scenario_params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def run_dep_hash(run_csv: Path, inputs_hash: str, prev: dict | None = None) -> tuple[str, str]:
+    """(dep_hash, run_sha256) of one run; the content hash is reused from `prev` (its manifest entry)
+    while the run CSV's size and mtime are unchanged."""
+    import hashlib
+
+    st = run_csv.stat()
+    old = prev or {}
+    if old.get("run_size") == st.st_size and old.get("run_mtime_ns") == st.st_mtime_ns and old.get("run_sha256"):
+        run_sha = str(old["run_sha256"])
+    else:
+        run_sha = _sha256_file(run_csv)
+    return hashlib.sha256(f"{inputs_hash}\n{run_sha}".encode("utf-8")).hexdigest(), run_sha
+
+
+def discover_raw_runs(runs_dir: Path, pattern: str = "*.csv") -> list[Path]:
+    """Raw sampler CSVs under runs_dir (enriched outputs and in-flight temp files excluded)."""
+    return sorted(p for p in runs_dir.glob(pattern) if p.is_file() and not p.stem.endswith("_enriched"))
+
+
+def load_enrich_manifest(path: Path) -> dict[str, dict]:
+    """run_name -> manifest entry dict; {} when the manifest is missing or unreadable."""
+    try:
+        obj = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    runs = obj.get("runs") if isinstance(obj, dict) else None
+    return runs if isinstance(runs, dict) else {}
+
+
+def load_enrich_manifest_inputs(path: Path) -> dict[str, str]:
+    """The manifest's "inputs" block (map_json, clusters_dir, profile_json, estimators, ...); {} when absent."""
+    try:
+        obj = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    inputs = obj.get("inputs") if isinstance(obj, dict) else None
+    return {str(k): str(v) for k, v in inputs.items() if v is not None} if isinstance(inputs, dict) else {}
+
+
+def _enrich_batch_worker(
+    run_csv: str,
+    out_csv: str,
+    map_json: str,
+    clusters_dir: str,
+    profile_json: str,
+    chunk_rows: int | None,
+    estimators: str,
+    scenario_params: str,
+) -> tuple[float, str]:
+    import time
+
+    t0 = time.perf_counter()
+    try:
+        enrich_run_with_cpu_energy(
+            run_csv=Path(run_csv),
+            out_csv=Path(out_csv),
+            map_json=Path(map_json),
+            clusters_dir=Path(clusters_dir),
+            profile_json=Path(profile_json),
+            chunk_rows=chunk_rows,
+            estimators=estimators,
+            scenario_params=Path(scenario_params),
+        )
+    except Exception as e:
+        return time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - t0, ""
+
+
+def enrich_batch(
+    *,
+    runs_dir: Path = Path("artifacts/runs"),
+    pattern: str = "*.csv",
+    map_json: Path = Path("artifacts/android/power_profile/policy_cluster_map.json"),
+    clusters_dir: Path = Path("artifacts/android/power_profile"),
+    profile_json: Path = Path("artifacts/android/power_profile/power_profile.json"),
+    manifest_path: Path | None = None,
+    jobs: int | None = None,
+    chunk_rows: int | None = None,
+    estimators: list[str] | str | None = None,
+    scenario_params: Path = DEFAULT_SCENARIO_PARAMS,
+    force: bool = False,
+    dry_run: bool = False,
+) -> list[EnrichManifestEntry]:
+    """Re-enrich only runs whose dependency hash changed, in a process pool; rewrite the manifest.
+
+    A run is stale when its *_enriched.csv is missing, it has no manifest entry, or the entry's
+    dep_hash differs (run CSV edited, policy map / cluster tables / power_profile items changed).
+    Run CSV content hashes are reused from the manifest while size and mtime are unchanged.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    manifest_path = manifest_path or (runs_dir / ENRICH_MANIFEST_NAME)
+    prev = load_enrich_manifest(manifest_path)
+    inputs_hash = enrich_inputs_hash(
+        map_json=map_json,
+        clusters_dir=clusters_dir,
+        profile_json=profile_json,
+        estimators=estimators,
+        scenario_params=scenario_params,
+    )
+    est_arg = ",".join(estimators) if isinstance(estimators, list) else str(estimators or "")
+
+    entries: list[EnrichManifestEntry] = []
+    todo: list[EnrichManifestEntry] = []
+    for run_csv in discover_raw_runs(runs_dir, pattern):
+        st = run_csv.stat()
+        old = prev.get(run_csv.stem) or {}
+        dep_hash, run_sha = run_dep_hash(run_csv, inputs_hash, old)
+        out_csv = run_csv.with_name(run_csv.stem + "_enriched.csv")
+
+        e = EnrichManifestEntry(
+            run_name=run_csv.stem,
+            run_csv=run_csv.as_posix(),
+            enriched_csv=out_csv.as_posix(),
+            dep_hash=dep_hash,
+            run_size=int(st.st_size),
+            run_mtime_ns=int(st.st_mtime_ns),
+            run_sha256=run_sha,
+            status="fresh",
+            enriched_at=str(old.get("enriched_at", "")),
+            seconds=old.get("seconds"),
+        )
+        stale = force or not out_csv.exists() or old.get("dep_hash") != dep_hash or old.get("status") == "error"
+        if stale:
+            e.status = "enriched"
+            todo.append(e)
+        entries.append(e)
+
+    print(f"enrich-batch: {len(entries)} runs, {len(todo)} stale")
+    if dry_run:
+        for e in todo:
+            print(f"  stale: {e.run_name}")
+        return entries
+
+    if todo:
+        n_jobs = max(1, int(jobs or min(len(todo), os.cpu_count() or 1)))
+        args = [
+            (
+                e.run_csv,
+                e.enriched_csv,
+                str(map_json),
+                str(clusters_dir),
+                str(profile_json),
+                chunk_rows,
+                est_arg,
+                str(scenario_params),
+            )
+            for e in todo
+        ]
+        if n_jobs == 1:
+            results = [_enrich_batch_worker(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_enrich_batch_worker, *zip(*args)))
+        now = datetime.now().astimezone().isoformat(timespec="seconds")
+        for e, (secs, err) in zip(todo, results):
+            e.seconds = round(float(secs), 3)
+            e.enriched_at = now
+            if err:
+                e.status = "error"
+                e.error = err
+                print(f"WARN: enrich failed: {e.run_name}: {err}")
+            else:
+                print(f"Enriched: {e.enriched_csv} ({secs:.1f}s)")
+
+    manifest = {
+        "version": ENRICH_MANIFEST_VERSION,
+        "updated_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "inputs": {
+            "map_json": map_json.as_posix(),
+            "clusters_dir": clusters_dir.as_posix(),
+            "profile_json": profile_json.as_posix(),
+            "estimators": est_arg,
+            "scenario_params": scenario_params.as_posix(),
+            "inputs_hash": inputs_hash,
+        },
+        "runs": {e.run_name: asdict(e) for e in entries},
+    }
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    tmp.replace(manifest_path)
+    print(f"Wrote: {manifest_path}")
+    return entries
+
+
 @dataclass
 class RunSummary:
     start_ts: str
@@ -901,33 +2537,32 @@ class RunSummary:
     mean_batt_power_mw_perfetto: float | None
     batt_power_source_preferred: str
     mean_cpu_power_mw: float | None
+    mean_cpu_power_mw_perfetto: float | None
+    cpu_power_source_preferred: str
 
 
 def report_run(csv_path: Path, out_dir: Path | None = None) -> tuple[Path, Path]:
     import matplotlib
+    import pandas as pd
 
     matplotlib.use("Agg")
     import matplotlib.pyplot as plt
 
+    from mp_power.downsample import downsample_xy
+    from mp_power.downsample import load_pyramid
+    from mp_power.downsample import plot_points
+
     if out_dir is None:
         out_dir = Path("artifacts") / "reports" / csv_path.stem
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    def parse_ts(s: str) -> datetime | None:
-        s = (s or "").strip()
-        if not s:
-            return None
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-
-    df = pd.read_csv(csv_path)
+    with span("read"):
+        df = pd.read_csv(csv_path)
 
     out = df.copy()
-    if "ts_pc" in out.columns:
-        ts = out["ts_pc"].astype(str).map(parse_ts)
-        out["t_s"] = (ts - ts.iloc[0]).dt.total_seconds() if hasattr(ts, "dt") else None
+    t_ns, t_ok = run_ts_ns(out)
+    if t_ok.any():
+        out["t_s"] = elapsed_s(t_ns, t_ok)
 
     for col in ["battery_voltage_mv", "charge_counter_uAh", "cpu_energy_mJ_total", "brightness"]:
         if col in out.columns:
@@ -962,25 +2597,49 @@ def report_run(csv_path: Path, out_dir: Path | None = None) -> tuple[Path, Path]
     pf_ts_path = out_dir / "perfetto_android_power_timeseries.csv"
     pf_summary_path = out_dir / "perfetto_android_power_summary.csv"
     mean_batt_power_mw_perfetto: float | None = None
-    pf_power_ts: pd.Series | None = None
-    pf_x: pd.Series | None = None
+    pf_pyr = None
     if pf_ts_path.exists():
         try:
-            pf_ts = pd.read_csv(pf_ts_path)
-            if "t_s" in pf_ts.columns and "power_mw_calc" in pf_ts.columns:
-                pf_x = pd.to_numeric(pf_ts["t_s"], errors="coerce")
-                pf_power_ts = pd.to_numeric(pf_ts["power_mw_calc"], errors="coerce")
-                if pf_power_ts.notna().any():
-                    mean_batt_power_mw_perfetto = float(pf_power_ts.mean())
+            # The pyramid carries exact sums, so the mean needs no pass over the raw 250 ms rows.
+            pf_pyr = load_pyramid(pf_ts_path, time_col="t_s")
+            if pf_pyr is not None and pf_pyr.has("power_mw_calc"):
+                mean_batt_power_mw_perfetto = pf_pyr.mean("power_mw_calc")
         except Exception:
             # Keep report generation best-effort.
-            pf_x = None
-            pf_power_ts = None
+            pf_pyr = None
 
     batt_power_source_preferred = "charge_counter_diff"
     if pf_summary_path.exists() or mean_batt_power_mw_perfetto is not None:
         batt_power_source_preferred = "perfetto_android_power"
 
+    # Optional: exact CPU power from the policy trace (ftrace freq/idle); time_in_state is the fallback.
+    pf_cpu_path = out_dir / "perfetto_cpu_power_timeseries.csv"
+    mean_cpu_power_mw_perfetto: float | None = None
+    pf_cpu_pyr = None
+    pf_cpu_t0 = 0.0
+    if pf_cpu_path.exists():
+        try:
+            pf_cpu_pyr = load_pyramid(pf_cpu_path, time_col="ts")
+            if pf_cpu_pyr is not None and pf_cpu_pyr.has("cpu_power_mw"):
+                # Align to the battery counters' time origin when both come from the same trace.
+                t0 = pf_cpu_pyr.t0
+                if pf_ts_path.exists():
+                    try:
+                        pf_ts0 = pd.read_csv(pf_ts_path, usecols=["ts"], nrows=1)
+                        t0 = float(pf_ts0["ts"].iloc[0])
+                    except Exception:
+                        pass
+                pf_cpu_t0 = t0
+                mean_cpu_power_mw_perfetto = pf_cpu_pyr.mean("cpu_power_mw")
+            else:
+                pf_cpu_pyr = None
+        except Exception:
+            pf_cpu_pyr = None
+
+    cpu_power_source_preferred = "time_in_state"
+    if mean_cpu_power_mw_perfetto is not None:
+        cpu_power_source_preferred = "perfetto_ftrace"
+
     summary = RunSummary(
         start_ts=start_ts,
         end_ts=end_ts,
@@ -991,6 +2650,8 @@ def report_run(csv_path: Path, out_dir: Path | None = None) -> tuple[Path, Path]
         mean_batt_power_mw_perfetto=mean_batt_power_mw_perfetto,
         batt_power_source_preferred=batt_power_source_preferred,
         mean_cpu_power_mw=mean_cpu_power_mw,
+        mean_cpu_power_mw_perfetto=mean_cpu_power_mw_perfetto,
+        cpu_power_source_preferred=cpu_power_source_preferred,
     )
 
     md_path = out_dir / "summary.md"
@@ -1014,48 +2675,168 @@ def report_run(csv_path: Path, out_dir: Path | None = None) -> tuple[Path, Path]
         lines.append(f"- mean_batt_discharge_power_mW_charge_counter: {summary.mean_batt_power_mw:.1f}")
     if summary.mean_batt_power_mw_perfetto is not None:
         lines.append(f"- mean_batt_power_mW_perfetto: {summary.mean_batt_power_mw_perfetto:.1f}")
+    lines.append(f"- cpu_power_source_preferred: {summary.cpu_power_source_preferred}")
     if summary.mean_cpu_power_mw is not None:
         lines.append(f"- mean_cpu_power_mW_total: {summary.mean_cpu_power_mw:.1f}")
+    if summary.mean_cpu_power_mw_perfetto is not None:
+        lines.append(f"- mean_cpu_power_mW_perfetto: {summary.mean_cpu_power_mw_perfetto:.1f}")
+
+    rails_path = out_dir / "perfetto_power_rails_summary.csv"
+    if rails_path.exists():
+        rails = pd.read_csv(rails_path)
+        if not rails.empty:
+            lines.append("")
+            lines.append("## Power rails (ODPM)")
+            lines.append("")
+            for r in rails.to_dict("records"):
+                lines.append(f"- {r['rail']}: energy_mJ={float(r['energy_mj']):.1f} mean_mW={float(r['power_mw_mean']):.1f}")
 
     md_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
+    dpi = 160
     fig, axes = plt.subplots(4, 1, figsize=(11, 14), sharex=True)
-    x = out["t_s"] if "t_s" in out.columns else range(len(out))
+    x = out["t_s"] if "t_s" in out.columns else pd.Series(range(len(out)), dtype=float)
+    # One min/max pair per pixel column looks identical to the raw series at a fraction of the cost.
+    n_px = plot_points(fig, axes[0], dpi=dpi)
+
+    def plot_ds(ax: object, y: pd.Series, **kw: object) -> None:
+        ax.plot(*downsample_xy(x, y, n_px), **kw)  # type: ignore[attr-defined]
 
     if "battery_voltage_mv" in out.columns:
-        axes[0].plot(x, out["battery_voltage_mv"], label="battery_voltage_mv")
+        plot_ds(axes[0], out["battery_voltage_mv"], label="battery_voltage_mv")
         axes[0].set_ylabel("mV")
         axes[0].legend(loc="best")
 
     thermal_cols = [c for c in out.columns if c.startswith("thermal_") and c.endswith("_C")]
     if thermal_cols:
         for c in thermal_cols:
-            axes[1].plot(x, out[c], label=c)
+            plot_ds(axes[1], out[c], label=c)
         axes[1].set_ylabel("C")
         axes[1].legend(loc="best", ncols=2)
 
     if "cpu_power_mW_total" in out.columns:
-        axes[2].plot(x, out["cpu_power_mW_total"], label="cpu_power_mW_total")
+        plot_ds(axes[2], out["cpu_power_mW_total"], label="cpu_power_mW_total")
+    if pf_cpu_pyr is not None:
+        cpu_t, cpu_p = pf_cpu_pyr.envelope("cpu_power_mw", n_px)
+        axes[2].plot((cpu_t - pf_cpu_t0) / 1e9, cpu_p, label="perfetto_cpu_power_mw", color="tab:red", alpha=0.6)
+    if "cpu_power_mW_total" in out.columns or pf_cpu_pyr is not None:
         axes[2].set_ylabel("mW")
         axes[2].legend(loc="best")
 
     if "brightness" in out.columns:
-        axes[3].plot(x, out["brightness"], label="brightness", color="tab:orange")
+        plot_ds(axes[3], out["brightness"], label="brightness", color="tab:orange")
     if "batt_discharge_power_mW" in out.columns:
-        axes[3].plot(x, out["batt_discharge_power_mW"], label="batt_discharge_power_mW", color="tab:green")
-    if pf_x is not None and pf_power_ts is not None:
-        axes[3].plot(pf_x, pf_power_ts, label="perfetto_power_mw_calc", color="tab:blue", alpha=0.9)
+        plot_ds(axes[3], out["batt_discharge_power_mW"], label="batt_discharge_power_mW", color="tab:green")
+    if pf_pyr is not None and pf_pyr.has("power_mw_calc"):
+        axes[3].plot(*pf_pyr.envelope("power_mw_calc", n_px), label="perfetto_power_mw_calc", color="tab:blue", alpha=0.9)
     axes[3].set_ylabel("brightness / mW")
     axes[3].legend(loc="best")
 
     axes[-1].set_xlabel("t (s)")
     fig.tight_layout()
-    fig.savefig(png_path, dpi=160)
+    with span("savefig"):
+        fig.savefig(png_path, dpi=dpi)
     plt.close(fig)
 
     return md_path, png_path
 
 
+# -----------------------------
+# Batch report
+# -----------------------------
+
+REPORT_OUTPUTS = ("summary.md", "timeseries.png")
+# Optional files in the report dir that report_run folds in when present.
+REPORT_EXTRA_INPUTS = (
+    "perfetto_android_power_timeseries.csv",
+    "perfetto_android_power_summary.csv",
+    "perfetto_cpu_power_timeseries.csv",
+    "perfetto_power_rails_summary.csv",
+)
+
+
+@dataclass
+class ReportBatchEntry:
+    run_name: str
+    csv: str
+    out_dir: str
+    status: str  # fresh | rendered | error
+    seconds: float | None = None
+    error: str = ""
+
+
+def report_is_fresh(csv_path: Path, out_dir: Path) -> bool:
+    """True when summary.md and timeseries.png are newer than the run CSV and every extra input."""
+    outs = [out_dir / n for n in REPORT_OUTPUTS]
+    if not all(o.exists() for o in outs):
+        return False
+    oldest_out = min(o.stat().st_mtime_ns for o in outs)
+    inputs = [csv_path] + [out_dir / n for n in REPORT_EXTRA_INPUTS if (out_dir / n).exists()]
+    return all(i.stat().st_mtime_ns <= oldest_out for i in inputs)
+
+
+def _report_batch_worker(csv_path: str, out_dir: str) -> tuple[float, str]:
+    import time
+
+    t0 = time.perf_counter()
+    try:
+        report_run(Path(csv_path), out_dir=Path(out_dir))
+    except Exception as e:
+        return time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - t0, ""
+
+
+def report_batch(
+    *,
+    runs_dir: Path = Path("artifacts/runs"),
+    pattern: str = "*_enriched.csv",
+    reports_dir: Path = Path("artifacts/reports"),
+    jobs: int | None = None,
+    force: bool = False,
+    dry_run: bool = False,
+) -> list[ReportBatchEntry]:
+    """Render summary.md + timeseries.png for every run under runs_dir in a process pool.
+
+    Each run reports into reports_dir/<csv stem> (the layout pipeline_run uses, so Perfetto
+    outputs already there are picked up); up-to-date reports (see report_is_fresh) are skipped.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    entries: list[ReportBatchEntry] = []
+    todo: list[ReportBatchEntry] = []
+    for csv_path in sorted(p for p in runs_dir.glob(pattern) if p.is_file()):
+        out_dir = reports_dir / csv_path.stem
+        e = ReportBatchEntry(run_name=csv_path.stem, csv=csv_path.as_posix(), out_dir=out_dir.as_posix(), status="fresh")
+        if force or not report_is_fresh(csv_path, out_dir):
+            e.status = "rendered"
+            todo.append(e)
+        entries.append(e)
+
+    print(f"report-batch: {len(entries)} runs, {len(todo)} stale")
+    if dry_run:
+        for e in todo:
+            print(f"  stale: {e.run_name}")
+        return entries
+
+    if todo:
+        n_jobs = max(1, int(jobs or min(len(todo), os.cpu_count() or 1)))
+        if n_jobs == 1:
+            results = [_report_batch_worker(e.csv, e.out_dir) for e in todo]
+        else:
+            # Workers are reused across runs, so matplotlib/pandas are imported once per worker.
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_report_batch_worker, [e.csv for e in todo], [e.out_dir for e in todo]))
+        for e, (secs, err) in zip(todo, results):
+            e.seconds = round(float(secs), 3)
+            if err:
+                e.status = "error"
+                e.error = err
+                print(f"WARN: report failed: {e.run_name}: {err}")
+            else:
+                print(f"Wrote: {e.out_dir}/summary.md ({secs:.1f}s)")
+    return entries
+
+
 # -----------------------------
 # Module CLI
 # -----------------------------
@@ -1083,6 +2864,33 @@ def main(argv: list[str] | None = None) -> int:
         default="power,PowerHAL,powerhal,boost,hint,mtk,mi,fpsgo,uclamp,cpuset,thermal,throttle",
     )
 
+    p_cpu = sub.add_parser("parse-perfetto-cpu-power", help="Per-cluster CPU power from ftrace cpu_frequency/cpu_idle")
+    p_cpu.add_argument("--trace", type=Path, required=True)
+    p_cpu.add_argument("--out-dir", type=Path, default=None)
+    p_cpu.add_argument("--map-json", type=Path, default=Path("artifacts/android/power_profile/policy_cluster_map.json"))
+    p_cpu.add_argument("--clusters-dir", type=Path, default=Path("artifacts/android/power_profile"))
+    p_cpu.add_argument("--voltage-mv", type=float, default=None, help="Fallback voltage if the trace has no batt.voltage_uv")
+    p_cpu.add_argument("--bin-ms", type=float, default=50.0)
+
+    p_rails = sub.add_parser("parse-perfetto-power-rails", help="Per-rail energy from ODPM power.rails.* counters")
+    p_rails.add_argument("--trace", type=Path, required=True)
+    p_rails.add_argument("--out-dir", type=Path, default=None)
+
+    p_pb = sub.add_parser("parse-perfetto-batch", help="Run Perfetto extractors over many traces with a server pool")
+    p_pb.add_argument("--traces", type=Path, nargs="*", default=[], help="Trace files (in addition to --traces-root)")
+    p_pb.add_argument(
+        "--traces-root",
+        type=Path,
+        default=None,
+        help="Find */perfetto_trace.pftrace under this dir (e.g. artifacts/reports)",
+    )
+    p_pb.add_argument("--extractors", default="android_power,policy_markers", help=f"Comma list of {','.join(PERFETTO_EXTRACTORS)}")
+    p_pb.add_argument("--pool-size", type=int, default=2)
+    p_pb.add_argument("--trace-processor-shell", default=None, help="Path to trace_processor_shell (default: env/PATH/prebuilt)")
+    p_pb.add_argument("--map-json", type=Path, default=Path("artifacts/android/power_profile/policy_cluster_map.json"))
+    p_pb.add_argument("--clusters-dir", type=Path, default=Path("artifacts/android/power_profile"))
+    p_pb.add_argument("--out-csv", type=Path, default=None, help="Optional per-trace/extractor status CSV")
+
     p_bs = sub.add_parser("parse-batterystats-proto-min", help="Parse minimal batterystats proto schema")
     p_bs.add_argument("--start", type=Path, default=None)
     p_bs.add_argument("--end", type=Path, required=True)
@@ -1090,14 +2898,63 @@ def main(argv: list[str] | None = None) -> int:
     p_bs.add_argument("--out-csv", type=Path, required=True)
     p_bs.add_argument("--label", default=None)
 
+    p_bsb = sub.add_parser("parse-batterystats-proto-batch", help="Parse many batterystats .pb snapshots into one CSV")
+    p_bsb.add_argument("--pbs", type=Path, nargs="*", default=[], help="Snapshot files (in addition to --root)")
+    p_bsb.add_argument(
+        "--root",
+        type=Path,
+        default=None,
+        help="Find */batterystats_*.pb under this dir (e.g. artifacts/reports)",
+    )
+    p_bsb.add_argument("--out-csv", type=Path, required=True)
+
+    p_gen = sub.add_parser("gen-proto", help="Regenerate the checked-in batterystats proto bindings (needs grpcio-tools)")
+    p_gen.add_argument("--check", action="store_true", help="Only check that the bindings match the .proto (exit 1 if stale)")
+
     p_en = sub.add_parser("enrich", help="Enrich a run CSV with CPU energy + screen estimate")
     p_en.add_argument("--run-csv", type=Path, required=True)
     p_en.add_argument("--out", type=Path, required=True)
+    p_en.add_argument("--engine", choices=ENRICH_ENGINES, default="vectorized")
+    p_en.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=0,
+        help="Stream the run in chunks of N rows (bounded memory for long soak runs; 0 = whole file)",
+    )
+    p_en.add_argument("--chunk-reader", choices=ENRICH_CHUNK_READERS, default="pandas", help="arrow needs pyarrow")
+    p_en.add_argument(
+        "--estimators",
+        default="",
+        help=f"Component estimators: 'all' or comma list of {','.join(COMPONENT_ESTIMATORS)} (vectorized engine)",
+    )
+    p_en.add_argument("--scenario-params", type=Path, default=DEFAULT_SCENARIO_PARAMS)
+
+    p_eb = sub.add_parser("enrich-batch", help="Re-enrich stale runs under a runs dir (hash manifest, process pool)")
+    p_eb.add_argument("--runs-dir", type=Path, default=Path("artifacts/runs"))
+    p_eb.add_argument("--pattern", default="*.csv", help="Glob under --runs-dir (*_enriched.csv is always skipped)")
+    p_eb.add_argument("--map-json", type=Path, default=Path("artifacts/android/power_profile/policy_cluster_map.json"))
+    p_eb.add_argument("--clusters-dir", type=Path, default=Path("artifacts/android/power_profile"))
+    p_eb.add_argument("--profile-json", type=Path, default=Path("artifacts/android/power_profile/power_profile.json"))
+    p_eb.add_argument("--manifest", type=Path, default=None, help=f"Default: <runs-dir>/{ENRICH_MANIFEST_NAME}")
+    p_eb.add_argument("--jobs", type=int, default=0, help="Worker processes (0 = min(stale runs, CPUs))")
+    p_eb.add_argument("--chunk-rows", type=int, default=0, help="Per-run chunked enrich (see enrich --chunk-rows)")
+    p_eb.add_argument("--estimators", default="", help="Component estimators (see enrich --estimators)")
+    p_eb.add_argument("--scenario-params", type=Path, default=DEFAULT_SCENARIO_PARAMS)
+    p_eb.add_argument("--force", action="store_true", help="Re-enrich every run")
+    p_eb.add_argument("--dry-run", action="store_true", help="List stale runs without enriching")
 
     p_rep = sub.add_parser("report", help="Generate report (summary.md + timeseries.png)")
     p_rep.add_argument("--csv", type=Path, required=True)
     p_rep.add_argument("--out-dir", type=Path, default=None)
 
+    p_rb = sub.add_parser("report-batch", help="Render stale reports for many runs in a process pool")
+    p_rb.add_argument("--runs-dir", type=Path, default=Path("artifacts/runs"))
+    p_rb.add_argument("--pattern", default="*_enriched.csv", help="Glob under --runs-dir")
+    p_rb.add_argument("--reports-dir", type=Path, default=Path("artifacts/reports"), help="Reports go to <dir>/<csv stem>")
+    p_rb.add_argument("--jobs", type=int, default=0, help="Worker processes (0 = min(stale runs, CPUs))")
+    p_rb.add_argument("--force", action="store_true", help="Re-render every report")
+    p_rb.add_argument("--dry-run", action="store_true", help="List stale reports without rendering")
+
     args = ap.parse_args(argv)
 
     if args.cmd == "parse-power-profile":
@@ -1114,8 +2971,44 @@ def main(argv: list[str] | None = None) -> int:
         parse_perfetto_policy_markers(args.trace, out_dir=args.out_dir, keywords=kws)
         return 0
 
+    if args.cmd == "parse-perfetto-cpu-power":
+        parse_perfetto_cpu_power(
+            args.trace,
+            out_dir=args.out_dir,
+            map_json=args.map_json,
+            clusters_dir=args.clusters_dir,
+            voltage_mv=args.voltage_mv,
+            bin_ms=args.bin_ms,
+        )
+        return 0
+
+    if args.cmd == "parse-perfetto-power-rails":
+        parse_perfetto_power_rails(args.trace, out_dir=args.out_dir)
+        return 0
+
+    if args.cmd == "parse-perfetto-batch":
+        traces = list(args.traces)
+        if args.traces_root is not None:
+            traces += sorted(args.traces_root.glob("*/perfetto_trace.pftrace"))
+        if not traces:
+            raise SystemExit("no traces given (use --traces and/or --traces-root)")
+        status = parse_perfetto_batch(
+            traces,
+            extractors=[e.strip() for e in str(args.extractors).split(",") if e.strip()],
+            pool_size=args.pool_size,
+            bin_path=args.trace_processor_shell,
+            map_json=args.map_json,
+            clusters_dir=args.clusters_dir,
+        )
+        if args.out_csv is not None:
+            args.out_csv.parent.mkdir(parents=True, exist_ok=True)
+            status.to_csv(args.out_csv, index=False, encoding="utf-8")
+            print(f"Wrote: {args.out_csv}")
+        n_fail = int((~status["ok"]).sum())
+        print(f"traces={len(traces)} jobs={len(status)} failed={n_fail} seconds={status['seconds'].sum():.1f}")
+        return 1 if n_fail else 0
+
     if args.cmd == "parse-batterystats-proto-min":
-        os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "python")
         write_batterystats_min_summary(
             start_pb=args.start,
             end_pb=args.end,
@@ -1125,14 +3018,76 @@ def main(argv: list[str] | None = None) -> int:
         )
         return 0
 
+    if args.cmd == "parse-batterystats-proto-batch":
+        import time
+
+        pbs = list(args.pbs)
+        if args.root is not None:
+            pbs += sorted(args.root.glob("*/batterystats_*.pb"))
+        if not pbs:
+            raise SystemExit("no .pb files (pass --pbs or --root)")
+        t0 = time.perf_counter()
+        rows = parse_batterystats_min_batch(pbs, args.out_csv)
+        n_fail = sum(1 for r in rows if not r["ok"])
+        print(f"Wrote: {args.out_csv}")
+        print(
+            f"snapshots={len(rows)} failed={n_fail} seconds={time.perf_counter() - t0:.2f} "
+            f"protobuf_backend={protobuf_backend()}"
+        )
+        return 1 if n_fail else 0
+
+    if args.cmd == "gen-proto":
+        if args.check:
+            ok = proto_bindings_fresh()
+            print(f"{GEN_MODULE}: {'up to date' if ok else 'STALE'} ({PROTO_PATH.name})")
+            return 0 if ok else 1
+        print(f"Wrote: {generate_proto_bindings()}")
+        return 0
+
+    if args.cmd == "enrich-batch":
+        entries = enrich_batch(
+            runs_dir=args.runs_dir,
+            pattern=args.pattern,
+            map_json=args.map_json,
+            clusters_dir=args.clusters_dir,
+            profile_json=args.profile_json,
+            manifest_path=args.manifest,
+            jobs=int(args.jobs) or None,
+            chunk_rows=int(args.chunk_rows) or None,
+            estimators=args.estimators,
+            scenario_params=args.scenario_params,
+            force=bool(args.force),
+            dry_run=bool(args.dry_run),
+        )
+        return 1 if any(e.status == "error" for e in entries) else 0
+
     if args.cmd == "enrich":
-        enrich_run_with_cpu_energy(run_csv=args.run_csv, out_csv=args.out)
+        enrich_run_with_cpu_energy(
+            run_csv=args.run_csv,
+            out_csv=args.out,
+            engine=args.engine,
+            chunk_rows=int(args.chunk_rows) or None,
+            chunk_reader=args.chunk_reader,
+            estimators=args.estimators,
+            scenario_params=args.scenario_params,
+        )
         return 0
 
     if args.cmd == "report":
         report_run(args.csv, out_dir=args.out_dir)
         return 0
 
+    if args.cmd == "report-batch":
+        entries = report_batch(
+            runs_dir=args.runs_dir,
+            pattern=args.pattern,
+            reports_dir=args.reports_dir,
+            jobs=int(args.jobs) or None,
+            force=bool(args.force),
+            dry_run=bool(args.dry_run),
+        )
+        return 1 if any(e.status == "error" for e in entries) else 0
+
     raise SystemExit("unknown command")
 
 
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from mp_power.adb import run_adb
+
+
+DEFAULT_PROFILE_JSON = Path("artifacts/android/power_profile/power_profile.json")
+DEFAULT_MAP_JSON = Path("artifacts/android/power_profile/policy_cluster_map.json")
+
+
+@dataclass
+class PolicyInfo:
+    policy: int
+    related_cpus: list[int]
+    freqs_khz: list[int]
+
+
+def _shell_cat(adb: str, serial: str | None, path: str, timeout_s: float) -> str | None:
+    base = ["-s", serial] if serial else []
+    rc, out, err = run_adb(adb, [*base, "shell", "cat", path], timeout_s=timeout_s)
+    if rc != 0:
+        if "No such file" in (out + err):
+            return None
+        return None
+    return out
+
+
+def _parse_int_list(text: str) -> list[int]:
+    out: list[int] = []
+    for tok in text.replace("\n", " ").split():
+        try:
+            out.append(int(tok))
+        except Exception:
+            continue
+    return out
+
+
+def _parse_time_in_state_freqs(text: str) -> list[int]:
+    freqs: list[int] = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        try:
+            freqs.append(int(parts[0]))
+        except Exception:
+            continue
+    return freqs
+
+
+def read_policy_info(adb: str, serial: str | None, policy: int) -> PolicyInfo | None:
+    rel = _shell_cat(adb, serial, f"/sys/devices/system/cpu/cpufreq/policy{policy}/related_cpus", timeout_s=5.0)
+    tis = _shell_cat(adb, serial, f"/sys/devices/system/cpu/cpufreq/policy{policy}/stats/time_in_state", timeout_s=5.0)
+    if rel is None or tis is None:
+        return None
+    related = _parse_int_list(rel)
+    freqs = _parse_time_in_state_freqs(tis)
+    return PolicyInfo(policy=policy, related_cpus=related, freqs_khz=freqs)
+
+
+def load_power_profile(profile_json: Path) -> dict:
+    return json.loads(profile_json.read_text(encoding="utf-8"))
+
+
+def _cluster_freqs(profile: dict, cluster: int) -> list[int]:
+    core_speeds = profile.get("core_speeds_khz", {})
+    vals = core_speeds.get(str(cluster))
+    if not vals:
+        return []
+    return [int(v) for v in vals]
+
+
+def _cluster_cores(profile: dict, cluster: int) -> int | None:
+    cores = profile.get("clusters_cores")
+    if not cores:
+        return None
+    if 0 <= cluster < len(cores):
+        try:
+            return int(cores[cluster])
+        except Exception:
+            return None
+    return None
+
+
+def score_policy_cluster(policy: PolicyInfo, profile: dict, cluster: int) -> float:
+    c_freqs = _cluster_freqs(profile, cluster)
+    if not c_freqs:
+        return float("-inf")
+
+    p_freqs = set(policy.freqs_khz)
+    c_set = set(c_freqs)
+
+    inter = len(p_freqs & c_set)
+    union = len(p_freqs | c_set)
+    jaccard = inter / union if union else 0.0
+
+    score = 100.0 * jaccard
+
+    c_cores = _cluster_cores(profile, cluster)
+    if c_cores is not None:
+        if c_cores == len(policy.related_cpus):
+            score += 25.0
+        else:
+            score -= 5.0 * abs(c_cores - len(policy.related_cpus))
+
+    # Bonus for same max freq (common strong signal)
+    try:
+        if max(c_freqs) == max(policy.freqs_khz):
+            score += 15.0
+    except Exception:
+        pass
+
+    return score
+
+
+@dataclass
+class PolicyMapResult:
+    mapping: dict[str, int]
+    debug_scores: dict[str, dict[str, float]]
+    serial: str | None
+    out_json: Path
+
+
+def map_policies_to_clusters(
+    adb: str,
+    serial: str | None,
+    *,
+    profile_json: Path = DEFAULT_PROFILE_JSON,
+    out: Path = DEFAULT_MAP_JSON,
+    policies: list[int] | None = None,
+) -> PolicyMapResult:
+    """Score each readable cpufreq policy against the power_profile clusters and write the mapping JSON."""
+    profile = load_power_profile(profile_json)
+
+    clusters = sorted(int(k) for k in profile.get("core_speeds_khz", {}).keys())
+    if not clusters:
+        raise ValueError(f"No clusters found in {profile_json}")
+
+    policy_infos: list[PolicyInfo] = []
+    for p in policies if policies is not None else range(0, 16):
+        info = read_policy_info(adb, serial, p)
+        if info is not None:
+            policy_infos.append(info)
+
+    if not policy_infos:
+        raise RuntimeError("No cpufreq policies found/readable. Is the device connected and permissions OK?")
+
+    mapping: dict[str, int] = {}
+    debug: dict[str, dict[str, float]] = {}
+
+    for pi in policy_infos:
+        scores: dict[int, float] = {}
+        for c in clusters:
+            scores[c] = score_policy_cluster(pi, profile, c)
+        best_cluster = max(scores, key=lambda k: scores[k])
+        mapping[str(pi.policy)] = int(best_cluster)
+        debug[str(pi.policy)] = {str(k): float(v) for k, v in scores.items()}
+
+    out_obj = {
+        "serial": serial,
+        "mapped_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "mapping_policy_to_cluster": mapping,
+        "debug_scores": debug,
+        "notes": "Mapping inferred by freq overlap + core count; verify once per device/ROM.",
+    }
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(out_obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    return PolicyMapResult(mapping=mapping, debug_scores=debug, serial=serial, out_json=out)
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import csv
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Iterable, TypeVar
+
+
+# Opt-in instrumentation for pipeline_run --profile. `span(name)` times a stage or sub-stage (wall time,
+# CPU time of the calling thread, process peak RSS, and the net Python allocation with tracemalloc) and
+# aggregates by name path: spans nest per thread, so "enrich/compute" is the compute step inside the enrich
+# stage. With no profiler enabled span() returns a shared no-op context manager (one global read per call).
+
+F = TypeVar("F", bound=Callable[..., object])
+
+
+@dataclass
+class SpanStats:
+    name: str  # "/"-joined names of the enclosing spans on the recording thread
+    calls: int = 0
+    errors: int = 0  # calls that exited with an exception
+    wall_s: float = 0.0
+    wall_max_s: float = 0.0
+    cpu_s: float = 0.0  # thread CPU time; work done in child processes (adb, trace_processor) is not included
+    first_start_s: float | None = None  # offset from profiler start
+    rss_peak_mb: float | None = None  # process high-water mark when the span last exited
+    py_alloc_mb: float | None = None  # net tracemalloc change summed over calls (--profile-tracemalloc only)
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MiB (None where it cannot be measured)."""
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+    except Exception:
+        pass
+    try:
+        import psutil  # type: ignore[import-not-found]
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("_p", "_name", "_path", "_t0", "_c0", "_m0")
+
+    def __init__(self, profiler: Profiler, name: str) -> None:
+        self._p = profiler
+        self._name = name
+
+    def __enter__(self) -> None:
+        stack = self._p._stack()
+        stack.append(self._name)
+        self._path = "/".join(stack)
+        self._m0 = tracemalloc.get_traced_memory()[0] if self._p.trace_malloc else 0
+        self._c0 = time.thread_time()
+        self._t0 = time.perf_counter()
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        t1 = time.perf_counter()
+        cpu = time.thread_time() - self._c0
+        alloc = tracemalloc.get_traced_memory()[0] - self._m0 if self._p.trace_malloc else None
+        self._p._stack().pop()
+        self._p._record(self._path, self._t0, t1, cpu, alloc, exc_type is not None)
+
+
+class Profiler:
+    """Per-process span aggregator (see span())."""
+
+    def __init__(self, *, trace_malloc: bool = False) -> None:
+        self.trace_malloc = bool(trace_malloc)
+        self._own_tracemalloc = False
+        if self.trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._own_tracemalloc = True
+        self._t0 = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats: dict[str, SpanStats] = {}
+        self._top_allocs: list[dict[str, object]] = []
+        self._py_peak_mb: float | None = None
+
+    def _stack(self) -> list[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, path: str, t0: float, t1: float, cpu: float, alloc: int | None, error: bool) -> None:
+        wall = t1 - t0
+        rss = peak_rss_mb()
+        with self._lock:
+            s = self._stats.get(path)
+            if s is None:
+                s = self._stats[path] = SpanStats(name=path, first_start_s=round(t0 - self._t0, 3))
+            s.calls += 1
+            s.errors += int(error)
+            s.wall_s += wall
+            s.wall_max_s = max(s.wall_max_s, wall)
+            s.cpu_s += cpu
+            if rss is not None:
+                s.rss_peak_mb = round(max(s.rss_peak_mb or 0.0, rss), 1)
+            if alloc is not None:
+                s.py_alloc_mb = (s.py_alloc_mb or 0.0) + alloc / (1024.0 * 1024.0)
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def merge(self, rows: Iterable[dict]) -> None:
+        """Add span rows recorded by another process (e.g. run_plan's device worker)."""
+        with self._lock:
+            for r in rows:
+                other = SpanStats(**r)
+                s = self._stats.get(other.name)
+                if s is None:
+                    self._stats[other.name] = other
+                    continue
+                s.calls += other.calls
+                s.errors += other.errors
+                s.wall_s += other.wall_s
+                s.wall_max_s = max(s.wall_max_s, other.wall_max_s)
+                s.cpu_s += other.cpu_s
+                if other.rss_peak_mb is not None:
+                    s.rss_peak_mb = max(s.rss_peak_mb or 0.0, other.rss_peak_mb)
+                if other.py_alloc_mb is not None:
+                    s.py_alloc_mb = (s.py_alloc_mb or 0.0) + other.py_alloc_mb
+
+    def rows(self) -> list[dict]:
+        """Span rows (JSON-serialisable), in first-start order."""
+        with self._lock:
+            # Parents start first; on a tie the shorter path (the parent) sorts first too.
+            order = sorted(self._stats.values(), key=lambda s: (s.first_start_s is None, s.first_start_s or 0.0, s.name))
+            out = []
+            for s in order:
+                r = asdict(s)
+                for k in ("wall_s", "wall_max_s", "cpu_s"):
+                    r[k] = round(r[k], 4)
+                if r["py_alloc_mb"] is not None:
+                    r["py_alloc_mb"] = round(r["py_alloc_mb"], 3)
+                out.append(r)
+            return out
+
+    def close(self, *, top: int = 15) -> None:
+        """Stop tracemalloc (if started here), keeping its peak and the largest live allocation sites."""
+        if not self._own_tracemalloc or not tracemalloc.is_tracing():
+            return
+        self._py_peak_mb = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 3)
+        snap = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        self._top_allocs = [
+            {"where": str(st.traceback), "size_mb": round(st.size / (1024.0 * 1024.0), 3), "count": st.count}
+            for st in snap.statistics("lineno")[:top]
+        ]
+        tracemalloc.stop()
+        self._own_tracemalloc = False
+
+    def to_json(self) -> dict:
+        rss = peak_rss_mb()
+        obj: dict[str, object] = {
+            "wall_s": round(time.perf_counter() - self._t0, 3),
+            "rss_peak_mb": None if rss is None else round(rss, 1),
+            "tracemalloc": self.trace_malloc,
+            "spans": self.rows(),
+        }
+        if self.trace_malloc:
+            obj["py_peak_mb"] = self._py_peak_mb
+            obj["top_allocations"] = self._top_allocs
+        return obj
+
+
+_ACTIVE: Profiler | None = None
+
+
+def enable(*, trace_malloc: bool = False) -> Profiler:
+    """Install a fresh process-wide profiler (replacing any previous one) and return it."""
+    global _ACTIVE
+    if _ACTIVE is not None:
+        _ACTIVE.close()
+    _ACTIVE = Profiler(trace_malloc=trace_malloc)
+    return _ACTIVE
+
+
+def disable() -> Profiler | None:
+    """Uninstall the profiler; returns it (closed) so its data can still be written."""
+    global _ACTIVE
+    p, _ACTIVE = _ACTIVE, None
+    if p is not None:
+        p.close()
+    return p
+
+
+def active() -> Profiler | None:
+    return _ACTIVE
+
+
+def span(name: str) -> _Span | _NullSpan:
+    """Context manager timing `name` under the enclosing spans of this thread (no-op when disabled)."""
+    p = _ACTIVE
+    return _NULL_SPAN if p is None else _Span(p, name)
+
+
+def profiled(name: str | None = None) -> Callable[[F], F]:
+    """Decorator form of span(); the profiler is looked up per call, so it can be enabled later."""
+
+    def deco(fn: F) -> F:
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            p = _ACTIVE
+            if p is None:
+                return fn(*a, **kw)
+            with _Span(p, label):
+                return fn(*a, **kw)
+
+        return wrapper  # type: ignore[return-value]
+
+    return deco
+
+
+# -----------------------------
+# Aggregate over runs
+# -----------------------------
+
+SUMMARY_FIELDS = [
+    "kind",
+    "name",
+    "runs",
+    "calls",
+    "wall_s_mean",
+    "wall_s_median",
+    "wall_s_p90",
+    "wall_s_max",
+    "cpu_s_mean",
+    "rss_peak_mb_max",
+    "share_of_busy",
+]
+
+
+def _quantile(xs: list[float], q: float) -> float:
+    s = sorted(xs)
+    if len(s) == 1:
+        return s[0]
+    pos = q * (len(s) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+
+def summarize_stage_timings(paths: Iterable[Path]) -> list[dict]:
+    """Per stage (status "ran") and per profiled span: wall/CPU statistics over the given stage_timings.json files."""
+    wall: dict[tuple[str, str], list[float]] = {}
+    cpu: dict[tuple[str, str], list[float]] = {}
+    calls: dict[tuple[str, str], int] = {}
+    rss: dict[tuple[str, str], float] = {}
+    busy = 0.0
+    for path in paths:
+        try:
+            obj = json.loads(Path(path).read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"WARN: skipping {path}: {e}")
+            continue
+        for st in obj.get("stages") or []:
+            if st.get("status") != "ran":
+                continue
+            key = ("stage", str(st.get("name")))
+            wall.setdefault(key, []).append(float(st.get("seconds") or 0.0))
+            calls[key] = calls.get(key, 0) + 1
+            busy += float(st.get("seconds") or 0.0)
+        for sp in (obj.get("profile") or {}).get("spans") or []:
+            key = ("span", str(sp.get("name")))
+            wall.setdefault(key, []).append(float(sp.get("wall_s") or 0.0))
+            cpu.setdefault(key, []).append(float(sp.get("cpu_s") or 0.0))
+            calls[key] = calls.get(key, 0) + int(sp.get("calls") or 0)
+            if sp.get("rss_peak_mb") is not None:
+                rss[key] = max(rss.get(key, 0.0), float(sp["rss_peak_mb"]))
+
+    rows: list[dict] = []
+    for key, xs in wall.items():
+        kind, name = key
+        rows.append(
+            {
+                "kind": kind,
+                "name": name,
+                "runs": len(xs),
+                "calls": calls.get(key, 0),
+                "wall_s_mean": round(statistics.fmean(xs), 3),
+                "wall_s_median": round(statistics.median(xs), 3),
+                "wall_s_p90": round(_quantile(xs, 0.9), 3),
+                "wall_s_max": round(max(xs), 3),
+                "cpu_s_mean": round(statistics.fmean(cpu[key]), 3) if key in cpu else None,
+                "rss_peak_mb_max": rss.get(key),
+                # Stages only: share of the summed stage run time (the same "busy" notion as stage_timings.json).
+                "share_of_busy": round(sum(xs) / busy, 4) if kind == "stage" and busy > 0 else None,
+            }
+        )
+    rows.sort(key=lambda r: (r["kind"] != "stage", -r["wall_s_mean"]))
+    return rows
+
+
+def write_stage_timings_summary(paths: Iterable[Path], out_csv: Path) -> Path:
+    rows = summarize_stage_timings(paths)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    with out_csv.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: "" if r[k] is None else r[k] for k in SUMMARY_FIELDS})
+    return out_csv
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from mp_power.sampler import _read_thermalservice
+
+
+# Pre-run thermal gate for pipeline_run --wait-thermal-steady: poll `dumpsys thermalservice`, fit an
+# exponential settling curve T(t) = T_inf + A*exp(-t/tau) per sensor over the recent window, and start
+# the run once the drift predicted over the run duration is small (or every banded sensor is inside
+# its band). Keeps hot starts out of the data instead of rejecting them in QC afterwards.
+
+TAU_GRID_S = tuple(round(20.0 * 1.25**k, 1) for k in range(26))  # 20 s .. ~5300 s
+
+
+@dataclass
+class ThermalGateConfig:
+    names: tuple[str, ...] = ("CPU", "BATTERY")
+    horizon_s: float = 540.0  # drift is predicted over this span (the run duration)
+    max_drift_c: float = 1.0
+    bands: dict[str, tuple[float, float]] = field(default_factory=dict)  # sensor -> (lo, hi) degC
+    poll_s: float = 10.0
+    window_s: float = 180.0
+    min_samples: int = 6
+    timeout_s: float = 1800.0
+
+
+@dataclass
+class ThermalGateResult:
+    steady: bool
+    reason: str  # drift | band | timeout | no-sensors
+    waited_s: float
+    polls: int
+    temps_c: dict[str, float | None]
+    drift_c: dict[str, float | None]
+    thermal_status: int | None = None
+    samples: list[dict[str, object]] = field(default_factory=list)
+
+
+def fit_exp_settle(t_s: list[float], temp_c: list[float]) -> tuple[float, float, float] | None:
+    """Least-squares fit of T = T_inf + A*exp(-t/tau) with tau on a log grid; (T_inf, A, tau) or None."""
+    n = len(t_s)
+    if n < 3:
+        return None
+    best: tuple[float, float, float, float] | None = None
+    t0 = t_s[0]
+    for tau in TAU_GRID_S:
+        x = [math.exp(-(t - t0) / tau) for t in t_s]
+        mx = sum(x) / n
+        my = sum(temp_c) / n
+        sxx = sum((xi - mx) ** 2 for xi in x)
+        if sxx <= 1e-12:
+            continue
+        a = sum((xi - mx) * (yi - my) for xi, yi in zip(x, temp_c)) / sxx
+        c = my - a * mx
+        sse = sum((c + a * xi - yi) ** 2 for xi, yi in zip(x, temp_c))
+        if best is None or sse < best[0]:
+            best = (sse, c, a, tau)
+    if best is None:
+        return None
+    return best[1], best[2], best[3]
+
+
+def predicted_drift_c(t_s: list[float], temp_c: list[float], horizon_s: float) -> float | None:
+    """|T(now + horizon) - T(now)| from the fitted settling curve (None with too few points)."""
+    fit = fit_exp_settle(t_s, temp_c)
+    if fit is None:
+        return None
+    _, a, tau = fit
+    now = t_s[-1] - t_s[0]
+    return abs(a * math.exp(-now / tau) * (1.0 - math.exp(-float(horizon_s) / tau)))
+
+
+def parse_bands(spec: str) -> dict[str, tuple[float, float]]:
+    """'CPU=30:40,BATTERY=28:34' -> {'CPU': (30.0, 40.0), 'BATTERY': (28.0, 34.0)}."""
+    bands: dict[str, tuple[float, float]] = {}
+    for part in str(spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, rng = part.partition("=")
+        lo, _, hi = rng.partition(":")
+        try:
+            bands[name.strip().upper()] = (float(lo), float(hi))
+        except ValueError:
+            raise ValueError(f"bad thermal band {part!r} (expected NAME=LO:HI)")
+    return bands
+
+
+def wait_thermal_steady(
+    adb: str,
+    serial: str | None,
+    cfg: ThermalGateConfig,
+    *,
+    log: bool = True,
+) -> ThermalGateResult:
+    """Poll thermalservice until the sensors are steady (or in band), or until cfg.timeout_s."""
+    names = tuple(dict.fromkeys(n.strip().upper() for n in (*cfg.names, *cfg.bands) if n.strip()))
+    hist: dict[str, list[tuple[float, float]]] = {n: [] for n in names}
+    samples: list[dict[str, object]] = []
+    t_start = time.monotonic()
+    polls = 0
+    last_log = -math.inf
+    status: int | None = None
+
+    while True:
+        t = time.monotonic() - t_start
+        therm = _read_thermalservice(adb, serial, timeout_s=8.0, want_names=set(names))
+        polls += 1
+        st = therm.get("thermal_status")
+        status = st if isinstance(st, int) else None
+        temps: dict[str, float | None] = {}
+        for n in names:
+            v = therm.get(f"thermal_{n.lower()}_C")
+            temps[n] = float(v) if isinstance(v, (int, float)) else None
+            if temps[n] is not None:
+                hist[n].append((t, temps[n]))  # type: ignore[arg-type]
+                while hist[n] and t - hist[n][0][0] > float(cfg.window_s):
+                    hist[n].pop(0)
+        samples.append({"t_s": round(t, 1), "thermal_status": status, **{n: temps[n] for n in names}})
+
+        drift: dict[str, float | None] = {}
+        for n in cfg.names:
+            h = hist.get(n.upper(), [])
+            drift[n.upper()] = (
+                predicted_drift_c([p[0] for p in h], [p[1] for p in h], cfg.horizon_s)
+                if len(h) >= int(cfg.min_samples)
+                else None
+            )
+
+        status_ok = status in (None, 0)
+        have = [n for n in drift if temps.get(n) is not None]
+        reason = ""
+        if not have and not cfg.bands:
+            reason = "no-sensors"
+        elif status_ok and have and all(drift[n] is not None and drift[n] <= float(cfg.max_drift_c) for n in have):
+            reason = "drift"
+        elif (
+            status_ok
+            and cfg.bands
+            and all(temps.get(n) is not None and lo <= temps[n] <= hi for n, (lo, hi) in cfg.bands.items())  # type: ignore[operator]
+        ):
+            reason = "band"
+        elif t >= float(cfg.timeout_s):
+            reason = "timeout"
+
+        if reason:
+            return ThermalGateResult(
+                steady=reason in ("drift", "band"),
+                reason=reason,
+                waited_s=round(time.monotonic() - t_start, 1),
+                polls=polls,
+                temps_c=temps,
+                drift_c=drift,
+                thermal_status=status,
+                samples=samples,
+            )
+
+        if log and t - last_log >= 60.0:
+            last_log = t
+            parts = [
+                f"{n}={'n/a' if temps.get(n) is None else format(temps[n], '.1f')}C"
+                f" drift={'n/a' if drift.get(n) is None else format(drift[n], '.2f')}C"
+                for n in names
+            ]
+            print(f"Thermal gate: waiting t={t:.0f}s status={status} " + " ".join(parts))
+        time.sleep(max(0.0, float(cfg.poll_s) - ((time.monotonic() - t_start) - t)))
+
+
+def write_gate_json(res: ThermalGateResult, cfg: ThermalGateConfig, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    obj = {"config": asdict(cfg), **asdict(res)}
+    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+# Run CSV time columns: ts_ns (int64 ns since the Unix epoch, written by the sampler since it
+# exists) and ts_pc (ISO-8601 host time). A file's header decides which one is authoritative so
+# that whole-file, chunked, row-by-row and live readers all agree.
+TS_NS_COL = "ts_ns"
+TS_PC_COL = "ts_pc"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def time_column(columns: object) -> str | None:
+    """ts_ns when the header has it, else ts_pc, else None."""
+    cols = set(columns)  # type: ignore[arg-type]
+    if TS_NS_COL in cols:
+        return TS_NS_COL
+    if TS_PC_COL in cols:
+        return TS_PC_COL
+    return None
+
+
+def ts_pc_to_ns(s: str | None) -> int | None:
+    """One ts_pc cell -> ns since epoch (naive stamps are read as UTC; only differences matter)."""
+    s = (s or "").strip()
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def ts_ns_to_int(s: str | None) -> int | None:
+    s = (s or "").strip()
+    if not s:
+        return None
+    try:
+        return int(s)
+    except ValueError:
+        pass
+    # Float notation (a run CSV re-saved by pandas); float64 keeps ~256 ns here.
+    try:
+        v = float(s)
+    except ValueError:
+        return None
+    return int(v) if math.isfinite(v) else None
+
+
+def cell_to_ns(col: str, s: str | None) -> int | None:
+    """Scalar twin of `run_ts_ns` for row-at-a-time readers."""
+    return ts_ns_to_int(s) if col == TS_NS_COL else ts_pc_to_ns(s)
+
+
+def parse_ts_ns(values: object) -> tuple[np.ndarray, np.ndarray]:
+    """ts_ns column (int, float or str cells) -> (int64 ns, ok mask)."""
+    import numpy as np
+    import pandas as pd
+
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return s.to_numpy(dtype=np.int64), np.ones(len(s), dtype=bool)
+    if pd.api.types.is_float_dtype(s.dtype):
+        v = s.to_numpy(dtype=float)
+        ok = np.isfinite(v)
+        return np.where(ok, v, 0.0).astype(np.int64), ok
+    # Text cells: exact int64 parse (float64 would drop the sub-microsecond digits).
+    st = s.astype(str).str.strip()
+    ok = (
+        st.str.fullmatch(r"\d{1,19}").fillna(False)
+        & ((st.str.len() < 19) | (st <= "9223372036854775807"))  # int64 max
+    ).to_numpy(dtype=bool, copy=True)
+    ns = st.where(ok, "0").astype(np.int64).to_numpy(copy=True)
+    if not ok.all():
+        # Float notation (a run CSV re-saved by pandas), same as the scalar ts_ns_to_int.
+        v = pd.to_numeric(st.where(~ok, ""), errors="coerce").to_numpy(dtype=float)
+        fl = ~ok & np.isfinite(v)
+        ns[fl] = v[fl].astype(np.int64)
+        ok = ok | fl
+    return ns, ok
+
+
+def parse_ts_pc_ns(values: object) -> tuple[np.ndarray, np.ndarray]:
+    """ts_pc column -> (int64 ns, ok mask) with one vectorised ISO-8601 parse."""
+    import numpy as np
+    import pandas as pd
+
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    ts = pd.to_datetime(s.astype(str).str.strip(), format="ISO8601", errors="coerce", utc=True)
+    ok = ts.notna().to_numpy()
+    ns = ts.dt.tz_convert(None).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return np.where(ok, ns, 0), ok
+
+
+def run_ts_ns(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """(int64 ns since epoch, ok mask) per row: ts_ns when present, else ts_pc parsed in one pass."""
+    import numpy as np
+
+    col = time_column(df.columns)
+    if col == TS_NS_COL:
+        return parse_ts_ns(df[TS_NS_COL])
+    if col == TS_PC_COL:
+        return parse_ts_pc_ns(df[TS_PC_COL])
+    return np.zeros(len(df), dtype=np.int64), np.zeros(len(df), dtype=bool)
+
+
+def elapsed_s(ns: np.ndarray, ok: np.ndarray) -> np.ndarray:
+    """Seconds since the first valid timestamp (NaN where invalid)."""
+    import numpy as np
+
+    out = np.full(len(ns), np.nan)
+    if ok.any():
+        first = ns[np.argmax(ok)]
+        out[ok] = (ns[ok] - first) / 1e9
+    return out
+
+
+def step_s(ns: np.ndarray, ok: np.ndarray, prev_ns: int | None = None) -> tuple[np.ndarray, np.ndarray, int | None]:
+    """Seconds since the previous valid timestamp (invalid rows are skipped, not zeroed).
+
+    `prev_ns` is the last valid timestamp before this block (chunked/live readers); returns
+    (dt, dt_ok, last valid ns of the block or prev_ns).
+    """
+    import numpy as np
+
+    n = len(ns)
+    last_idx = np.maximum.accumulate(np.where(ok, np.arange(n), -1)) if n else np.zeros(0, dtype=np.int64)
+    prev_idx = np.r_[-1, last_idx[:-1]] if n else last_idx
+    has_prev = prev_idx >= 0
+    prev = np.where(has_prev, ns[np.maximum(prev_idx, 0)], 0 if prev_ns is None else int(prev_ns))
+    prev_ok = has_prev | (prev_ns is not None)
+    dt = (ns - prev) / 1e9
+    last = int(ns[last_idx[-1]]) if n and last_idx[-1] >= 0 else prev_ns
+    return dt, ok & prev_ok, last
+
+
+def add_time_columns(df: pd.DataFrame, *, datetime_col: str | None = None) -> bool:
+    """Add `t_s` (seconds since the first valid stamp) in place; optionally a UTC datetime column.
+
+    Returns False (nothing added) when the frame has no usable time column.
+    """
+    import pandas as pd
+
+    ns, ok = run_ts_ns(df)
+    if not ok.any():
+        return False
+    df["t_s"] = elapsed_s(ns, ok)
+    if datetime_col:
+        df[datetime_col] = pd.to_datetime(pd.Series(ns, index=df.index), unit="ns").where(ok)
+    return True
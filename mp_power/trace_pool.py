@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import atexit
+import http.client
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+ENV_SHELL = "MP_POWER_TRACE_PROCESSOR_SHELL"
+ENV_POOL_SIZE = "MP_POWER_TP_POOL_SIZE"
+
+
+def resolve_trace_processor_shell(bin_path: str | None = None) -> str | None:
+    """trace_processor_shell to use: explicit path, $MP_POWER_TRACE_PROCESSOR_SHELL, PATH.
+
+    None lets the perfetto package fall back to its own prebuilt download.
+    """
+    if bin_path:
+        return bin_path
+    env = os.environ.get(ENV_SHELL)
+    if env:
+        return env
+    for name in ("trace_processor_shell", "trace_processor_shell.exe", "trace_processor"):
+        found = shutil.which(name)
+        if found:
+            return found
+    return None
+
+
+class _Server:
+    """One long-lived trace_processor_shell in HTTP RPC mode (-D --http-port on a free port)."""
+
+    def __init__(self, bin_path: str | None) -> None:
+        from perfetto.trace_processor import TraceProcessor
+        from perfetto.trace_processor import TraceProcessorConfig
+
+        self.owner = TraceProcessor(config=TraceProcessorConfig(bin_path=bin_path, unique_port=True))
+        conn = self.owner.http.conn
+        self.addr = f"{conn.host}:{conn.port}"
+        self.n_loaded = 0
+
+    def alive(self) -> bool:
+        proc = getattr(self.owner, "subprocess", None)
+        return proc is None or proc.poll() is None
+
+    def close(self) -> None:
+        try:
+            self.owner.close()
+        except Exception:
+            pass
+
+
+class TraceProcessorPool:
+    """Bounded pool of trace_processor_shell servers reused across traces.
+
+    Spawning the shell dominates small parses; a pooled server only has to ingest the next trace
+    (a new parse after EOF resets the server's tables). Servers are started lazily up to `size`;
+    a server whose trace load or connection fails is dropped, and a waiting caller spawns a fresh one.
+    Query/extractor errors on a loaded trace keep the server.
+    """
+
+    def __init__(self, size: int = 2, *, bin_path: str | None = None) -> None:
+        if size < 1:
+            raise ValueError("pool size must be >= 1")
+        self.size = int(size)
+        self.bin_path = resolve_trace_processor_shell(bin_path)
+        self._cond = threading.Condition()
+        self._idle: list[_Server] = []
+        self._started = 0
+        self._all: list[_Server] = []
+        self._closed = False
+
+    def _acquire(self) -> _Server:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("TraceProcessorPool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                # Woken by a release: an idle server, or a free slot after a broken one was dropped.
+                self._cond.wait()
+        try:
+            srv = _Server(self.bin_path)
+        except Exception:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._all.append(srv)
+        return srv
+
+    def _release(self, srv: _Server, *, broken: bool) -> None:
+        with self._cond:
+            drop = broken or self._closed
+            if drop:
+                if srv in self._all:
+                    self._all.remove(srv)
+                    self._started -= 1
+            else:
+                self._idle.append(srv)
+            self._cond.notify()
+        if drop:
+            srv.close()
+
+    @contextmanager
+    def session(self, trace: Path) -> Iterator[object]:
+        """Load `trace` into an idle server and yield a TraceProcessor bound to it."""
+        from perfetto.trace_processor import TraceProcessor
+
+        srv = self._acquire()
+        broken = True  # until the trace is loaded
+        tp = None
+        try:
+            tp = TraceProcessor(trace=str(trace), addr=srv.addr)
+            srv.n_loaded += 1
+            broken = False
+            try:
+                yield tp
+            except (OSError, http.client.HTTPException):
+                broken = True  # connection to the shell lost (ConnectionError is an OSError)
+                raise
+            except BaseException:
+                broken = not srv.alive()
+                raise
+        finally:
+            if tp is not None:
+                try:
+                    tp.close()  # remote: closes the HTTP connection only
+                except Exception:
+                    pass
+            self._release(srv, broken=broken)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            servers, self._all = self._all, []
+            self._idle = []
+            self._started = 0
+            self._cond.notify_all()
+        for srv in servers:
+            srv.close()
+
+
+_pool: TraceProcessorPool | None = None
+_pool_lock = threading.Lock()
+
+
+def configure_pool(size: int | None, *, bin_path: str | None = None) -> TraceProcessorPool | None:
+    """Enable (size >= 1) or disable (None/0) the process-wide pool used by open_trace()."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if size:
+            _pool = TraceProcessorPool(int(size), bin_path=bin_path)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    configure_pool(None)
+
+
+atexit.register(shutdown_pool)
+
+
+def _env_pool() -> TraceProcessorPool | None:
+    global _pool
+    raw = os.environ.get(ENV_POOL_SIZE, "").strip()
+    if not raw or _pool is not None:
+        return _pool
+    try:
+        size = int(raw)
+    except ValueError:
+        return None
+    return configure_pool(size) if size > 0 else None
+
+
+@contextmanager
+def open_trace(trace: Path) -> Iterator[object]:
+    """TraceProcessor for `trace`: a pooled session if a pool is configured, else a private shell."""
+    pool = _pool or _env_pool()
+    if pool is not None:
+        with pool.session(trace) as tp:
+            yield tp
+        return
+
+    from perfetto.trace_processor import TraceProcessor
+    from perfetto.trace_processor import TraceProcessorConfig
+
+    with TraceProcessor(trace=str(trace), config=TraceProcessorConfig(bin_path=resolve_trace_processor_shell())) as tp:
+        yield tp
@@ -7,7 +7,7 @@ from _bootstrap import ensure_repo_root_on_sys_path
 
 ensure_repo_root_on_sys_path()
 
-from mp_power.adb import adb_exec_out
+from mp_power.adb import pull_file_exec_out
 from mp_power.adb import resolve_adb
 
 
@@ -17,22 +17,28 @@ def main() -> int:
     parser.add_argument("--serial", default=None, help="Device serial (optional)")
     parser.add_argument("remote", help="Remote path on device")
     parser.add_argument("local", type=Path, help="Local output path")
+    parser.add_argument("--retries", type=int, default=3, help="Resume attempts after a failed/short transfer")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Per-attempt timeout seconds (default: scaled by remote size)",
+    )
     args = parser.parse_args()
 
     adb = resolve_adb(args.adb)
 
     local: Path = args.local
-    local.parent.mkdir(parents=True, exist_ok=True)
 
-    rc, blob, err = adb_exec_out(adb, args.serial, ["cat", args.remote], timeout_s=30.0)
-    if rc != 0:
-        raise SystemExit(f"adb failed (exit={rc}): {err.strip()}")
+    try:
+        res = pull_file_exec_out(adb, args.serial, args.remote, local, retries=args.retries, timeout_s=args.timeout)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
 
-    local.write_bytes(blob)
-
-    if local.stat().st_size == 0:
+    if res.size_bytes == 0:
         raise SystemExit(f"Pulled file is empty: {local} (remote: {args.remote})")
 
+    print(f"Wrote: {local} ({res.size_bytes} bytes, sha256={res.sha256}, attempts={res.attempts})")
     return 0
 
 
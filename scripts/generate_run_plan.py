@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import argparse
+import re
+from dataclasses import dataclass
 from pathlib import Path
 
 import pandas as pd
@@ -30,25 +32,133 @@ def _screen_mode(v) -> str:
     return s
 
 
-def main() -> int:
-    ap = argparse.ArgumentParser(description="Generate pipeline_run.py commands from a CSV test plan")
+@dataclass
+class PlanRun:
+    plan_id: str
+    scenario: str
+    repeat_index: int  # 1-based
+    repeat: int
+    notes: str
+    args: list[str]  # pipeline_run.py arguments
+    device_group: str = ""  # runs sharing a group stay on one device (run_plan.py --serials)
+    cpu_load_threads: int = 0
+
+    @property
+    def key(self) -> str:
+        """Stable id of this run within the plan (used by run_plan.py's state file)."""
+        return f"{self.plan_id or self.scenario}/{self.scenario}/{self.repeat_index}"
+
+
+def _device_group(row: pd.Series, scenario: str) -> str:
+    # Optional plan column; otherwise the A/B family (S4 and S4-1, S1-HS-1 and S1-HS-2).
+    v = row.get("device_group", None)
+    if v is not None and not pd.isna(v) and str(v).strip() != "":
+        return str(v).strip()
+    return re.sub(r"-\d+$", "", scenario)
+
+
+def _row_args(row: pd.Series) -> list[str]:
+    scenario = str(row.get("scenario", "")).strip()
+    duration = float(row.get("duration_s", 540) or 540)
+    interval = float(row.get("interval_s", 2) or 2)
+
+    thermal = _flag(row.get("thermal", 1))
+    display = _flag(row.get("display", 1))
+    qc = _flag(row.get("qc", 1))
+
+    set_brightness = row.get("set_brightness", None)
+    cpu_threads = row.get("cpu_load_threads", None)
+    cpu_load_best_effort = _flag(row.get("cpu_load_best_effort", 0))
+    screen_before = _screen_mode(row.get("screen_before", None))
+    auto_reset_settings = _flag(row.get("auto_reset_settings", 0))
+
+    parts = [
+        "--scenario",
+        scenario,
+        "--duration",
+        f"{duration:g}",
+        "--interval",
+        f"{interval:g}",
+    ]
+    if thermal:
+        parts.append("--thermal")
+    if display:
+        parts.append("--display")
+    if qc:
+        parts.append("--qc")
+
+    if screen_before == "on":
+        parts.append("--screen-wake-before")
+    elif screen_before == "off":
+        parts.append("--screen-sleep-before")
+
+    # Brightness setting is best-effort; enable write-settings to increase chance.
+    if set_brightness is not None and not pd.isna(set_brightness) and str(set_brightness).strip() != "":
+        parts.append("--enable-write-settings")
+        parts += ["--set-brightness", str(int(float(set_brightness)))]
+        # Keep screen from timing out during S2.
+        parts += ["--set-timeout-ms", "2147483647"]
+        if auto_reset_settings:
+            parts.append("--auto-reset-settings")
+
+    if cpu_threads is not None and not pd.isna(cpu_threads) and str(cpu_threads).strip() != "":
+        threads = int(float(cpu_threads))
+        if threads > 0:
+            parts += ["--cpu-load-threads", str(threads)]
+            if cpu_load_best_effort:
+                parts.append("--cpu-load-best-effort")
+    return parts
+
+
+def load_plan_runs(
+    plan: Path,
+    *,
+    only_plan_ids: set[str] | None = None,
+    scenario_prefix: str | None = None,
+) -> list[PlanRun]:
+    """Expand a CSV test plan into one PlanRun per repeat, in plan order."""
+    df = pd.read_csv(plan, encoding="utf-8-sig")
+
+    runs: list[PlanRun] = []
+    for _, row in df.iterrows():
+        scenario = str(row.get("scenario", "")).strip()
+        if not scenario:
+            continue
+
+        plan_id = str(row.get("plan_id", "")).strip()
+        if only_plan_ids is not None and plan_id not in only_plan_ids:
+            continue
+        if scenario_prefix is not None and not scenario.startswith(scenario_prefix):
+            continue
+
+        repeat = int(row.get("repeat", 1) or 1)
+        notes = str(row.get("notes", "")).strip()
+        args = _row_args(row)
+        group = _device_group(row, scenario)
+        threads = int(args[args.index("--cpu-load-threads") + 1]) if "--cpu-load-threads" in args else 0
+        for i in range(repeat):
+            runs.append(
+                PlanRun(
+                    plan_id=plan_id,
+                    scenario=scenario,
+                    repeat_index=i + 1,
+                    repeat=repeat,
+                    notes=notes,
+                    args=list(args),
+                    device_group=group,
+                    cpu_load_threads=threads,
+                )
+            )
+    return runs
+
+
+def add_filter_args(ap: argparse.ArgumentParser) -> None:
     ap.add_argument(
         "--plan",
         type=Path,
         default=Path("configs/test_plan_v2.csv"),
         help="CSV file describing planned runs",
     )
-    ap.add_argument(
-        "--python",
-        default="python",
-        help="Python command to invoke (e.g., python or path/to/.venv/python.exe)",
-    )
-    ap.add_argument(
-        "--out",
-        type=Path,
-        default=None,
-        help="Optional output file path (e.g., artifacts/run_plan_v2.ps1)",
-    )
     ap.add_argument(
         "--only-plan-id",
         default=None,
@@ -65,15 +175,9 @@ def main() -> int:
             "Example: --only-scenario-prefix S3_"
         ),
     )
-    ap.add_argument(
-        "--encoding",
-        default="utf-8-sig",
-        help="Encoding for --out file (default: utf-8-sig for Windows PowerShell compatibility)",
-    )
-    args = ap.parse_args()
 
-    df = pd.read_csv(args.plan, encoding="utf-8-sig")
 
+def plan_filters(args: argparse.Namespace) -> tuple[set[str] | None, str | None]:
     only_plan_ids: set[str] | None = None
     if args.only_plan_id is not None and str(args.only_plan_id).strip() != "":
         only_plan_ids = {p.strip() for p in str(args.only_plan_id).split(",") if p.strip()}
@@ -81,79 +185,41 @@ def main() -> int:
     scenario_prefix = None
     if args.only_scenario_prefix is not None and str(args.only_scenario_prefix).strip() != "":
         scenario_prefix = str(args.only_scenario_prefix).strip()
+    return only_plan_ids, scenario_prefix
 
-    cmds: list[str] = []
-    for _, row in df.iterrows():
-        scenario = str(row.get("scenario", "")).strip()
-        if not scenario:
-            continue
-
-        plan_id = str(row.get("plan_id", "")).strip()
-        if only_plan_ids is not None and plan_id not in only_plan_ids:
-            continue
-        if scenario_prefix is not None and not scenario.startswith(scenario_prefix):
-            continue
-
-        repeat = int(row.get("repeat", 1) or 1)
-        duration = float(row.get("duration_s", 540) or 540)
-        interval = float(row.get("interval_s", 2) or 2)
-
-        thermal = _flag(row.get("thermal", 1))
-        display = _flag(row.get("display", 1))
-        qc = _flag(row.get("qc", 1))
 
-        set_brightness = row.get("set_brightness", None)
-        cpu_threads = row.get("cpu_load_threads", None)
-        cpu_load_best_effort = _flag(row.get("cpu_load_best_effort", 0))
-        screen_before = _screen_mode(row.get("screen_before", None))
-        auto_reset_settings = _flag(row.get("auto_reset_settings", 0))
-
-        notes = str(row.get("notes", "")).strip()
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Generate pipeline_run.py commands from a CSV test plan")
+    add_filter_args(ap)
+    ap.add_argument(
+        "--python",
+        default="python",
+        help="Python command to invoke (e.g., python or path/to/.venv/python.exe)",
+    )
+    ap.add_argument(
+        "--out",
+        type=Path,
+        default=None,
+        help="Optional output file path (e.g., artifacts/run_plan_v2.ps1)",
+    )
+    ap.add_argument(
+        "--encoding",
+        default="utf-8-sig",
+        help="Encoding for --out file (default: utf-8-sig for Windows PowerShell compatibility)",
+    )
+    args = ap.parse_args()
 
-        for i in range(repeat):
-            parts = [
-                args.python,
-                "scripts/pipeline_run.py",
-                f"--scenario {scenario}",
-                f"--duration {duration:g}",
-                f"--interval {interval:g}",
-            ]
-            if thermal:
-                parts.append("--thermal")
-            if display:
-                parts.append("--display")
-            if qc:
-                parts.append("--qc")
-
-            if screen_before == "on":
-                parts.append("--screen-wake-before")
-            elif screen_before == "off":
-                parts.append("--screen-sleep-before")
-
-            # Brightness setting is best-effort; enable write-settings to increase chance.
-            if set_brightness is not None and not pd.isna(set_brightness) and str(set_brightness).strip() != "":
-                parts.append("--enable-write-settings")
-                parts.append(f"--set-brightness {int(float(set_brightness))}")
-                # Keep screen from timing out during S2.
-                parts.append("--set-timeout-ms 2147483647")
-                if auto_reset_settings:
-                    parts.append("--auto-reset-settings")
-
-            if cpu_threads is not None and not pd.isna(cpu_threads) and str(cpu_threads).strip() != "":
-                threads = int(float(cpu_threads))
-                if threads > 0:
-                    parts.append(f"--cpu-load-threads {threads}")
-                    if cpu_load_best_effort:
-                        parts.append("--cpu-load-best-effort")
-
-            cmd = " ".join(parts)
-            if repeat > 1:
-                cmd = f"# repeat {i+1}/{repeat}\n" + cmd
-            if plan_id:
-                cmd = f"# plan_id={plan_id}\n" + cmd
-            if notes:
-                cmd = f"# {notes}\n" + cmd
-            cmds.append(cmd)
+    only_plan_ids, scenario_prefix = plan_filters(args)
+    cmds: list[str] = []
+    for run in load_plan_runs(args.plan, only_plan_ids=only_plan_ids, scenario_prefix=scenario_prefix):
+        cmd = " ".join([args.python, "scripts/pipeline_run.py", *run.args])
+        if run.repeat > 1:
+            cmd = f"# repeat {run.repeat_index}/{run.repeat}\n" + cmd
+        if run.plan_id:
+            cmd = f"# plan_id={run.plan_id}\n" + cmd
+        if run.notes:
+            cmd = f"# {run.notes}\n" + cmd
+        cmds.append(cmd)
 
     output_text = "\n\n".join(cmds) + "\n"
 
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from _bootstrap import ensure_repo_root_on_sys_path
+
+ensure_repo_root_on_sys_path()
+
+from mp_power.dashboard import LiveDashboard
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description="Live terminal/HTML dashboard for a run that is still being sampled (tails the sampler CSV)"
+    )
+    ap.add_argument("--run-csv", type=Path, required=True, help="Sampler output, e.g. artifacts/runs/<run>.csv")
+    ap.add_argument(
+        "--enriched-csv",
+        type=Path,
+        default=None,
+        help="Live-enriched CSV for CPU power (default: <run>_enriched.csv next to --run-csv if it exists)",
+    )
+    ap.add_argument(
+        "--perfetto-dir",
+        type=Path,
+        default=None,
+        help="Perfetto long-capture segment dir (<report>/perfetto_segments) for per-segment android.power",
+    )
+    ap.add_argument("--html", type=Path, default=None, help="Also write a self-refreshing HTML page here")
+    ap.add_argument("--no-term", action="store_true", help="Only write --html (no terminal view)")
+    ap.add_argument("--refresh-s", type=float, default=2.0)
+    ap.add_argument("--window-s", type=float, default=60.0, help="Rolling window for power/error rate")
+    ap.add_argument("--once", action="store_true", help="Read what is there, render once and exit")
+    args = ap.parse_args()
+
+    enriched = args.enriched_csv
+    if enriched is None:
+        cand = args.run_csv.with_name(args.run_csv.stem + "_enriched.csv")
+        enriched = cand if cand.exists() else None
+    if args.no_term and args.html is None:
+        raise SystemExit("--no-term needs --html")
+
+    dash = LiveDashboard(
+        args.run_csv,
+        enriched_csv=enriched,
+        perfetto_dir=args.perfetto_dir,
+        html_out=args.html,
+        terminal=not args.no_term,
+        window_s=args.window_s,
+        refresh_s=args.refresh_s,
+    )
+    if args.once:
+        dash.write(dash.poll(final=True))
+        return 0
+
+    try:
+        while True:
+            dash.write(dash.poll())
+            time.sleep(max(0.2, float(args.refresh_s)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -317,11 +317,17 @@ def fit_power_model_v2(
     *,
     thermal_model: str = "1state",
     leak_temp_mix_cpu: float = 0.7,
+    component_offsets: str = "ab",
 ) -> tuple[ModelParamsV2, pd.DataFrame, pd.DataFrame]:
     """Two-stage fit:
     1) Fit thermal per-run, simulate T_hat
     2) Fit electrical power model on GPS-OFF rows (intercept + screen + cpu + leak(T_hat))
     3) Estimate k_gps from S4 vs S4-1 residual means (nonnegative)
+
+    component_offsets: "ab" = GPS/cellular OFF offsets from the A/B residual runs (0 if absent);
+    "power_profile" = minus the mean component power estimate (power_gps_mW_est /
+    power_cellular_mW_est from `enrich --estimators`) over the rows where it is ON;
+    "auto" = A/B where those runs are present, power_profile otherwise.
     """
 
     df = all_df.copy()
@@ -446,14 +452,30 @@ def fit_power_model_v2(
             return None
         return float(df2.loc[m, "resid0_mW"].mean())
 
-    r_s4 = _run_mean_resid("20260201_213514_S4")
-    r_s41 = _run_mean_resid("20260201_215338_S4-1")
+    def _power_profile_off(col: str, m_on: np.ndarray) -> float | None:
+        if col not in df2.columns:
+            return None
+        v = pd.to_numeric(df2.loc[m_on, col], errors="coerce").dropna()
+        if v.empty:
+            return None
+        return -max(0.0, float(v.mean()))
+
+    mode = str(component_offsets or "ab").strip().lower()
+    use_ab = mode in {"ab", "auto"}
+    use_pp = mode in {"power_profile", "auto"}
+
+    r_s4 = _run_mean_resid("20260201_213514_S4") if use_ab else None
+    r_s41 = _run_mean_resid("20260201_215338_S4-1") if use_ab else None
+    pp_gps = _power_profile_off("power_gps_mW_est", m_gps_on) if use_pp else None
 
     if r_s4 is not None and r_s41 is not None:
         # Offset applied only when GPS is OFF.
         k_gps_off = float(r_s4 - r_s41)
         k_gps_off = min(0.0, k_gps_off)
         gps_source = "S4_minus_S4-1"
+    elif pp_gps is not None:
+        k_gps_off = pp_gps
+        gps_source = "power_profile"
     else:
         k_gps_off = 0.0
         gps_source = "none"
@@ -466,14 +488,18 @@ def fit_power_model_v2(
             return None
         return float(df2.loc[m, "resid0_mW"].mean())
 
-    r_s1_on = _run_mean_resid_cell("20260131_230812_S1-HS-1")
-    r_s1_off = _run_mean_resid_cell("20260201_174510_S1-HS-2")
+    r_s1_on = _run_mean_resid_cell("20260131_230812_S1-HS-1") if use_ab else None
+    r_s1_off = _run_mean_resid_cell("20260201_174510_S1-HS-2") if use_ab else None
+    pp_cell = _power_profile_off("power_cellular_mW_est", m_cell_on) if use_pp else None
     if r_s1_on is not None and r_s1_off is not None:
         # Offset applied only when cellular is OFF.
         # If cellular OFF reduces power, residual on the OFF run is negative.
         k_cell_off = float(r_s1_off - r_s1_on)
         k_cell_off = min(0.0, k_cell_off)  # enforce: cellular-off should not increase power
         cell_source = "S1-HS-2_minus_S1-HS-1"
+    elif pp_cell is not None:
+        k_cell_off = pp_cell
+        cell_source = "power_profile"
     else:
         k_cell_off = 0.0
         cell_source = "none"
@@ -639,6 +665,15 @@ def main() -> int:
         default=0.7,
         help="For 2state: leak_temp = mix*cpu_hat + (1-mix)*batt_hat (0..1).",
     )
+    ap.add_argument(
+        "--component-offsets",
+        choices=["ab", "power_profile", "auto"],
+        default="auto",
+        help=(
+            "GPS/cellular OFF offsets: A/B residual runs, power_profile component estimates "
+            "(model input from `enrich --estimators gps,cellular`), or A/B when present else power_profile."
+        ),
+    )
 
     args = ap.parse_args()
 
@@ -652,6 +687,7 @@ def main() -> int:
         leak_gamma_per_C=leak_gamma,
         thermal_model=str(args.thermal_model),
         leak_temp_mix_cpu=float(args.leak_temp_mix_cpu),
+        component_offsets=str(args.component_offsets),
     )
     params.c_eff_mAh = float(args.c_eff_mAh)
 
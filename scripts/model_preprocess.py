@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import re
 from dataclasses import dataclass
 from pathlib import Path
@@ -8,6 +10,17 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from _bootstrap import ensure_repo_root_on_sys_path
+
+ensure_repo_root_on_sys_path()
+
+from mp_power.pipeline_ops import ENRICH_MANIFEST_NAME
+from mp_power.pipeline_ops import load_enrich_manifest
+
+
+# Per-run build keys of the *_model_input.csv files, written next to them when --manifest is used.
+MODEL_INPUT_INDEX_NAME = "model_input_index.json"
+
 
 @dataclass(frozen=True)
 class RunPaths:
@@ -79,6 +92,54 @@ def _load_perfetto_power(report_dir: Path) -> pd.DataFrame:
     return pf
 
 
+def _load_perfetto_cpu_energy(report_dir: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+    """Cumulative CPU energy (mJ) and cumulative covered time (s) at bin start/end points.
+
+    Built from perfetto_cpu_power_timeseries.csv. Each bin spans [t, t + dt_s]. Older files without
+    dt_s fall back to the ts spacing, capped at the extractor's bin length. Gaps between bins (dropped
+    or failed long-capture segments) add neither energy nor coverage, as in the stitched summary.
+
+    Times are seconds from the first battery counter sample, i.e. the origin used by
+    _load_perfetto_power(), so both series share the same axis.
+    """
+    cpu_path = report_dir / "perfetto_cpu_power_timeseries.csv"
+    if not cpu_path.exists():
+        return None
+    cpu = pd.read_csv(cpu_path)
+    if "ts" not in cpu.columns or "cpu_power_mw" not in cpu.columns or len(cpu) < 2:
+        return None
+    ts = pd.to_numeric(cpu["ts"], errors="coerce").to_numpy(dtype=float)
+    p_mw = pd.to_numeric(cpu["cpu_power_mw"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    t0 = ts[0]
+    batt_path = report_dir / "perfetto_android_power_timeseries.csv"
+    if batt_path.exists():
+        batt = pd.read_csv(batt_path, usecols=["ts"], nrows=1)
+        t0 = float(batt["ts"].iloc[0])
+
+    t = (ts - t0) / 1e9
+    if "dt_s" in cpu.columns:
+        width = pd.to_numeric(cpu["dt_s"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    else:
+        bin_s = float(np.median(np.diff(t)))
+        summary_path = report_dir / "perfetto_cpu_power_summary.json"
+        if summary_path.exists():
+            try:
+                bin_s = float(json.loads(summary_path.read_text(encoding="utf-8"))["bin_ms"]) / 1000.0
+            except Exception:
+                pass
+        width = np.minimum(np.diff(t, append=t[-1] + bin_s), bin_s)
+    width = np.clip(width, 0.0, None)
+
+    # Interleave bin starts and ends; a gap between one bin's end and the next start stays flat.
+    x = np.column_stack([t, t + width]).ravel()
+    energy_after = np.cumsum(p_mw * width)
+    covered_after = np.cumsum(width)
+    energy = np.column_stack([energy_after - p_mw * width, energy_after]).ravel()
+    covered = np.column_stack([covered_after - width, covered_after]).ravel()
+    return x, energy, covered
+
+
 def _interp1d(x: np.ndarray, y: np.ndarray, xq: np.ndarray) -> np.ndarray:
     # Numpy-only linear interpolation with edge hold.
     if len(x) < 2:
@@ -144,6 +205,27 @@ def _make_model_input(
         else pd.Series([np.nan] * len(df), index=df.index)
     )
     cpu_power_mW = cpu_energy_mJ / df["dt_s"].replace(0.0, np.nan)
+    cpu_power_mW_tis = cpu_power_mW
+    cpu_source = pd.Series(["time_in_state"] * len(df), index=df.index)
+
+    # Prefer exact ftrace CPU power (policy trace) averaged over each sample interval.
+    cpu_energy = _load_perfetto_cpu_energy(report_dir) if report_dir is not None else None
+    if cpu_energy is not None:
+        edges, energy, covered = cpu_energy
+        t_end = df["dt_s"].cumsum().to_numpy(dtype=float)
+        dt = df["dt_s"].to_numpy(dtype=float)
+        e_end = np.interp(t_end, edges, energy, left=np.nan, right=np.nan)
+        e_start = np.interp(t_end - dt, edges, energy, left=np.nan, right=np.nan)
+        cov = np.interp(t_end, edges, covered, left=np.nan, right=np.nan) - np.interp(
+            t_end - dt, edges, covered, left=np.nan, right=np.nan
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Rows overlapping a trace gap keep the time_in_state estimate.
+            pf_cpu = np.where((dt > 0) & (cov >= 0.99 * dt), (e_end - e_start) / dt, np.nan)
+        pf_cpu_s = pd.Series(pf_cpu, index=df.index)
+        use_pf = pf_cpu_s.notna()
+        cpu_power_mW = pf_cpu_s.where(use_pf, cpu_power_mW)
+        cpu_source = cpu_source.where(~use_pf, "perfetto_ftrace")
 
     # Screen power estimate. Note: for most scenarios we assume screen is OFF; for S2 we assume screen is ON.
     screen_power_mW_est = (
@@ -178,6 +260,8 @@ def _make_model_input(
             "display_state": display_state,
             "power_total_mW": power_total_mW,
             "power_cpu_mW": cpu_power_mW,
+            "power_cpu_mW_time_in_state": cpu_power_mW_tis,
+            "power_cpu_source": cpu_source,
             "power_screen_mW": screen_power_mW_est,
             "charge_counter_uAh": pd.to_numeric(df["charge_counter_uAh"], errors="coerce")
             if "charge_counter_uAh" in df.columns
@@ -190,6 +274,12 @@ def _make_model_input(
     run_name = run_csv.stem.replace("_enriched", "")
     out["run_name"] = run_name
 
+    # Component estimates from `enrich --estimators` (power_profile items x scenario/state), if any.
+    for c in df.columns:
+        m = re.match(r"^(\w+)_power_mW_est$", str(c))
+        if m and m.group(1) != "screen":
+            out[f"power_{m.group(1)}_mW_est"] = pd.to_numeric(df[c], errors="coerce")
+
     # Convenience flags
     out["is_gps_on"] = out["scenario"].astype(str).str.contains(r"\bS4-1\b", regex=True).astype(int)
 
@@ -220,6 +310,17 @@ def _make_model_input(
     return out
 
 
+def _model_input_key(dep_hash: str, report_dir: Path | None, scenario_params: Path) -> str:
+    """Build key of one model input: upstream enrich hash + scenario params + report file stamps."""
+    h = hashlib.sha256(dep_hash.encode("utf-8"))
+    h.update(scenario_params.read_bytes() if scenario_params.exists() else b"<missing>")
+    if report_dir is not None:
+        for p in sorted([*report_dir.glob("*.csv"), *report_dir.glob("*.json")]):
+            st = p.stat()
+            h.update(f"\n{p.name}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+    return h.hexdigest()
+
+
 def main() -> int:
     ap = argparse.ArgumentParser(description="Build model input CSVs by aligning Perfetto power to enriched samples")
     ap.add_argument(
@@ -256,6 +357,15 @@ def main() -> int:
         default=Path("configs/scenario_params.csv"),
         help="Scenario-level experiment parameters (wifi/cellular/gps/screen/etc)",
     )
+    ap.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help=(
+            f"enrich-batch manifest (usually <runs-dir>/{ENRICH_MANIFEST_NAME}). Rebuild only runs whose enrich "
+            "hash, report files or scenario params changed since the last build; skip runs whose enrich failed."
+        ),
+    )
 
     args = ap.parse_args()
 
@@ -267,7 +377,20 @@ def main() -> int:
 
     args.out_dir.mkdir(parents=True, exist_ok=True)
 
+    manifest: dict[str, dict] | None = None
+    index: dict[str, dict] = {}
+    index_path = args.out_dir / MODEL_INPUT_INDEX_NAME
+    if args.manifest is not None:
+        if not args.manifest.exists():
+            raise SystemExit(f"Manifest not found: {args.manifest} (run `python -m mp_power.pipeline_ops enrich-batch`)")
+        manifest = load_enrich_manifest(args.manifest)
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+        except Exception:
+            index = {}
+
     all_rows: list[pd.DataFrame] = []
+    n_reused = 0
     for run_csv in run_csvs:
         # Data curation: S2_b30 (20260201_182508) was confirmed deprecated; use S2_b30_1 instead.
         if "20260201_182508_S2_b30" in run_csv.name:
@@ -275,15 +398,38 @@ def main() -> int:
             continue
 
         report_dir = _find_report_dir(run_csv, args.reports_dir)
-        df = _make_model_input(run_csv, report_dir, args.scenario_default, scenario_params)
+        run_name = run_csv.stem.replace("_enriched", "")
+        out_path = args.out_dir / f"{run_name}_model_input.csv"
+
+        key = ""
+        if manifest is not None:
+            entry = manifest.get(run_name)
+            if entry is not None and entry.get("status") == "error":
+                print(f"Skip (enrich failed): {run_csv.name}: {entry.get('error', '')}")
+                continue
+            if entry is None:
+                print(f"WARN: {run_name} not in manifest; rebuilding")
+            else:
+                key = _model_input_key(str(entry.get("dep_hash", "")), report_dir, args.scenario_params)
+                if out_path.exists() and (index.get(run_name) or {}).get("key") == key:
+                    all_rows.append(pd.read_csv(out_path))
+                    n_reused += 1
+                    continue
 
-        out_path = args.out_dir / f"{run_csv.stem.replace('_enriched', '')}_model_input.csv"
+        df = _make_model_input(run_csv, report_dir, args.scenario_default, scenario_params)
         df.to_csv(out_path, index=False, encoding="utf-8")
         all_rows.append(df)
+        if key:
+            index[run_name] = {"key": key, "model_input_csv": out_path.as_posix()}
 
         tag = "OK" if df["power_total_mW"].notna().any() else "NO_PERFETTO"
         print(f"Wrote: {out_path} ({len(df)} rows) [{tag}]")
 
+    if manifest is not None:
+        index_path.write_text(json.dumps(index, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Reused {n_reused} up-to-date model inputs")
+        print(f"Wrote: {index_path}")
+
     all_df = pd.concat(all_rows, ignore_index=True)
     all_path = args.out_dir / "all_runs_model_input.csv"
     all_df.to_csv(all_path, index=False, encoding="utf-8")
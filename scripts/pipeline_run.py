@@ -1,49 +1,73 @@
 from __future__ import annotations
 
 import argparse
+import csv
 import re
+import statistics
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Callable
 
 from _bootstrap import ensure_repo_root_on_sys_path
 
 ensure_repo_root_on_sys_path()
 
-from mp_power.adb import adb_exec_out
+from mp_power.adb import adb_exec_out_stream
 from mp_power.adb import adb_shell
 from mp_power.adb import pick_default_serial
+from mp_power.adb import pull_file_exec_out
 from mp_power.adb import resolve_adb
 from mp_power.adb import run_adb
 from mp_power.adb import shell_ok
 from mp_power.cpu_load import cpu_load_start as _cpu_load_start_shared
 from mp_power.cpu_load import cpu_load_stop as _cpu_load_stop_shared
+from mp_power.convergence import ConvergenceConfig
+from mp_power.convergence import ConvergenceMonitor
+from mp_power.convergence import describe as describe_convergence
+from mp_power.dashboard import LiveDashboard
+from mp_power.live import LiveEnricher
+from mp_power.live import LiveSummary
+from mp_power.perfetto_capture import SegmentedPerfettoCapture
+from mp_power.perfetto_capture import stitch_segments
+from mp_power.dag import STAGE_CACHE_NAME
+from mp_power.dag import STAGE_TIMINGS_NAME
+from mp_power.dag import Stage
+from mp_power.dag import StageGraph
+from mp_power.dag import StageResult
+from mp_power.dag import write_stage_timings
+from mp_power.pipeline_ops import REPORT_EXTRA_INPUTS
+from mp_power.pipeline_ops import REPORT_OUTPUTS
+from mp_power.pipeline_ops import enrich_inputs_hash
+from mp_power.pipeline_ops import BsMinSnapshot
 from mp_power.pipeline_ops import enrich_run_with_cpu_energy
+from mp_power.pipeline_ops import load_batterystats_min_snapshot_bytes
 from mp_power.pipeline_ops import parse_perfetto_android_power_counters
+from mp_power.pipeline_ops import parse_perfetto_cpu_power
 from mp_power.pipeline_ops import parse_perfetto_policy_markers
+from mp_power.pipeline_ops import parse_perfetto_power_rails
 from mp_power.pipeline_ops import report_run
 from mp_power.pipeline_ops import write_batterystats_min_summary
 from mp_power.pipeline_ops import parse_power_profile_xmltree
 from mp_power.pipeline_ops import write_power_profile_outputs
-
-
-def _run(cmd: list[str], timeout_s: float | None = None) -> tuple[int, str, str]:
-    proc = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        timeout=timeout_s,
-    )
-    return proc.returncode, proc.stdout.decode("utf-8", errors="replace"), proc.stderr.decode("utf-8", errors="replace")
-
-
-def _capture_wrote_path(output: str) -> Path | None:
-    # Accept both Windows backslashes and posix slashes
-    m = re.search(r"^Wrote:\s*(.+?)\s*$", output, re.MULTILINE)
-    if not m:
-        return None
-    return Path(m.group(1).strip())
+from mp_power.policy_map import map_policies_to_clusters
+from mp_power.profiling import active as active_profiler
+from mp_power.profiling import enable as enable_profiler
+from mp_power.profiling import profiled
+from mp_power.profiling import span
+from mp_power.qc import qc_run
+from mp_power.sampler import SampleResult
+from mp_power.sampler import SamplerConfig
+from mp_power.sampler import sample_power
+from mp_power.thermal_gate import ThermalGateConfig
+from mp_power.thermal_gate import parse_bands
+from mp_power.thermal_gate import wait_thermal_steady
+from mp_power.thermal_gate import write_gate_json
 
 
 _RE_BS_GLOBAL = re.compile(r"^\s*Global\s*$", re.MULTILINE)
@@ -80,6 +104,89 @@ def _parse_batterystats_usage_global(text: str) -> dict[str, float]:
     return out
 
 
+def _median_voltage_mv(run_csv: Path) -> float | None:
+    vals: list[float] = []
+    try:
+        with run_csv.open("r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    vals.append(float(row.get("battery_voltage_mv") or ""))
+                except ValueError:
+                    continue
+    except Exception:
+        return None
+    return float(statistics.median(vals)) if vals else None
+
+
+def _pull_perfetto(adb_path: str, serial_used: str | None, *, remote: str, local: Path) -> None:
+    try:
+        pulled = pull_file_exec_out(adb_path, serial_used, remote, local)
+    except Exception as e:
+        raise SystemExit(f"failed to pull perfetto trace via exec-out: {e}")
+    if pulled.size_bytes == 0:
+        raise SystemExit("perfetto trace is empty")
+    resumed = " resumed" if pulled.resumed else ""
+    print(f"Perfetto: pulled trace -> {local} ({pulled.size_bytes} bytes, sha256={pulled.sha256[:12]}{resumed})")
+    # Best-effort cleanup.
+    adb_shell(adb_path, serial_used, ["rm", "-f", remote], timeout_s=10.0)
+
+
+def _perfetto_outputs(args: argparse.Namespace, report_dir: Path) -> tuple[Path, ...]:
+    """Files _parse_perfetto must leave behind (rails/cpu power are best-effort and not required)."""
+    names: list[str] = []
+    if args.perfetto_android_power:
+        names += ["perfetto_android_power_summary.csv", "perfetto_android_power_timeseries.csv"]
+    if args.perfetto_policy_trace:
+        names += ["perfetto_policy_markers.csv"]
+    return tuple(report_dir / n for n in names)
+
+
+def _parse_perfetto(args: argparse.Namespace, local: Path, *, report_dir: Path, label: str, run_csv: Path) -> None:
+    if args.perfetto_android_power:
+        try:
+            parse_perfetto_android_power_counters(
+                local,
+                out_dir=report_dir,
+                label=label,
+                no_timeseries=False,
+            )
+        except Exception as e:
+            raise SystemExit(f"parse_perfetto_android_power_counters failed: {e}")
+        print("Perfetto: parsed android.power -> perfetto_android_power_summary.csv + timeseries.csv")
+
+    if args.perfetto_power_rails:
+        try:
+            rails_summary = parse_perfetto_power_rails(local, out_dir=report_dir)
+            print(
+                "Perfetto: parsed power rails -> perfetto_power_rails_summary.csv + timeseries.csv "
+                f"(rails={rails_summary.n_rails})"
+            )
+        except Exception as e:
+            print(f"WARN: parse_perfetto_power_rails failed (ODPM unsupported?): {e}")
+
+    if args.perfetto_policy_trace:
+        try:
+            parse_perfetto_policy_markers(local, out_dir=report_dir)
+        except Exception as e:
+            raise SystemExit(f"parse_perfetto_policy_markers failed: {e}")
+
+        # Exact CPU power from cpu_frequency/cpu_idle; time_in_state enrichment stays as the fallback.
+        try:
+            cpu_summary = parse_perfetto_cpu_power(
+                local,
+                out_dir=report_dir,
+                map_json=args.map_json,
+                clusters_dir=args.profile_out_dir,
+                voltage_mv=_median_voltage_mv(run_csv),
+            )
+            print(
+                "Perfetto: parsed cpu_frequency/cpu_idle -> perfetto_cpu_power_timeseries.csv "
+                f"(coverage={cpu_summary.coverage:.2f})"
+            )
+        except Exception as e:
+            print(f"WARN: parse_perfetto_cpu_power failed; keeping time_in_state CPU energy: {e}")
+
+
 def _ensure_write_settings(adb: str, serial: str | None) -> None:
     # Best-effort: some OEM builds require this for `settings put system ...`.
     shell_ok(adb, serial, ["appops", "set", "com.android.shell", "WRITE_SETTINGS", "allow"], timeout_s=8.0)
@@ -117,9 +224,27 @@ def _cpu_load_stop(adb: str, serial: str | None) -> None:
     _cpu_load_stop_shared(adb, serial)
 
 
-def main() -> int:
+# Post-sampling stages that talk to the device; everything else in run_post is host-only.
+DEVICE_STAGES = ("perfetto_pull", "batterystats_usage")
+
+
+@dataclass
+class SampledRun:
+    run_csv: Path
+    run_id: str
+    live_summary: LiveSummary | None = None
+    perfetto_pull: tuple[str, Path] | None = None  # (remote, local) for the single-capture trace
+    adb_path: str | None = None
+    serial: str | None = None
+    sample_s: float | None = None  # None with --skip-sample
+    batterystats_parsed: bool = False  # proto summary already written while the END dump streamed
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Fixed pipeline: sample -> enrich -> report")
-    parser.add_argument("--python", default=None, help="Python executable (default: current interpreter)")
+    parser.add_argument(
+        "--python", default=None, help="Ignored: sampling, policy mapping and QC now run in-process (kept for old command lines)"
+    )
     parser.add_argument("--adb", default=None, help="adb path (optional)")
     parser.add_argument("--serial", default=None, help="Device serial (optional)")
     parser.add_argument("--scenario", default="S1", help="Scenario label")
@@ -273,6 +398,40 @@ def main() -> int:
         default=250,
         help="Perfetto android.power battery polling period (ms).",
     )
+    parser.add_argument(
+        "--perfetto-power-rails",
+        action="store_true",
+        help=(
+            "Opt-in: also collect ODPM power rails (android.power collect_power_rails) and write per-rail "
+            "energy/power (perfetto_power_rails_summary.csv + timeseries.csv). Requires device support."
+        ),
+    )
+    parser.add_argument(
+        "--perfetto-long-capture",
+        action="store_true",
+        help=(
+            "Long-run mode for soak tests: record Perfetto as back-to-back segments (write_into_file), pull and parse "
+            "each segment in the background during the run, then stitch the outputs. Avoids ring-buffer overwrite "
+            "and bounds parser memory / end-of-run latency."
+        ),
+    )
+    parser.add_argument(
+        "--perfetto-segment-s",
+        type=float,
+        default=900.0,
+        help="Segment length (seconds) for --perfetto-long-capture.",
+    )
+    parser.add_argument(
+        "--perfetto-file-write-period-ms",
+        type=int,
+        default=2500,
+        help="Perfetto file_write_period_ms for --perfetto-long-capture (buffer drain period).",
+    )
+    parser.add_argument(
+        "--perfetto-drop-segment-traces",
+        action="store_true",
+        help="With --perfetto-long-capture, delete each local segment trace after it has been parsed.",
+    )
     parser.add_argument(
         "--perfetto-policy-trace",
         action="store_true",
@@ -289,6 +448,79 @@ def main() -> int:
     )
     parser.add_argument("--auto-reset-battery", action="store_true")
     parser.add_argument("--log-every", type=float, default=60.0, help="Sampler progress log period seconds")
+    parser.add_argument(
+        "--live-enrich",
+        action="store_true",
+        help=(
+            "Enrich the run CSV while the sampler writes it (tails new rows; keeps *_enriched.csv and "
+            "<report>/live_summary.json current). Post-run enrich collapses to draining the last rows."
+        ),
+    )
+    parser.add_argument("--live-enrich-poll-s", type=float, default=2.0, help="Poll period for --live-enrich")
+    parser.add_argument(
+        "--dashboard",
+        action="store_true",
+        help=(
+            "Keep <report>/live_dashboard.html current while sampling (rolling discharge/CPU power, thermal, "
+            "brightness, adb error rate). For a terminal view run scripts/live_dashboard.py --run-csv <run.csv>."
+        ),
+    )
+    parser.add_argument(
+        "--wait-thermal-steady",
+        action="store_true",
+        help=(
+            "Before sampling, poll thermalservice until the drift predicted over --duration by an exponential "
+            "settling fit is below --thermal-steady-drift-c (or every --thermal-steady-band sensor is in band) "
+            "and thermal status is 0. Writes <report>/thermal_gate.json."
+        ),
+    )
+    parser.add_argument(
+        "--thermal-steady-sensors", default="CPU,BATTERY", help="thermalservice sensor names used by the drift fit"
+    )
+    parser.add_argument(
+        "--thermal-steady-drift-c", type=float, default=1.0, help="Max predicted drift over the run (degC)"
+    )
+    parser.add_argument(
+        "--thermal-steady-band",
+        default="",
+        help="Alternative start condition: every sensor within its band, e.g. CPU=30:40,BATTERY=28:34",
+    )
+    parser.add_argument("--thermal-steady-poll-s", type=float, default=10.0, help="thermalservice poll period")
+    parser.add_argument("--thermal-steady-window-s", type=float, default=180.0, help="Fit window (most recent polls)")
+    parser.add_argument(
+        "--thermal-steady-timeout-s",
+        type=float,
+        default=1800.0,
+        help="Give up waiting after this long and start the run anyway (with a WARN)",
+    )
+    parser.add_argument(
+        "--stop-when-converged",
+        action="store_true",
+        help=(
+            "Adaptive run length: stop sampling once the batch-means CI of mean discharge power (charge counter) "
+            "is narrower than --converge-rel / --converge-abs-mw, after --converge-min-s; noisy runs continue up to "
+            "--converge-max-s. Writes <report>/convergence.json."
+        ),
+    )
+    parser.add_argument("--converge-min-s", type=float, default=120.0, help="Minimum run length with --stop-when-converged")
+    parser.add_argument(
+        "--converge-max-s",
+        type=float,
+        default=None,
+        help="Maximum run length with --stop-when-converged (default: 2x --duration)",
+    )
+    parser.add_argument(
+        "--converge-rel", type=float, default=0.01, help="CI half-width target relative to the mean (0 disables)"
+    )
+    parser.add_argument("--converge-abs-mw", type=float, default=5.0, help="CI half-width target in mW (0 disables)")
+    parser.add_argument(
+        "--converge-skip-s", type=float, default=0.0, help="Warm-up seconds left out of the convergence estimate"
+    )
+    parser.add_argument(
+        "--estimators",
+        default="",
+        help="Component power estimators added during enrich ('all' or e.g. wifi,gps,cellular); see pipeline_ops",
+    )
     parser.add_argument(
         "--xmltree",
         type=Path,
@@ -307,78 +539,135 @@ def main() -> int:
         default=Path("artifacts/android/power_profile/policy_cluster_map.json"),
         help="policy->cluster mapping json",
     )
+    parser.add_argument(
+        "--run-id",
+        default=None,
+        help="Run id used in artifact names and the CSV run_id column (default: local time YYYYmmdd_HHMMSS)",
+    )
     parser.add_argument("--skip-sample", action="store_true", help="Skip sampling and only enrich/report")
     parser.add_argument("--run-csv", type=Path, default=None, help="Existing run CSV when --skip-sample")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--stage-jobs", type=int, default=4, help="Worker threads for the post-sampling stage graph (default: 4)"
+    )
+    parser.add_argument(
+        "--force-stages", action="store_true", help="Re-run cached stages (power_profile, enrich, parses, report)"
+    )
+    parser.add_argument("--no-stage-cache", action="store_true", help="Neither read nor write stage_cache.json")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall/CPU time and peak RSS per stage and sub-stage into stage_timings.json (\"profile\")",
+    )
+    parser.add_argument(
+        "--profile-tracemalloc",
+        action="store_true",
+        help="With --profile: also trace Python allocations (net MiB per span, top allocation sites; slows the run)",
+    )
+    return parser
 
-    if args.screen_sleep_before and args.screen_wake_before:
-        raise SystemExit("--screen-sleep-before and --screen-wake-before are mutually exclusive")
 
-    if args.set_brightness is not None and not (0 <= int(args.set_brightness) <= 255):
-        raise SystemExit("--set-brightness must be in [0, 255]")
-    if args.set_timeout_ms is not None and int(args.set_timeout_ms) <= 0:
-        raise SystemExit("--set-timeout-ms must be positive")
+def sample_duration_s(args: argparse.Namespace) -> float:
+    """Longest the sampler (and the Perfetto capture) may run: --duration, or the convergence cap."""
+    if not args.stop_when_converged:
+        return float(args.duration)
+    if args.converge_max_s is not None:
+        return float(args.converge_max_s)
+    return 2.0 * float(args.duration)
 
-    py = args.python
-    if py is None:
-        import sys
 
-        py = sys.executable
+def _perfetto_stop_early(adb_path: str, serial: str | None, remote_out: str) -> None:
+    # perfetto finalizes the trace on SIGINT; match our session by its output path.
+    rc, out, err = adb_shell(adb_path, serial, ["pkill", "-INT", "-f", remote_out], timeout_s=10.0)
+    if rc != 0:
+        print(f"WARN: could not stop perfetto early (trace runs to its full duration): {err or out}")
+
+
+def start_profiling(args: argparse.Namespace) -> None:
+    """Install a fresh profiler for this run when --profile (or --profile-tracemalloc) is given."""
+    if args.profile or args.profile_tracemalloc:
+        enable_profiler(trace_malloc=bool(args.profile_tracemalloc))
+
+
+def _batterystats_proto_outputs(report_dir: Path) -> tuple[Path, Path]:
+    return report_dir / "batterystats_proto_min_summary.json", report_dir / "batterystats_proto_min_summary.csv"
 
-    # Debug utility: smoke-test CPU load start/stop without running a full sampling window.
-    if args.cpu_load_smoke:
-        adb_path = resolve_adb(args.adb)
-        serial_used = args.serial
-        if not serial_used:
-            serial_used = pick_default_serial(adb_path, timeout_s=8.0)
-        if not serial_used:
-            raise SystemExit("No adb devices found. Provide --serial or connect a device.")
-        if not args.cpu_load_threads or int(args.cpu_load_threads) <= 0:
-            raise SystemExit("--cpu-load-smoke requires --cpu-load-threads > 0")
-        print(f"CPU load smoke: serial={serial_used} threads={int(args.cpu_load_threads)}")
-        _cpu_load_start(adb_path, serial_used, int(args.cpu_load_threads))
-        _cpu_load_stop(adb_path, serial_used)
-        print("CPU load smoke: OK")
-        return 0
 
-    # 1) Ensure power_profile parsed (and includes optional items_ma for screen estimate)
+@profiled("batterystats_capture")
+def _capture_batterystats_proto(adb_path: str, serial: str | None, out_pb: Path) -> bytes:
+    """Stream `dumpsys batterystats --proto` into out_pb and return the same bytes for the parser."""
+    buf = bytearray()
+    with out_pb.open("wb") as f:
+        rc, _, err = adb_exec_out_stream(
+            adb_path, serial, ["dumpsys", "batterystats", "--proto"], f, timeout_s=30.0, on_chunk=buf.extend
+        )
+    if rc != 0:
+        raise RuntimeError(err)
+    return bytes(buf)
+
+
+@profiled("setup")
+def run_setup(args: argparse.Namespace) -> tuple[Path, list[StageResult]]:
+    """Power profile + policy map; returns (power_profile.json, stage results)."""
+    # 1) Parse power_profile (content-hash cached) and 2) map policies once per device (needs adb).
     pp_json = args.profile_out_dir / "power_profile.json"
-    need_parse = not pp_json.exists()
-    if not need_parse:
-        try:
-            txt = pp_json.read_text(encoding="utf-8", errors="replace")
-            if '"items_ma"' not in txt:
-                need_parse = True
-        except Exception:
-            need_parse = True
 
-    if need_parse:
+    def _stage_power_profile() -> None:
+        if not args.xmltree.exists() and pp_json.exists() and '"items_ma"' in pp_json.read_text(encoding="utf-8"):
+            print(f"WARN: {args.xmltree} missing; keeping existing {pp_json}")
+            return
         try:
             profile = parse_power_profile_xmltree(args.xmltree)
             write_power_profile_outputs(profile, args.profile_out_dir)
         except Exception as e:
             raise SystemExit(f"parse_power_profile_overlay failed: {e}")
 
-    # 2) Ensure policy mapping
+    def _stage_policy_map() -> None:
+        # Like the CLI: without --adb, hope adb is on PATH.
+        try:
+            pm = map_policies_to_clusters(args.adb or "adb", args.serial, profile_json=pp_json, out=args.map_json)
+        except Exception as e:
+            raise SystemExit(f"map_policy_to_cluster failed: {e}")
+        print(f"Policy map: {pm.mapping} -> {pm.out_json}")
+
+    setup = StageGraph(
+        cache_path=None if args.no_stage_cache else args.profile_out_dir / STAGE_CACHE_NAME,
+        jobs=int(args.stage_jobs),
+        force=bool(args.force_stages),
+    )
+    setup.add(
+        Stage(
+            "power_profile",
+            _stage_power_profile,
+            inputs=(args.xmltree,),
+            outputs=(pp_json,),
+            params={"parser": "xmltree-v1"},
+        )
+    )
     if not args.map_json.exists():
-        # map_policy_to_cluster expects an adb path; if not provided, hope it's on PATH.
-        map_cmd = [py, "policy/map_policy_to_cluster.py"]
-        if args.adb:
-            map_cmd += ["--adb", args.adb]
-        if args.serial:
-            map_cmd += ["--serial", args.serial]
-        rc, out, err = _run(map_cmd)
-        if rc != 0:
-            raise SystemExit(f"map_policy_to_cluster failed: {err or out}")
-
-    # 3) Sample
+        # Device-bound and kept until deleted, as before: verify once per device/ROM.
+        setup.add(Stage("policy_map", _stage_policy_map, deps=("power_profile",), outputs=(args.map_json,), cache=False))
+    setup.run()
+    return pp_json, list(setup.results.values())
+
+
+@profiled("sample")
+def run_sample(args: argparse.Namespace) -> SampledRun:
+    """Device-bound part of a run: settings, CPU load, Perfetto/batterystats capture and sampling."""
+    adb_path: str | None = None
+    serial_used: str | None = args.serial
+    run_id = ""
+    batterystats_parsed = False
+    # 3) Sample (device-bound; runs here rather than as a graph stage because of the cleanup below)
     run_csv: Path
+    live_summary: LiveSummary | None = None
+    perfetto_pull: tuple[str, Path] | None = None  # (remote, local) for the single-capture trace
     if args.skip_sample:
         if args.run_csv is None:
             raise SystemExit("--skip-sample requires --run-csv")
         run_csv = args.run_csv
     else:
-        run_id = datetime.now().astimezone().strftime("%Y%m%d_%H%M%S")
+        t_sample = time.perf_counter()
+        run_id = args.run_id or datetime.now().astimezone().strftime("%Y%m%d_%H%M%S")
         run_csv = Path("artifacts") / "runs" / f"{run_id}_{args.scenario}.csv"
         run_csv.parent.mkdir(parents=True, exist_ok=True)
 
@@ -406,15 +695,40 @@ def main() -> int:
                 _screen_sleep(adb_path, serial_used)
             except Exception:
                 pass
+
+        # Optional: wait for a thermally steady start (before any capture starts its window).
+        if args.wait_thermal_steady:
+            gate_cfg = ThermalGateConfig(
+                names=tuple(n.strip().upper() for n in str(args.thermal_steady_sensors).split(",") if n.strip()),
+                horizon_s=float(args.duration),
+                max_drift_c=float(args.thermal_steady_drift_c),
+                bands=parse_bands(args.thermal_steady_band),
+                poll_s=float(args.thermal_steady_poll_s),
+                window_s=float(args.thermal_steady_window_s),
+                timeout_s=float(args.thermal_steady_timeout_s),
+            )
+            with span("thermal_gate"):
+                gate = wait_thermal_steady(adb_path, serial_used, gate_cfg)
+            write_gate_json(gate, gate_cfg, report_dir / "thermal_gate.json")
+            temps = " ".join(f"{n}={v:.1f}C" for n, v in gate.temps_c.items() if v is not None)
+            if gate.steady:
+                print(f"Thermal gate: steady ({gate.reason}) after {gate.waited_s:.0f}s, {gate.polls} polls: {temps}")
+            elif gate.reason == "no-sensors":
+                print(f"WARN: thermal gate found none of {args.thermal_steady_sensors} in thermalservice; not waiting")
+            else:
+                print(f"WARN: thermal gate timed out after {gate.waited_s:.0f}s; starting anyway: {temps}")
         perfetto_proc: subprocess.Popen[bytes] | None = None
         perfetto_remote_cfg: str | None = None
         perfetto_remote_out: str | None = None
         perfetto_local_trace: Path | None = None
+        perfetto_capture: SegmentedPerfettoCapture | None = None
 
-        want_perfetto = bool(args.perfetto_android_power or args.perfetto_policy_trace)
+        want_perfetto = bool(args.perfetto_android_power or args.perfetto_policy_trace or args.perfetto_power_rails)
         if want_perfetto:
             if args.perfetto_android_power:
                 print(f"Perfetto android.power: enabled (battery_poll_ms={int(args.perfetto_battery_poll_ms)})")
+            if args.perfetto_power_rails:
+                print("Perfetto power rails: enabled (android.power collect_power_rails)")
             if args.perfetto_policy_trace:
                 print("Perfetto policy trace: enabled (linux.ftrace + atrace)")
 
@@ -423,27 +737,31 @@ def main() -> int:
                 # However, perfetto tracing is critical enough that we require explicit serial if multiple devices.
                 pass
 
-            duration_ms = int(round(float(args.duration) * 1000.0))
+            duration_ms = int(round(sample_duration_s(args) * 1000.0))
             poll_ms = int(args.perfetto_battery_poll_ms)
-            if args.perfetto_android_power and poll_ms <= 0:
+            if (args.perfetto_android_power or args.perfetto_power_rails) and poll_ms <= 0:
                 raise SystemExit("--perfetto-battery-poll-ms must be > 0")
+            if args.perfetto_long_capture and float(args.perfetto_segment_s) <= 0:
+                raise SystemExit("--perfetto-segment-s must be > 0")
 
             # Write pbtxt locally for audit/repro, but DO NOT push to device.
             # Some devices enforce SELinux rules that prevent the perfetto process from opening
             # config files under /data/local/tmp (errno=13). Feeding config via stdin avoids this.
+            # cfg_lines holds the data sources only; the session header depends on the capture mode.
             cfg_lines: list[str] = []
-            cfg_lines.append(f"duration_ms: {duration_ms}")
-            # Slightly larger buffer helps when enabling ftrace.
-            cfg_lines.append("buffers: {\n  size_kb: 8192\n  fill_policy: RING_BUFFER\n}")
 
-            if args.perfetto_android_power:
+            if args.perfetto_android_power or args.perfetto_power_rails:
                 cfg_lines.append("data_sources: {\n  config {\n    name: \"android.power\"\n    android_power_config {")
                 cfg_lines.append(f"      battery_poll_ms: {poll_ms}")
-                # NOTE: Field name is 'battery_counters' (not 'counters') in AndroidPowerConfig.
-                cfg_lines.append("      battery_counters: BATTERY_COUNTER_CAPACITY_PERCENT")
-                cfg_lines.append("      battery_counters: BATTERY_COUNTER_CHARGE")
-                cfg_lines.append("      battery_counters: BATTERY_COUNTER_CURRENT")
-                cfg_lines.append("      battery_counters: BATTERY_COUNTER_VOLTAGE")
+                if args.perfetto_android_power:
+                    # NOTE: Field name is 'battery_counters' (not 'counters') in AndroidPowerConfig.
+                    cfg_lines.append("      battery_counters: BATTERY_COUNTER_CAPACITY_PERCENT")
+                    cfg_lines.append("      battery_counters: BATTERY_COUNTER_CHARGE")
+                    cfg_lines.append("      battery_counters: BATTERY_COUNTER_CURRENT")
+                    cfg_lines.append("      battery_counters: BATTERY_COUNTER_VOLTAGE")
+                if args.perfetto_power_rails:
+                    # ODPM rails are polled at battery_poll_ms; devices without ODPM simply emit no rail tracks.
+                    cfg_lines.append("      collect_power_rails: true")
                 cfg_lines.append("    }\n  }\n}")
 
             if args.perfetto_policy_trace:
@@ -464,14 +782,48 @@ def main() -> int:
                 cfg_lines.append('      atrace_apps: "*"')
                 cfg_lines.append("    }\n  }\n}")
 
-            cfg_text = "\n".join(cfg_lines) + "\n"
-
-            local_cfg = report_dir / "perfetto_trace.pbtxt"
-            local_cfg.write_text(cfg_text, encoding="utf-8")
+            ds_text = "\n".join(cfg_lines) + "\n"
+            # Slightly larger buffer helps when enabling ftrace.
+            cfg_text = f"duration_ms: {duration_ms}\n" + "buffers: {\n  size_kb: 8192\n  fill_policy: RING_BUFFER\n}\n" + ds_text
 
             perfetto_remote_cfg = None
             perfetto_remote_out = f"/data/misc/perfetto-traces/mp_power_trace_{run_id}_{args.scenario}.pftrace"
 
+        if want_perfetto and args.perfetto_long_capture:
+            seg_parsers: dict[str, Callable[[Path, Path], object]] = {}
+            if args.perfetto_android_power:
+                seg_parsers["android_power"] = lambda tr, od: parse_perfetto_android_power_counters(tr, out_dir=od)
+            if args.perfetto_power_rails:
+                seg_parsers["power_rails"] = lambda tr, od: parse_perfetto_power_rails(tr, out_dir=od)
+            if args.perfetto_policy_trace:
+                seg_parsers["policy_markers"] = lambda tr, od: parse_perfetto_policy_markers(tr, out_dir=od)
+                # Without android.power the segment has no batt.voltage_uv: fall back to the median voltage of
+                # the run CSV rows sampled so far (read when the segment is parsed).
+                seg_parsers["cpu_power"] = lambda tr, od: parse_perfetto_cpu_power(
+                    tr,
+                    out_dir=od,
+                    map_json=args.map_json,
+                    clusters_dir=args.profile_out_dir,
+                    voltage_mv=_median_voltage_mv(run_csv),
+                )
+            perfetto_capture = SegmentedPerfettoCapture(
+                adb_path,
+                serial_used,
+                ds_text=ds_text,
+                total_s=sample_duration_s(args),
+                segment_s=float(args.perfetto_segment_s),
+                remote_prefix=f"/data/misc/perfetto-traces/mp_power_trace_{run_id}_{args.scenario}",
+                local_dir=report_dir / "perfetto_segments",
+                parsers=seg_parsers,
+                file_write_period_ms=int(args.perfetto_file_write_period_ms),
+                keep_traces=not args.perfetto_drop_segment_traces,
+            )
+            perfetto_capture.start()
+            print(f"Perfetto: long capture started (segment_s={float(args.perfetto_segment_s):.0f})")
+        elif want_perfetto:
+            local_cfg = report_dir / "perfetto_trace.pbtxt"
+            local_cfg.write_text(cfg_text, encoding="utf-8")
+
             # Start perfetto in parallel.
             perfetto_cmd = [adb_path]
             if serial_used:
@@ -498,8 +850,11 @@ def main() -> int:
             print(f"Perfetto: started (remote_out={perfetto_remote_out})")
 
         # Optional: batterystats proto capture (schema-min). This is a binary blob: use exec-out.
-        bs_start_pb: Path | None = None
-        bs_end_pb: Path | None = None
+        # START is parsed on a worker thread while sampling runs; END (below) is streamed to disk and
+        # parsed from the tee'd bytes as soon as the sampler stops, overlapping the rest of the teardown.
+        bs_pool: ThreadPoolExecutor | None = None
+        bs_start_snap: Future[BsMinSnapshot] | None = None
+        bs_end_fut: Future[bool] | None = None
         if args.batterystats_proto:
             if args.batterystats_proto_reset:
                 rc, out, err = adb_shell(adb_path, serial_used, ["dumpsys", "batterystats", "--reset"], timeout_s=20.0)
@@ -507,10 +862,33 @@ def main() -> int:
                     raise SystemExit(f"batterystats --reset failed: {err or out}")
 
             bs_start_pb = report_dir / "batterystats_start.pb"
-            rc, blob, err = adb_exec_out(adb_path, serial_used, ["dumpsys", "batterystats", "--proto"], timeout_s=30.0)
-            if rc != 0:
-                raise SystemExit(f"batterystats --proto (start) failed: {err}")
-            bs_start_pb.write_bytes(blob)
+            bs_end_pb = report_dir / "batterystats_end.pb"
+            try:
+                blob = _capture_batterystats_proto(adb_path, serial_used, bs_start_pb)
+            except Exception as e:
+                raise SystemExit(f"batterystats --proto (start) failed: {e}")
+            bs_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="batterystats")
+            bs_start_snap = bs_pool.submit(load_batterystats_min_snapshot_bytes, blob)
+
+            @profiled("batterystats_end")
+            def _batterystats_end() -> bool:
+                end_blob = _capture_batterystats_proto(adb_path, serial_used, bs_end_pb)
+                bs_json, bs_csv = _batterystats_proto_outputs(report_dir)
+                try:
+                    write_batterystats_min_summary(
+                        start_pb=bs_start_pb,
+                        end_pb=bs_end_pb,
+                        out_json=bs_json,
+                        out_csv=bs_csv,
+                        label=args.scenario,
+                        start=bs_start_snap.result(),
+                        end=load_batterystats_min_snapshot_bytes(end_blob),
+                    )
+                except Exception as e:
+                    print(f"WARN: batterystats proto parse during capture failed; retrying after the run. Details: {e}")
+                    return False
+                print(f"Wrote: {bs_json}")
+                return True
 
         # Optional: reset batterystats so the subsequent --usage dump represents only this run window.
         if args.batterystats_usage:
@@ -553,6 +931,8 @@ def main() -> int:
                 )
 
         cpu_load_started = False
+        live: LiveEnricher | None = None
+        dashboard: LiveDashboard | None = None
         try:
             if args.cpu_load_threads and int(args.cpu_load_threads) > 0:
                 try:
@@ -569,56 +949,156 @@ def main() -> int:
                     else:
                         raise
 
-            sample_cmd = [
-                py,
-                "scripts/adb_sample_power.py",
-                "--scenario",
-                args.scenario,
-                "--duration",
-                str(args.duration),
-                "--interval",
-                str(args.interval),
-                "--out",
-                str(run_csv),
-                "--log-every",
-                str(args.log_every),
-            ]
-            if args.adb:
-                sample_cmd += ["--adb", args.adb]
-            # Always pass a serial when multiple devices may exist.
-            if serial_used:
-                sample_cmd += ["--serial", serial_used]
-            if args.thermal:
-                sample_cmd += ["--thermal"]
-            if args.display:
-                sample_cmd += ["--display"]
-            if args.batteryproperties:
-                sample_cmd += ["--batteryproperties"]
-            if args.policy_knobs:
-                sample_cmd += ["--policy-knobs"]
-                if args.policy_knobs_period_s and float(args.policy_knobs_period_s) > 0:
-                    sample_cmd += ["--policy-knobs-period-s", str(args.policy_knobs_period_s)]
-
-            if str(getattr(args, "policy_services", "")).strip():
-                sample_cmd += ["--policy-services", str(args.policy_services)]
-                if args.policy_services_period_s and float(args.policy_services_period_s) > 0:
-                    sample_cmd += ["--policy-services-period-s", str(args.policy_services_period_s)]
-            if args.auto_reset_battery:
-                sample_cmd += ["--auto-reset-battery"]
-
-            # Passthrough stdout/stderr so long runs keep producing output (avoids appearing idle).
-            rc = subprocess.run(sample_cmd).returncode
-            if rc != 0:
-                raise SystemExit(f"adb_sample_power failed with code {rc}")
+            sample_cfg = SamplerConfig(
+                run_id=run_id,
+                adb=args.adb,
+                # Always pass a serial when multiple devices may exist.
+                serial=serial_used,
+                interval=float(args.interval),
+                duration=sample_duration_s(args),
+                out=run_csv,
+                scenario=args.scenario,
+                auto_reset_battery=bool(args.auto_reset_battery),
+                thermal=bool(args.thermal),
+                display=bool(args.display),
+                batteryproperties=bool(args.batteryproperties),
+                log_every=float(args.log_every),
+                policy_knobs=bool(args.policy_knobs),
+                policy_services=str(getattr(args, "policy_services", "")).strip(),
+            )
+            if args.policy_knobs_period_s and float(args.policy_knobs_period_s) > 0:
+                sample_cfg.policy_knobs_period_s = float(args.policy_knobs_period_s)
+            if args.policy_services_period_s and float(args.policy_services_period_s) > 0:
+                sample_cfg.policy_services_period_s = float(args.policy_services_period_s)
+
+            if args.live_enrich:
+                live = LiveEnricher(
+                    run_csv,
+                    run_csv.with_name(run_csv.stem + "_enriched.csv"),
+                    map_json=args.map_json,
+                    clusters_dir=args.profile_out_dir,
+                    profile_json=args.profile_out_dir / "power_profile.json",
+                    estimators=args.estimators,
+                    summary_json=report_dir / "live_summary.json",
+                    poll_s=float(args.live_enrich_poll_s),
+                    log_every_s=float(args.log_every or 0.0),
+                )
+                live.start()
+
+            if args.dashboard:
+                dashboard = LiveDashboard(
+                    run_csv,
+                    enriched_csv=run_csv.with_name(run_csv.stem + "_enriched.csv") if args.live_enrich else None,
+                    perfetto_dir=(report_dir / "perfetto_segments") if perfetto_capture is not None else None,
+                    html_out=report_dir / "live_dashboard.html",
+                    refresh_s=float(args.live_enrich_poll_s),
+                )
+                dashboard.start()
+                print(f"Dashboard: {report_dir / 'live_dashboard.html'} (terminal: python scripts/live_dashboard.py --run-csv {run_csv})")
+
+            # The sampler runs on a worker thread of this process (no interpreter/pandas start-up); the stop
+            # event lets Ctrl+C end it at the next interval so the finally block below can clean up.
+            sample_stop = threading.Event()
+            sample_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sampler")
+            sample_future: Future[SampleResult] = sample_pool.submit(sample_power, sample_cfg, stop=sample_stop)
+            sample_pool.shutdown(wait=False)
+            converge: ConvergenceMonitor | None = None
+            if args.stop_when_converged:
+                converge = ConvergenceMonitor(
+                    run_csv,
+                    ConvergenceConfig(
+                        min_s=float(args.converge_min_s),
+                        rel=float(args.converge_rel),
+                        abs_mw=float(args.converge_abs_mw),
+                        skip_s=float(args.converge_skip_s),
+                    ),
+                )
+                print(
+                    f"Convergence: stop after >= {float(args.converge_min_s):.0f}s once the CI is within target "
+                    f"(max {sample_duration_s(args):.0f}s)"
+                )
+            try:
+                # Poll so Ctrl+C is delivered promptly on every platform.
+                next_check = time.monotonic() + float(args.interval)
+                next_log = time.monotonic() + float(args.log_every or 0.0)
+                while not sample_future.done():
+                    wait([sample_future], timeout=0.5)
+                    if converge is None or sample_stop.is_set() or time.monotonic() < next_check:
+                        continue
+                    next_check = time.monotonic() + float(args.interval)
+                    try:
+                        with span("convergence_poll"):
+                            st = converge.poll()
+                    except Exception as e:
+                        print(f"WARN: convergence check failed; running to the maximum duration. Details: {e}")
+                        converge = None
+                        continue
+                    if st.converged:
+                        print(f"Convergence: reached at {describe_convergence(st)}; stopping the sampler")
+                        sample_stop.set()
+                    elif args.log_every and time.monotonic() >= next_log:
+                        next_log = time.monotonic() + float(args.log_every)
+                        print(f"Convergence: {describe_convergence(st)}")
+            except KeyboardInterrupt:
+                sample_stop.set()
+                wait([sample_future])
+                raise
+            try:
+                sample_res = sample_future.result()
+            except Exception as e:
+                raise SystemExit(f"adb_sample_power failed: {e}")
+            print(f"Sampled: {sample_res.rows} rows ({sample_res.adb_error_rows} with adb_error) -> {sample_res.out_csv}")
+            if bs_pool is not None:
+                # END proto right at the end of the sampling window; the teardown below runs meanwhile.
+                bs_end_fut = bs_pool.submit(_batterystats_end)
+            if converge is not None:
+                st = converge.poll(final=True)
+                converge.write(report_dir / "convergence.json")
+                if not st.converged:
+                    print(f"Convergence: not reached within {sample_duration_s(args):.0f}s: {describe_convergence(st)}")
+                if sample_stop.is_set() and perfetto_proc is not None and perfetto_remote_out is not None:
+                    _perfetto_stop_early(adb_path, serial_used, perfetto_remote_out)
+                if sample_stop.is_set() and perfetto_capture is not None:
+                    # Cut the current long-capture segment short too; join() would otherwise wait it out.
+                    perfetto_capture.stop(early=True)
+
+            if live is not None:
+                try:
+                    with span("live_finish"):
+                        live_summary = live.finish()
+                except Exception as e:
+                    print(f"WARN: live enrichment failed; falling back to post-run enrich. Details: {e}")
+                live = None
+            if dashboard is not None:
+                dashboard.stop()
+                dashboard = None
+
+            # Long capture: segments were pulled/parsed during the run; wait for the tail and stitch.
+            if perfetto_capture is not None:
+                perfetto_capture.stop()
+                try:
+                    with span("perfetto_join"):
+                        seg_results = perfetto_capture.join(timeout_s=float(args.perfetto_segment_s) + 120.0)
+                except Exception as e:
+                    raise SystemExit(f"perfetto long capture failed: {e}")
+                for r in seg_results:
+                    for err in r.errors:
+                        print(f"WARN: perfetto segment {r.index:03d}: {err}")
+                with span("perfetto_stitch"):
+                    stitched = stitch_segments(seg_results, report_dir, label=f"{run_id}_{args.scenario}")
+                print(f"Perfetto: stitched {len(seg_results)} segments -> {', '.join(stitched) or 'nothing'}")
+                if args.perfetto_android_power and "android_power" not in stitched:
+                    raise SystemExit("perfetto long capture produced no android.power battery counters")
 
             # Wait for perfetto to finish and pull + parse trace.
-            if want_perfetto:
+            elif want_perfetto:
                 if perfetto_proc is None or perfetto_remote_out is None:
                     raise SystemExit("perfetto process was not started")
 
                 try:
                     # Give perfetto a small grace period after sampling ends.
-                    stdout_b, stderr_b = perfetto_proc.communicate(timeout=float(args.duration) + 30.0)
+                    with span("perfetto_wait"):
+                        stdout_b, stderr_b = perfetto_proc.communicate(timeout=sample_duration_s(args) + 30.0)
                 except subprocess.TimeoutExpired:
                     perfetto_proc.kill()
                     raise SystemExit("perfetto did not finish in time")
@@ -628,50 +1108,32 @@ def main() -> int:
                     stderr = stderr_b.decode("utf-8", errors="replace") if stderr_b else ""
                     raise SystemExit(f"perfetto failed (exit={perfetto_proc.returncode}): {stderr or stdout}")
 
+                # The pull (streamed, resumable) and parse are graph stages below, overlapping enrich and
+                # the batterystats proto summary; the report waits for them.
                 perfetto_local_trace = report_dir / "perfetto_trace.pftrace"
-                rc, blob, err = adb_exec_out(adb_path, serial_used, ["cat", perfetto_remote_out], timeout_s=30.0)
-                if rc != 0:
-                    raise SystemExit(f"failed to pull perfetto trace via exec-out: {err}")
-                perfetto_local_trace.write_bytes(blob)
-                if perfetto_local_trace.stat().st_size == 0:
-                    raise SystemExit("perfetto trace is empty")
-                print(f"Perfetto: pulled trace -> {perfetto_local_trace}")
-
-                if args.perfetto_android_power:
-                    try:
-                        parse_perfetto_android_power_counters(
-                            perfetto_local_trace,
-                            out_dir=report_dir,
-                            label=f"{run_id}_{args.scenario}",
-                            no_timeseries=False,
-                        )
-                    except Exception as e:
-                        raise SystemExit(f"parse_perfetto_android_power_counters failed: {e}")
-                    print("Perfetto: parsed android.power -> perfetto_android_power_summary.csv + timeseries.csv")
+                perfetto_pull = (perfetto_remote_out, perfetto_local_trace)
 
-                if args.perfetto_policy_trace:
-                    try:
-                        parse_perfetto_policy_markers(perfetto_local_trace, out_dir=report_dir)
-                    except Exception as e:
-                        raise SystemExit(f"parse_perfetto_policy_markers failed: {e}")
-
-                # Best-effort cleanup.
-                adb_shell(adb_path, serial_used, ["rm", "-f", perfetto_remote_out], timeout_s=10.0)
-
-            # Capture END proto after sampling (before enrich/report is fine).
-            if args.batterystats_proto:
-                bs_end_pb = report_dir / "batterystats_end.pb"
-                rc, blob, err = adb_exec_out(adb_path, serial_used, ["dumpsys", "batterystats", "--proto"], timeout_s=30.0)
-                if rc != 0:
-                    raise SystemExit(f"batterystats --proto (end) failed: {err}")
-                bs_end_pb.write_bytes(blob)
+            if bs_end_fut is not None:
+                try:
+                    with span("batterystats_end_wait"):
+                        batterystats_parsed = bs_end_fut.result()
+                except Exception as e:
+                    raise SystemExit(f"batterystats --proto (end) failed: {e}")
         finally:
+            if bs_pool is not None:
+                bs_pool.shutdown(wait=False)
+            if live is not None:
+                live.stop()
+            if dashboard is not None:
+                dashboard.stop()
             if cpu_load_started:
                 try:
                     _cpu_load_stop(adb_path, serial_used)
                 except Exception:
                     # best-effort cleanup; do not mask primary errors
                     pass
+            if perfetto_capture is not None:
+                perfetto_capture.kill()
             if want_perfetto and perfetto_proc is not None and perfetto_proc.poll() is None:
                 # Avoid leaving perfetto running if sampling failed.
                 try:
@@ -695,94 +1157,287 @@ def main() -> int:
                 except Exception:
                     pass
 
-    # 4) Enrich
+    return SampledRun(
+        run_csv=run_csv,
+        run_id=run_id,
+        live_summary=live_summary,
+        perfetto_pull=perfetto_pull,
+        adb_path=adb_path,
+        serial=serial_used,
+        sample_s=None if args.skip_sample else round(time.perf_counter() - t_sample, 3),
+        batterystats_parsed=batterystats_parsed,
+    )
+
+
+def run_post(
+    args: argparse.Namespace,
+    sampled: SampledRun,
+    pp_json: Path,
+    stage_results: list[StageResult],
+    *,
+    device: bool = True,
+    host: bool = True,
+) -> Path:
+    """Post-sampling stage graph; device=False/host=False split it for run_plan (returns the enriched CSV).
+
+    The device stages (trace pull, batterystats --usage) touch adb; run_plan runs them before the next run
+    starts sampling and hands the host stages to a background worker.
+    """
+    run_csv, run_id, live_summary = sampled.run_csv, sampled.run_id, sampled.live_summary
+    perfetto_pull, adb_path, serial_used = sampled.perfetto_pull, sampled.adb_path, sampled.serial
+
+    # 4-6) Host-side post-processing as a stage graph: the Perfetto pull/parse, enrichment, the batterystats
+    # proto summary and the usage dump run concurrently; QC follows enrich and the report waits for its inputs.
     enriched_csv = run_csv.with_name(run_csv.stem + "_enriched.csv")
+    report_dir = Path("artifacts") / "reports" / enriched_csv.stem
+    report_dir.mkdir(parents=True, exist_ok=True)
+    post = StageGraph(
+        cache_path=None if args.no_stage_cache else report_dir / STAGE_CACHE_NAME,
+        jobs=int(args.stage_jobs),
+        force=bool(args.force_stages),
+    )
+    report_deps: list[str] = ["enrich"]
+
+    if perfetto_pull is not None:
+        remote, local = perfetto_pull
+        post.add(
+            Stage(
+                "perfetto_pull",
+                lambda: _pull_perfetto(adb_path, serial_used, remote=remote, local=local),
+                outputs=(local,),
+                cache=False,
+            )
+        )
+        post.add(
+            Stage(
+                "perfetto_parse",
+                lambda: _parse_perfetto(
+                    args, local, report_dir=report_dir, label=f"{run_id}_{args.scenario}", run_csv=run_csv
+                ),
+                deps=("perfetto_pull",),
+                inputs=(local, run_csv, args.map_json),
+                outputs=_perfetto_outputs(args, report_dir),
+                params={
+                    "android_power": bool(args.perfetto_android_power),
+                    "power_rails": bool(args.perfetto_power_rails),
+                    "policy_trace": bool(args.perfetto_policy_trace),
+                    "clusters_dir": str(args.profile_out_dir),
+                },
+            )
+        )
+        report_deps.append("perfetto_parse")
+
+    # Enrich (already done row by row with --live-enrich unless the live pass hit errors or used other inputs)
     try:
-        enrich_run_with_cpu_energy(run_csv=run_csv, out_csv=enriched_csv)
-    except Exception as e:
-        raise SystemExit(f"enrich_run_with_cpu_energy failed: {e}")
+        enrich_deps = enrich_inputs_hash(
+            map_json=args.map_json, clusters_dir=args.profile_out_dir, profile_json=pp_json, estimators=args.estimators
+        )
+    except Exception:
+        enrich_deps = ""  # unreadable inputs: let the stage run and report the real error
+    live_ok = live_summary is not None and not live_summary.errors and bool(enrich_deps)
+    if live_ok and live_summary.enrich_inputs == enrich_deps:
+        print(
+            f"Live-enriched: {live_summary.rows} rows; mean cpu={live_summary.cpu_mW or 0.0:.0f}mW "
+            f"screen={live_summary.screen_mW or 0.0:.0f}mW discharge={live_summary.discharge_mW or 0.0:.0f}mW"
+        )
+        post.add(Stage("enrich", None))
+    else:
+        if live_summary is not None and live_summary.errors:
+            print(f"WARN: live enrichment reported errors; re-enriching. Details: {'; '.join(live_summary.errors)}")
+        elif live_summary is not None:
+            print("WARN: live enrichment inputs differ from the post-run inputs (or could not be hashed); re-enriching")
 
-    # 4.5) Optional QC
+        def _stage_enrich() -> None:
+            try:
+                enrich_run_with_cpu_energy(
+                    run_csv=run_csv,
+                    out_csv=enriched_csv,
+                    map_json=args.map_json,
+                    clusters_dir=args.profile_out_dir,
+                    profile_json=pp_json,
+                    estimators=args.estimators,
+                )
+            except Exception as e:
+                raise SystemExit(f"enrich_run_with_cpu_energy failed: {e}")
+
+        post.add(
+            Stage(
+                "enrich",
+                _stage_enrich,
+                inputs=(run_csv,),
+                outputs=(enriched_csv,),
+                params={"enrich_inputs": enrich_deps},
+                # A rejected live output has the same run CSV; the cache must not vouch for it.
+                cache=bool(enrich_deps) and live_summary is None,
+            )
+        )
+
+    # Optional QC
     if args.qc:
-        qc_cmd = [py, "qc/qc_run.py", "--csv", str(enriched_csv)]
-        rc = subprocess.run(qc_cmd).returncode
-        if rc != 0:
-            raise SystemExit(f"qc_run failed with code {rc}")
 
-    # 5) Report
-    try:
-        report_run(enriched_csv)
-    except Exception as e:
-        raise SystemExit(f"report_run failed: {e}")
+        def _stage_qc() -> None:
+            try:
+                qc = qc_run(enriched_csv)
+            except Exception as e:
+                raise SystemExit(f"qc_run failed: {e}")
+            print("\n".join(qc.lines))
 
-    # 5.5) Optional: parse batterystats proto (schema-min) into JSON/CSV
-    if args.batterystats_proto and not args.skip_sample:
-        # Recompute report_dir here for clarity.
-        report_dir = Path("artifacts") / "reports" / enriched_csv.stem
-        report_dir.mkdir(parents=True, exist_ok=True)
+        post.add(Stage("qc", _stage_qc, deps=("enrich",), cache=False))
 
+    # Optional: parse batterystats proto (schema-min) into JSON/CSV
+    if args.batterystats_proto and not args.skip_sample:
         start_pb = report_dir / "batterystats_start.pb"
         end_pb = report_dir / "batterystats_end.pb"
+        bs_json, bs_csv = _batterystats_proto_outputs(report_dir)
+
+        def _stage_batterystats_parse() -> None:
+            if start_pb.exists() and end_pb.exists() and end_pb.stat().st_size > 0:
+                try:
+                    write_batterystats_min_summary(
+                        start_pb=start_pb,
+                        end_pb=end_pb,
+                        out_json=bs_json,
+                        out_csv=bs_csv,
+                        label=args.scenario,
+                    )
+                except Exception as e:
+                    raise SystemExit(f"parse_batterystats_proto_min failed: {e}")
+            else:
+                print("WARN: batterystats proto dumps missing or empty; skipping proto parse")
+
+        post.add(
+            Stage(
+                "batterystats_parse",
+                None if sampled.batterystats_parsed else _stage_batterystats_parse,
+                inputs=(start_pb, end_pb),
+                outputs=(bs_json, bs_csv),
+                params={"label": args.scenario},
+            )
+        )
+
+    # Optional: batterystats usage dump + parsed summary (device-bound)
+    if args.batterystats_usage and not args.skip_sample:
+
+        def _stage_batterystats_usage() -> None:
+            rc, out, err = adb_shell(
+                resolve_adb(args.adb),
+                args.serial,
+                ["dumpsys", "batterystats", "--usage", "--model", "power-profile"],
+                timeout_s=60.0,
+            )
+            if rc != 0:
+                raise SystemExit(f"batterystats --usage failed: {err or out}")
+
+            raw_path = report_dir / "batterystats_usage.txt"
+            raw_path.write_text(out, encoding="utf-8")
+
+            global_mah = _parse_batterystats_usage_global(out)
+            if global_mah:
+                # Write a tiny CSV for easy plotting/compare.
+                summary_path = report_dir / "batterystats_usage_global_mAh.csv"
+                lines = ["component,mAh"]
+                for k in sorted(global_mah.keys()):
+                    lines.append(f"{k},{global_mah[k]}")
+                summary_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+                print(f"Wrote: {raw_path}")
+                print(f"Wrote: {summary_path}")
+            else:
+                print(f"Wrote: {raw_path}")
+                print("WARN: Could not parse Global section from batterystats --usage output")
+
+        post.add(Stage("batterystats_usage", _stage_batterystats_usage, cache=False))
+
+    # Report (needs the Perfetto outputs)
+    def _stage_report() -> None:
+        try:
+            report_run(enriched_csv)
+        except Exception as e:
+            raise SystemExit(f"report_run failed: {e}")
+
+    post.add(
+        Stage(
+            "report",
+            _stage_report,
+            deps=tuple(report_deps),
+            inputs=(enriched_csv, *(report_dir / n for n in REPORT_EXTRA_INPUTS)),
+            outputs=tuple(report_dir / n for n in REPORT_OUTPUTS),
+        )
+    )
+
+    for name in list(post.stages):
+        if name in DEVICE_STAGES and not device:
+            post.stages[name] = Stage(name, None)  # done by the device phase
+        elif name not in DEVICE_STAGES and not host:
+            del post.stages[name]
 
-        # If we captured earlier into the same report_dir naming, these will exist.
-        # Otherwise, fall back to legacy naming created before enrich.
-        if not start_pb.exists():
-            legacy_dir = Path("artifacts") / "reports" / f"{enriched_csv.stem.removesuffix('_enriched')}_enriched"
-            legacy_start = legacy_dir / "batterystats_start.pb"
-            legacy_end = legacy_dir / "batterystats_end.pb"
-            if legacy_start.exists():
-                start_pb.write_bytes(legacy_start.read_bytes())
-            if legacy_end.exists():
-                end_pb.write_bytes(legacy_end.read_bytes())
-
-        if start_pb.exists() and end_pb.exists() and end_pb.stat().st_size > 0:
-            out_json = report_dir / "batterystats_proto_min_summary.json"
-            out_csv = report_dir / "batterystats_proto_min_summary.csv"
+    try:
+        post.run()
+    finally:
+        stage_results += post.results.values()
+        if host:
+            prof = active_profiler()
+            if prof is not None:
+                prof.close()
             try:
-                write_batterystats_min_summary(
-                    start_pb=start_pb,
-                    end_pb=end_pb,
-                    out_json=out_json,
-                    out_csv=out_csv,
-                    label=args.scenario,
+                timings = write_stage_timings(
+                    stage_results, report_dir / STAGE_TIMINGS_NAME, profile=None if prof is None else prof.to_json()
                 )
+                print(f"Wrote: {timings}")
             except Exception as e:
-                raise SystemExit(f"parse_batterystats_proto_min failed: {e}")
-        else:
-            print("WARN: batterystats proto dumps missing or empty; skipping proto parse")
+                print(f"WARN: could not write stage timings: {e}")
+    return enriched_csv
 
-    # 6) Optional: batterystats usage dump + parsed summary
-    if args.batterystats_usage and not args.skip_sample:
+
+def check_args(args: argparse.Namespace) -> None:
+    if args.screen_sleep_before and args.screen_wake_before:
+        raise SystemExit("--screen-sleep-before and --screen-wake-before are mutually exclusive")
+
+    if args.set_brightness is not None and not (0 <= int(args.set_brightness) <= 255):
+        raise SystemExit("--set-brightness must be in [0, 255]")
+    if args.set_timeout_ms is not None and int(args.set_timeout_ms) <= 0:
+        raise SystemExit("--set-timeout-ms must be positive")
+    if args.stop_when_converged:
+        if float(args.converge_rel) <= 0 and float(args.converge_abs_mw) <= 0:
+            raise SystemExit("--stop-when-converged needs --converge-rel > 0 or --converge-abs-mw > 0")
+        if float(sample_duration_s(args)) < float(args.converge_min_s):
+            raise SystemExit("--converge-max-s (default: 2x --duration) must be >= --converge-min-s")
+    if args.wait_thermal_steady:
+        try:
+            parse_bands(args.thermal_steady_band)
+        except ValueError as e:
+            raise SystemExit(f"--thermal-steady-band: {e}")
+        if float(args.thermal_steady_poll_s) <= 0:
+            raise SystemExit("--thermal-steady-poll-s must be > 0")
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    check_args(args)
+
+    # Debug utility: smoke-test CPU load start/stop without running a full sampling window.
+    if args.cpu_load_smoke:
         adb_path = resolve_adb(args.adb)
-        rc, out, err = adb_shell(
-            adb_path,
-            args.serial,
-            ["dumpsys", "batterystats", "--usage", "--model", "power-profile"],
-            timeout_s=60.0,
-        )
-        if rc != 0:
-            raise SystemExit(f"batterystats --usage failed: {err or out}")
+        serial_used = args.serial
+        if not serial_used:
+            serial_used = pick_default_serial(adb_path, timeout_s=8.0)
+        if not serial_used:
+            raise SystemExit("No adb devices found. Provide --serial or connect a device.")
+        if not args.cpu_load_threads or int(args.cpu_load_threads) <= 0:
+            raise SystemExit("--cpu-load-smoke requires --cpu-load-threads > 0")
+        print(f"CPU load smoke: serial={serial_used} threads={int(args.cpu_load_threads)}")
+        _cpu_load_start(adb_path, serial_used, int(args.cpu_load_threads))
+        _cpu_load_stop(adb_path, serial_used)
+        print("CPU load smoke: OK")
+        return 0
 
-        report_dir = Path("artifacts") / "reports" / enriched_csv.stem
-        report_dir.mkdir(parents=True, exist_ok=True)
-        raw_path = report_dir / "batterystats_usage.txt"
-        raw_path.write_text(out, encoding="utf-8")
-
-        global_mah = _parse_batterystats_usage_global(out)
-        if global_mah:
-            # Write a tiny CSV for easy plotting/compare.
-            summary_path = report_dir / "batterystats_usage_global_mAh.csv"
-            lines = ["component,mAh"]
-            for k in sorted(global_mah.keys()):
-                lines.append(f"{k},{global_mah[k]}")
-            summary_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
-            print(f"Wrote: {raw_path}")
-            print(f"Wrote: {summary_path}")
-        else:
-            print(f"Wrote: {raw_path}")
-            print("WARN: Could not parse Global section from batterystats --usage output")
-
-    print(f"Run CSV: {run_csv}")
+    start_profiling(args)
+    pp_json, stage_results = run_setup(args)
+    sampled = run_sample(args)
+    if sampled.sample_s is not None:
+        stage_results.append(StageResult(name="sample", status="ran", seconds=sampled.sample_s))
+    enriched_csv = run_post(args, sampled, pp_json, stage_results)
+
+    print(f"Run CSV: {sampled.run_csv}")
     print(f"Enriched: {enriched_csv}")
     return 0
 
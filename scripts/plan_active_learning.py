@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Allow importing sibling script modules when executed as a script.
+_SCRIPTS_DIR = Path(__file__).resolve().parent
+if str(_SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(_SCRIPTS_DIR))
+
+from model_battery_soc_v2_thermal1 import fit_thermal_1state  # noqa: E402
+from model_battery_soc_v2_thermal1 import simulate_temperature_1state  # noqa: E402
+
+
+# Active-learning planner for the S2 brightness and S3 CPU-load sweeps.
+#
+# The v2 electrical model is linear in its features: P = p_base + k_screen*P_screen + k_cpu*P_cpu +
+# k_leak*exp(gamma*(T - T_ref)). Samples inside one run are strongly autocorrelated, so the design is
+# built at run level (one row of run-mean features per run, like the per-run validation). With the
+# run-mean residual variance sigma^2 under the current parameters, Var(beta) ~ sigma^2 * M^-1 with
+# M = sum x x^T (+ a small ridge). A candidate run with predicted features x lowers Var(beta_j) by
+# (M^-1 x)_j^2 / (1 + x^T M^-1 x) (Sherman-Morrison, in sigma^2 units); runs are picked greedily.
+# T is the per-run 1-state simulated CPU temperature (temp_leak_hat_C), as in fit_power_model_v2's default
+# thermal model; for parameters fitted with --thermal-model 2state this is an approximation of its leak
+# temperature (a mix of the CPU and battery states).
+
+FEATURES = ("intercept", "power_screen_mW", "power_cpu_mW", "leak_feat")
+TARGETS = {"k_screen": 1, "k_cpu": 2}
+_FAMILY_PREFIX = {"S2": "S2_b", "S3": "S3_load_t"}
+_RE_THREADS = re.compile(r"^S3_load_t(\d+)$")
+
+
+@dataclass
+class Candidate:
+    family: str  # S2 | S3
+    scenario: str
+    level: int  # brightness (S2) or CPU-load threads (S3)
+    x: np.ndarray
+
+
+def _col_num(df: pd.DataFrame, col: str, default: float = np.nan) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series([default] * len(df), index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def _threads(scenario: str) -> int | None:
+    if scenario == "S3_idle":
+        return 0
+    m = _RE_THREADS.match(scenario)
+    return int(m.group(1)) if m else None
+
+
+def run_level_design(all_df: pd.DataFrame, params: dict) -> pd.DataFrame:
+    """One row per run: mean features / power over the base operating point (GPS + cellular ON)."""
+    df = all_df.copy()
+    df["dt_s"] = _col_num(df, "dt_s", 0.0).fillna(0.0)
+    df["power_total_mW"] = _col_num(df, "power_total_mW")
+    df = df[(df["dt_s"] > 0) & df["power_total_mW"].notna()]
+    # Same leak temperature as fit_power_model_v2: per-run thermal fit over all rows, then simulate.
+    df["temp_leak_hat_C"] = np.nan
+    for _, g in df.groupby("run_name"):
+        g = g.sort_values("t_s")
+        t_hat = simulate_temperature_1state(g, fit_thermal_1state(g))
+        df.loc[g.index, "temp_leak_hat_C"] = t_hat.to_numpy(dtype=float)
+    df = df[(_col_num(df, "is_gps_on", 0.0).fillna(0.0) >= 0.5) & (_col_num(df, "cellular_on", 1.0).fillna(1.0) >= 0.5)]
+
+    t = _col_num(df, "temp_leak_hat_C")
+    gamma = float(params.get("leak_gamma_per_C", 0.0))
+    tref = float(params.get("leak_tref_C", 0.0))
+    df = df.assign(
+        intercept=1.0,
+        power_screen_mW=_col_num(df, "power_screen_mW", 0.0).fillna(0.0),
+        power_cpu_mW=_col_num(df, "power_cpu_mW", 0.0).fillna(0.0),
+        leak_feat=np.exp(gamma * (t.fillna(t.median() if t.notna().any() else tref) - tref)),
+        brightness=_col_num(df, "brightness"),
+        temp_leak_hat_C=t,
+    )
+    runs = (
+        df.groupby("run_name")
+        .agg(
+            scenario=("scenario", "first"),
+            rows=("dt_s", "size"),
+            intercept=("intercept", "mean"),
+            power_screen_mW=("power_screen_mW", "mean"),
+            power_cpu_mW=("power_cpu_mW", "mean"),
+            leak_feat=("leak_feat", "mean"),
+            brightness=("brightness", "mean"),
+            temp_leak_hat_C=("temp_leak_hat_C", "mean"),
+            power_total_mW=("power_total_mW", "mean"),
+        )
+        .reset_index()
+    )
+    beta = np.array([params["p_base_mW"], params["k_screen"], params["k_cpu"], params["k_leak_mW"]], dtype=float)
+    runs["pred_mW"] = runs[list(FEATURES)].to_numpy(dtype=float) @ beta
+    runs["resid_mW"] = runs["power_total_mW"] - runs["pred_mW"]
+    runs["threads"] = [_threads(str(s)) for s in runs["scenario"]]
+    return runs
+
+
+def _interp(x: np.ndarray, y: np.ndarray, q: float) -> float:
+    """Piecewise-linear in x, extended linearly beyond the observed range."""
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    if len(x) == 1:
+        return float(y[0])
+    if q <= x[0]:
+        return float(y[0] + (q - x[0]) * (y[1] - y[0]) / (x[1] - x[0]))
+    if q >= x[-1]:
+        return float(y[-1] + (q - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2]))
+    return float(np.interp(q, x, y))
+
+
+def build_candidates(runs: pd.DataFrame, params: dict, brightness: list[int], threads: list[int]) -> list[Candidate]:
+    """Predict run-mean features at each candidate level from the existing runs of the same sweep."""
+    out: list[Candidate] = []
+    gamma = float(params.get("leak_gamma_per_C", 0.0))
+    tref = float(params.get("leak_tref_C", 0.0))
+
+    s2 = runs[runs["scenario"].astype(str).str.startswith("S2_") & runs["brightness"].notna()]
+    if len(s2) >= 2:
+        b = s2["brightness"].to_numpy(dtype=float)
+        ps = s2["power_screen_mW"].to_numpy(dtype=float)
+        slope, icpt = np.polyfit(b, ps, 1)  # screen power is linear in brightness_norm in the power profile
+        for lvl in brightness:
+            x = np.array(
+                [1.0, max(0.0, icpt + slope * lvl), float(s2["power_cpu_mW"].median()), float(s2["leak_feat"].median())]
+            )
+            out.append(Candidate("S2", f"S2_b{lvl:03d}", int(lvl), x))
+
+    s3 = runs[runs["threads"].notna()]
+    if len(s3) >= 2:
+        n = s3["threads"].to_numpy(dtype=float)
+        pc = s3["power_cpu_mW"].to_numpy(dtype=float)
+        tc = s3["temp_leak_hat_C"].to_numpy(dtype=float)
+        ok_t = np.isfinite(tc)
+        for lvl in threads:
+            t_hat = _interp(n[ok_t], tc[ok_t], float(lvl)) if ok_t.sum() >= 2 else tref
+            x = np.array(
+                [
+                    1.0,
+                    float(s3["power_screen_mW"].median()),
+                    max(0.0, _interp(n, pc, float(lvl))),
+                    float(np.exp(gamma * (t_hat - tref))),
+                ]
+            )
+            out.append(Candidate("S3", f"S3_load_t{lvl}", int(lvl), x))
+    return out
+
+
+def greedy_select(
+    X: np.ndarray, candidates: list[Candidate], n_runs: int, ridge: float
+) -> tuple[list[tuple[Candidate, dict[str, float]]], np.ndarray, np.ndarray]:
+    """Pick `n_runs` candidates (repeats allowed), each maximising the summed relative variance drop of
+    k_screen and k_cpu; returns (picks with per-target relative drops, var before, var after) in sigma^2 units."""
+    M = X.T @ X
+    M = M + float(ridge) * np.mean(np.diag(M)) * np.eye(M.shape[0])
+    Minv = np.linalg.inv(M)
+    var0 = np.diag(Minv).copy()
+    picks: list[tuple[Candidate, dict[str, float]]] = []
+    for _ in range(int(n_runs)):
+        best: tuple[float, Candidate, np.ndarray, dict[str, float]] | None = None
+        for c in candidates:
+            u = Minv @ c.x
+            drop = u**2 / (1.0 + float(c.x @ u))
+            rel = {k: float(drop[j] / np.diag(Minv)[j]) for k, j in TARGETS.items()}
+            score = sum(rel.values())
+            if best is None or score > best[0]:
+                best = (score, c, u, rel)
+        if best is None:
+            break
+        _, c, u, rel = best
+        Minv = Minv - np.outer(u, u) / (1.0 + float(c.x @ u))
+        picks.append((c, rel))
+    return picks, var0, np.diag(Minv)
+
+
+def _existing_s2_scenarios(sp: pd.DataFrame) -> dict[int, str]:
+    """brightness_target -> existing S2 scenario name (names are not uniform: S2_b005, S2_b90, S2_b30_1)."""
+    out: dict[int, str] = {}
+    s2 = sp[sp["scenario"].str.startswith(_FAMILY_PREFIX["S2"])]
+    for scen, b in zip(s2["scenario"], pd.to_numeric(s2["brightness_target"], errors="coerce")):
+        if np.isfinite(b):
+            out.setdefault(int(b), str(scen))
+    return out
+
+
+def _append_csv_rows(path: Path, columns: list[str], rows: list[dict], *, encoding: str) -> None:
+    # Append without rewriting existing lines (keeps hand-edited plans byte-identical above the new rows).
+    new = not path.exists() or path.stat().st_size == 0
+    if not new and not path.read_bytes().endswith(b"\n"):
+        with path.open("a", encoding="utf-8", newline="") as f:
+            f.write("\n")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding=encoding if new else "utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+        if new:
+            w.writeheader()
+        w.writerows(rows)
+
+
+def _parse_levels(spec: str) -> list[int]:
+    """'5:255:5' (start:stop:step, inclusive) or '1,2,4'."""
+    spec = str(spec).strip()
+    if ":" in spec:
+        a, b, step = (int(v) for v in spec.split(":"))
+        return list(range(a, b + 1, step))
+    return [int(v) for v in spec.split(",") if v.strip()]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description="Append the most informative S2 brightness / S3 thread-count runs (for k_screen, k_cpu) to a plan CSV"
+    )
+    ap.add_argument("--input", type=Path, default=Path("artifacts/models/all_runs_model_input.csv"))
+    ap.add_argument("--params", type=Path, default=Path("artifacts/models/model_params_v2.json"))
+    ap.add_argument("--n-runs", type=int, default=4, help="Runs to add")
+    ap.add_argument("--brightness-grid", default="5:255:5", help="Candidate brightness levels (start:stop:step or list)")
+    ap.add_argument("--threads-grid", default="1:8:1", help="Candidate CPU-load thread counts")
+    ap.add_argument("--families", default="S2,S3", help="Sweeps to plan for")
+    ap.add_argument("--ridge", type=float, default=1e-6, help="Ridge on the run-level information matrix (relative)")
+    ap.add_argument("--out-plan", type=Path, default=Path("configs/test_plan_active.csv"), help="Plan CSV to append to")
+    ap.add_argument(
+        "--template-plan",
+        type=Path,
+        default=Path("configs/test_plan_v2.csv"),
+        help="Column layout and run settings (duration/interval/flags) for new plan rows",
+    )
+    ap.add_argument(
+        "--scenario-params",
+        type=Path,
+        default=Path("configs/scenario_params.csv"),
+        help="New scenarios are appended here so model_preprocess.py knows their configuration",
+    )
+    ap.add_argument("--report", type=Path, default=Path("artifacts/models/active_learning_plan.csv"))
+    ap.add_argument("--dry-run", action="store_true", help="Print the picks without writing the plan")
+    args = ap.parse_args()
+
+    params = json.loads(args.params.read_text(encoding="utf-8"))
+    runs = run_level_design(pd.read_csv(args.input), params)
+    if len(runs) < len(FEATURES) + 1:
+        raise SystemExit(f"need at least {len(FEATURES) + 1} base-operating-point runs, have {len(runs)}")
+    X = runs[list(FEATURES)].to_numpy(dtype=float)
+    sigma2 = float((runs["resid_mW"] ** 2).sum() / max(1, len(runs) - len(FEATURES)))
+
+    families = {f.strip().upper() for f in str(args.families).split(",") if f.strip()}
+    candidates = [
+        c
+        for c in build_candidates(runs, params, _parse_levels(args.brightness_grid), _parse_levels(args.threads_grid))
+        if c.family in families
+    ]
+    if not candidates:
+        raise SystemExit("no candidates (need >= 2 existing runs of a sweep to predict its features)")
+
+    # Reuse an existing scenario for a brightness level that already has one, so its runs are grouped with it.
+    sp = (
+        pd.read_csv(args.scenario_params, dtype=str, keep_default_na=False)
+        if args.scenario_params.exists()
+        else None
+    )
+    if sp is not None:
+        existing = _existing_s2_scenarios(sp)
+        for c in candidates:
+            if c.family == "S2":
+                c.scenario = existing.get(c.level, c.scenario)
+
+    picks, var0, var1 = greedy_select(X, candidates, int(args.n_runs), float(args.ridge))
+    print(f"Runs in design: {len(runs)}; run-mean residual sigma={np.sqrt(sigma2):.1f} mW")
+    for k, j in TARGETS.items():
+        se0, se1 = np.sqrt(sigma2 * var0[j]), np.sqrt(sigma2 * var1[j])
+        print(f"{k}={params[k]:.4g}: SE {se0:.4g} -> {se1:.4g} ({100 * (1 - var1[j] / var0[j]):.0f}% variance reduction)")
+
+    rows = []
+    for i, (c, rel) in enumerate(picks, start=1):
+        desc = ", ".join(f"{k} -{100 * v:.1f}%" for k, v in rel.items())
+        print(f"{i}. {c.scenario}: {desc}")
+        rows.append(
+            {
+                "pick": i,
+                "scenario": c.scenario,
+                "family": c.family,
+                "level": c.level,
+                **{f"dvar_rel_{k}": v for k, v in rel.items()},
+                **dict(zip(FEATURES, c.x)),
+            }
+        )
+    if args.dry_run or not rows:
+        return 0
+
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(rows).to_csv(args.report, index=False, encoding="utf-8")
+    print(f"Wrote: {args.report}")
+
+    # Plan rows: one per scenario (repeat = times picked), settings copied from the sweep's template rows.
+    tmpl = pd.read_csv(args.template_plan, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    stamp = datetime.now().astimezone().strftime("%Y%m%d_%H%M")
+    picked: dict[str, Candidate] = {}
+    repeat: dict[str, int] = {}
+    for c, _ in picks:
+        picked.setdefault(c.scenario, c)
+        repeat[c.scenario] = repeat.get(c.scenario, 0) + 1
+    new_rows = []
+    for scen, c in picked.items():
+        same = tmpl[tmpl["scenario"].str.startswith(_FAMILY_PREFIX[c.family])]
+        row = same.iloc[0].to_dict() if not same.empty else {col: "" for col in tmpl.columns}
+        row.update({"plan_id": f"AL-{c.family}-{stamp}", "scenario": scen, "repeat": repeat[scen]})
+        row["set_brightness" if c.family == "S2" else "cpu_load_threads"] = c.level
+        row["notes"] = f"active learning pick (k_screen/k_cpu variance), {stamp}"
+        new_rows.append(row)
+    _append_csv_rows(args.out_plan, list(tmpl.columns), new_rows, encoding="utf-8-sig")
+    print(f"Wrote: {args.out_plan} (+{len(new_rows)} rows)")
+
+    # Scenario configuration for model_preprocess (same family template, new brightness target).
+    if sp is not None:
+        add = []
+        for scen, c in picked.items():
+            if scen in set(sp["scenario"]):
+                continue
+            same = sp[sp["scenario"].str.startswith(_FAMILY_PREFIX[c.family])]
+            if same.empty:
+                print(f"WARN: no template row for {scen} in {args.scenario_params}; add it manually")
+                continue
+            row = same.iloc[0].to_dict()
+            row["scenario"] = scen
+            if c.family == "S2":
+                row["brightness_target"] = c.level
+            add.append(row)
+        if add:
+            _append_csv_rows(args.scenario_params, list(sp.columns), add, encoding="utf-8")
+            print(f"Wrote: {args.scenario_params} (+{len(add)} scenarios)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,6 +6,17 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from _bootstrap import ensure_repo_root_on_sys_path
+
+ensure_repo_root_on_sys_path()
+
+from mp_power.pipeline_ops import DEFAULT_SCENARIO_PARAMS
+from mp_power.pipeline_ops import ENRICH_MANIFEST_NAME
+from mp_power.pipeline_ops import enrich_inputs_hash
+from mp_power.pipeline_ops import load_enrich_manifest
+from mp_power.pipeline_ops import load_enrich_manifest_inputs
+from mp_power.pipeline_ops import run_dep_hash
+
 
 def _col_num(df: pd.DataFrame, col: str, default: float = np.nan) -> pd.Series:
     if col not in df.columns:
@@ -67,7 +78,14 @@ def _read_perfetto_summary(report_dir: Path) -> dict:
     return out
 
 
-def build_run_qc_table(runs_dir: Path, reports_dir: Path) -> pd.DataFrame:
+def build_run_qc_table(
+    runs_dir: Path,
+    reports_dir: Path,
+    manifest: dict[str, dict] | None = None,
+    inputs_hash: str | None = None,
+) -> pd.DataFrame:
+    """One row per enriched run. With `inputs_hash` (enrich_inputs_hash() of the current map/tables/profile),
+    enrich_fresh says whether the manifest's dep_hash still matches the run CSV and those inputs."""
     rows: list[dict] = []
 
     for run_csv in sorted(runs_dir.glob("*_enriched.csv")):
@@ -75,6 +93,18 @@ def build_run_qc_table(runs_dir: Path, reports_dir: Path) -> pd.DataFrame:
         info = _read_first_row_csv(run_csv)
         info["run_name"] = run_name
         info["run_csv"] = str(run_csv.as_posix())
+        if manifest is not None:
+            entry = manifest.get(run_name) or {}
+            # Not in the manifest: enriched by hand / before enrich-batch, so freshness is unknown.
+            info["enrich_status"] = str(entry.get("status", "unknown"))
+            info["enrich_dep_hash"] = str(entry.get("dep_hash", ""))
+            if inputs_hash is not None and entry:
+                raw = Path(str(entry.get("run_csv") or ""))
+                if not raw.is_file():
+                    raw = runs_dir / f"{run_name}.csv"
+                # A run whose raw CSV is gone cannot be checked; count it as stale.
+                fresh = raw.is_file() and run_dep_hash(raw, inputs_hash, entry)[0] == info["enrich_dep_hash"]
+                info["enrich_fresh"] = int(fresh)
 
         # Find matching report dir by prefix run_id
         run_id = run_name.split("_")[:2]
@@ -126,6 +156,7 @@ def apply_qc_policy(
     require_thermal_status0: bool,
     require_unplugged: bool,
     require_perfetto: bool,
+    require_enrich_fresh: bool = False,
 ) -> pd.DataFrame:
     df = run_qc.copy()
 
@@ -141,6 +172,15 @@ def apply_qc_policy(
         m = df.get("has_perfetto", 0).astype(int).to_numpy() == 0
         add_reason(m, "no_perfetto")
 
+    if "enrich_status" in df.columns:
+        st = df["enrich_status"].astype(str).to_numpy()
+        add_reason(st == "error", "enrich_error")
+        if require_enrich_fresh:
+            add_reason(st == "unknown", "enrich_not_in_manifest")
+            if "enrich_fresh" in df.columns:
+                fresh = pd.to_numeric(df["enrich_fresh"], errors="coerce").fillna(1).to_numpy(dtype=float)
+                add_reason((st != "unknown") & (fresh < 0.5), "enrich_stale")
+
     soc = df.get("battery_level0_pct", pd.Series([np.nan] * len(df))).to_numpy(float)
     m = np.isfinite(soc) & (soc < float(min_soc_pct))
     add_reason(m, f"soc<{min_soc_pct}")
@@ -239,12 +279,56 @@ def main() -> int:
     ap.add_argument("--require-thermal-status0", action="store_true")
     ap.add_argument("--require-unplugged", action="store_true")
     ap.add_argument("--require-perfetto", action="store_true")
+    ap.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        help=(
+            f"enrich-batch manifest (usually <runs-dir>/{ENRICH_MANIFEST_NAME}): adds enrich_status/enrich_dep_hash "
+            "columns and rejects runs whose last enrich failed"
+        ),
+    )
+    ap.add_argument(
+        "--require-enrich-fresh",
+        action="store_true",
+        help=(
+            "With --manifest: also reject enriched CSVs the manifest does not know about, and runs whose stored "
+            "dep_hash no longer matches the run CSV and the enrich inputs (enrich_stale)"
+        ),
+    )
+    # Enrich inputs for --require-enrich-fresh: default to what the manifest says enrich-batch ran with.
+    ap.add_argument("--map-json", type=Path, default=None, help="Override the manifest's map_json")
+    ap.add_argument("--clusters-dir", type=Path, default=None, help="Override the manifest's clusters_dir")
+    ap.add_argument("--profile-json", type=Path, default=None, help="Override the manifest's profile_json")
+    ap.add_argument("--estimators", default=None, help="Override the manifest's estimators")
+    ap.add_argument("--scenario-params", type=Path, default=None, help="Override the manifest's scenario_params")
 
     ap.add_argument("--emit-filtered-model-input", action="store_true")
 
     args = ap.parse_args()
 
-    run_qc = build_run_qc_table(args.runs_dir, args.reports_dir)
+    manifest = None
+    if args.manifest is not None:
+        if not args.manifest.exists():
+            raise SystemExit(f"Manifest not found: {args.manifest} (run `python -m mp_power.pipeline_ops enrich-batch`)")
+        manifest = load_enrich_manifest(args.manifest)
+
+    inputs_hash = None
+    if manifest is not None and args.require_enrich_fresh:
+        used = load_enrich_manifest_inputs(args.manifest)
+
+        def pick(flag: Path | None, key: str, default: Path) -> Path:
+            return flag if flag is not None else Path(used[key]) if used.get(key) else default
+
+        inputs_hash = enrich_inputs_hash(
+            map_json=pick(args.map_json, "map_json", Path("artifacts/android/power_profile/policy_cluster_map.json")),
+            clusters_dir=pick(args.clusters_dir, "clusters_dir", Path("artifacts/android/power_profile")),
+            profile_json=pick(args.profile_json, "profile_json", Path("artifacts/android/power_profile/power_profile.json")),
+            estimators=args.estimators if args.estimators is not None else used.get("estimators", ""),
+            scenario_params=pick(args.scenario_params, "scenario_params", DEFAULT_SCENARIO_PARAMS),
+        )
+
+    run_qc = build_run_qc_table(args.runs_dir, args.reports_dir, manifest, inputs_hash)
     if run_qc.empty:
         print("No runs found.")
         return 1
@@ -257,6 +341,7 @@ def main() -> int:
         require_thermal_status0=bool(args.require_thermal_status0),
         require_unplugged=bool(args.require_unplugged),
         require_perfetto=bool(args.require_perfetto),
+        require_enrich_fresh=bool(args.require_enrich_fresh),
     )
 
     out_dir = args.out_dir
@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from _bootstrap import ensure_repo_root_on_sys_path
+
+ensure_repo_root_on_sys_path()
+
+from generate_run_plan import PlanRun
+from generate_run_plan import add_filter_args
+from generate_run_plan import load_plan_runs
+from generate_run_plan import plan_filters
+from mp_power.dag import STAGE_TIMINGS_NAME
+from mp_power.dag import StageResult
+from mp_power.live import LiveSummary
+from mp_power.profiling import active as active_profiler
+from mp_power.profiling import disable as disable_profiler
+from mp_power.profiling import write_stage_timings_summary
+from pipeline_run import SampledRun
+from pipeline_run import build_parser
+from pipeline_run import check_args
+from pipeline_run import run_post
+from pipeline_run import run_sample
+from pipeline_run import run_setup
+from pipeline_run import start_profiling
+
+
+# Executes a CSV test plan directly: the device-bound part of each run (settings, CPU load, sampling,
+# trace capture/pull, batterystats dumps) runs one at a time per device, and the host-bound
+# post-processing of run N (enrich, trace parse, report, QC) runs in a worker process while run N+1
+# samples. With --serials, each device of the pool takes the next run it may run (device groups stay on
+# one device; CPU-load runs come last) and writes its output to its own log.
+
+STATE_VERSION = 1
+
+
+def _now() -> str:
+    return datetime.now().astimezone().isoformat(timespec="seconds")
+
+
+def load_state(path: Path) -> dict:
+    try:
+        obj = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {"version": STATE_VERSION, "runs": {}}
+    if not isinstance(obj, dict) or obj.get("version") != STATE_VERSION or not isinstance(obj.get("runs"), dict):
+        return {"version": STATE_VERSION, "runs": {}}
+    return obj
+
+
+def save_state(path: Path, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state["updated_at"] = _now()
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _sampled_to_json(s: SampledRun) -> dict:
+    return {
+        "run_csv": str(s.run_csv),
+        "run_id": s.run_id,
+        "live_summary": asdict(s.live_summary) if s.live_summary is not None else None,
+        "perfetto_pull": [s.perfetto_pull[0], str(s.perfetto_pull[1])] if s.perfetto_pull else None,
+        "adb_path": s.adb_path,
+        "serial": s.serial,
+        "sample_s": s.sample_s,
+        "batterystats_parsed": s.batterystats_parsed,
+    }
+
+
+def _sampled_from_json(d: dict) -> SampledRun:
+    pull = d.get("perfetto_pull")
+    live = d.get("live_summary")
+    return SampledRun(
+        run_csv=Path(d["run_csv"]),
+        run_id=str(d.get("run_id") or ""),
+        live_summary=LiveSummary(**live) if isinstance(live, dict) else None,
+        perfetto_pull=(str(pull[0]), Path(pull[1])) if pull else None,
+        adb_path=d.get("adb_path"),
+        serial=d.get("serial"),
+        sample_s=d.get("sample_s"),
+        batterystats_parsed=bool(d.get("batterystats_parsed", False)),
+    )
+
+
+def _post_worker(argv: list[str], sampled: dict, stage_results: list[dict], profile: list[dict]) -> str:
+    """Host-only stages of one run (in a worker process)."""
+    args = build_parser().parse_args(argv)
+    pp_json = args.profile_out_dir / "power_profile.json"
+    results = [StageResult(**r) for r in stage_results]
+    start_profiling(args)
+    prof = active_profiler()
+    if prof is not None:
+        prof.merge(profile)  # spans of the device phase (another process)
+    try:
+        enriched = run_post(args, _sampled_from_json(sampled), pp_json, results, device=False, host=True)
+    finally:
+        disable_profiler()
+    return str(enriched)
+
+
+@contextmanager
+def _output_to(log_path: Path | None):
+    """Send this process's stdout/stderr (including adb/perfetto child output) to a log file."""
+    if log_path is None:
+        yield
+        return
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = (os.dup(1), os.dup(2))
+    with log_path.open("a", encoding="utf-8") as f:
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def _device_phase(
+    argv: list[str], log_path: Path | None = None
+) -> tuple[SampledRun, list[StageResult], list[dict]]:
+    """Setup, sampling and device-bound post stages of one run (in a per-device worker process).
+
+    Returns the --profile span rows too (empty without --profile); the host worker writes them.
+    """
+    with _output_to(log_path):
+        print(f"===== {_now()} pipeline_run.py {' '.join(argv)}", flush=True)
+        args = build_parser().parse_args(argv)
+        check_args(args)
+        start_profiling(args)
+        try:
+            _, stage_results = run_setup(args)
+            sampled = run_sample(args)
+            if sampled.sample_s is not None:
+                stage_results.append(StageResult(name="sample", status="ran", seconds=sampled.sample_s))
+            run_post(args, sampled, args.profile_out_dir / "power_profile.json", stage_results, device=True, host=False)
+        finally:
+            prof = disable_profiler()
+        return sampled, stage_results, [] if prof is None else prof.rows()
+
+
+def _alloc_run_id(used: set[str]) -> str:
+    # Runs starting in the same second on different devices still need distinct artifact names.
+    t = datetime.now().astimezone()
+    run_id = t.strftime("%Y%m%d_%H%M%S")
+    while run_id in used:
+        t += timedelta(seconds=1)
+        run_id = t.strftime("%Y%m%d_%H%M%S")
+    used.add(run_id)
+    return run_id
+
+
+def dispatch_order(runs: list[PlanRun], *, plan_order: bool = False) -> list[PlanRun]:
+    """Plan order, except that CPU-load runs go last so their heat does not leak into other runs."""
+    if plan_order:
+        return list(runs)
+    return [r for r in runs if r.cpu_load_threads <= 0] + [r for r in runs if r.cpu_load_threads > 0]
+
+
+def pick_run(serial: str | None, queue: list[PlanRun], owner: dict[str, str | None]) -> PlanRun | None:
+    """First queued run this device may take: its device group is unowned or already on this device."""
+    for run in queue:
+        if owner.get(run.device_group, serial) == serial:
+            return run
+    return None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description=(
+            "Execute a CSV test plan directly (device phases in order, post-processing of run N overlapped with "
+            "run N+1). Unrecognised arguments are passed to every pipeline_run.py invocation, e.g. --serial X."
+        )
+    )
+    add_filter_args(ap)
+    ap.add_argument(
+        "--state",
+        type=Path,
+        default=Path("artifacts/run_plan_state.json"),
+        help="Resumable state file (completed runs are skipped on the next invocation)",
+    )
+    ap.add_argument(
+        "--serials",
+        default=None,
+        help=(
+            "Comma-separated pool of device serials; plan runs are spread over the devices in parallel. "
+            "Runs sharing a device_group (plan column; default: the A/B family, e.g. S4 and S4-1) stay on one device."
+        ),
+    )
+    ap.add_argument(
+        "--log-dir",
+        type=Path,
+        default=Path("artifacts/run_plan_logs"),
+        help="Per-device run logs with --serials (<serial>.log)",
+    )
+    ap.add_argument(
+        "--plan-order",
+        action="store_true",
+        help="Keep plan order exactly (default: CPU-load rows run after all other rows on each device)",
+    )
+    ap.add_argument("--post-jobs", type=int, default=1, help="Background post-processing worker processes")
+    ap.add_argument("--retry-failed", action="store_true", help="Run plan entries recorded as failed again")
+    ap.add_argument("--dry-run", action="store_true", help="Print what would run and exit")
+    args, passthrough = ap.parse_known_args()
+
+    serials: list[str | None] = [None]
+    if args.serials is not None and str(args.serials).strip() != "":
+        if "--serial" in passthrough:
+            raise SystemExit("use either --serials or --serial, not both")
+        serials = list(dict.fromkeys(s.strip() for s in str(args.serials).split(",") if s.strip()))
+    multi = serials != [None]
+
+    only_plan_ids, scenario_prefix = plan_filters(args)
+    runs = load_plan_runs(args.plan, only_plan_ids=only_plan_ids, scenario_prefix=scenario_prefix)
+    state = load_state(args.state)
+    state["plan"] = str(args.plan)
+    entries: dict[str, dict] = state["runs"]
+
+    todo: list[PlanRun] = []
+    for run in runs:
+        e = entries.get(run.key) or {}
+        status = e.get("status", "")
+        if status == "done" or (status == "failed" and not args.retry_failed):
+            print(f"skip {run.key}: {status}")
+            continue
+        todo.append(run)
+
+    # Keep device groups on the device that already ran part of them (earlier invocations).
+    owner: dict[str, str | None] = {}
+    for run in runs:
+        s = (entries.get(run.key) or {}).get("serial")
+        if multi and s in serials and run.device_group not in owner:
+            owner[run.device_group] = s
+    post_only = [r for r in todo if (entries.get(r.key) or {}).get("status") == "sampled"]
+    queue = dispatch_order([r for r in todo if r not in post_only], plan_order=bool(args.plan_order))
+
+    if args.dry_run:
+        for run in post_only:
+            print(f"post-process only {run.key}")
+        # Simulate the scheduler with every run taking its planned duration.
+        free_at = {s: 0.0 for s in serials}
+        sim_owner = dict(owner)
+        sim_queue = list(queue)
+        while sim_queue:
+            for s in sorted(free_at, key=lambda k: free_at[k]):
+                run = pick_run(s, sim_queue, sim_owner)
+                if run is not None:
+                    break
+            else:
+                break
+            sim_queue.remove(run)
+            sim_owner.setdefault(run.device_group, s)
+            dur = float(run.args[run.args.index("--duration") + 1])
+            where = f"[{s}] " if multi else ""
+            print(f"{where}+{free_at[s] / 60:.0f}min run {run.key}: pipeline_run.py {' '.join(run.args + passthrough)}")
+            free_at[s] += dur
+        if free_at and queue:
+            print(f"[plan] estimated sampling wall time: {max(free_at.values()) / 60:.0f} min on {len(serials)} device(s)")
+        return 0
+
+    if multi and queue:
+        # Parse the power profile / map policies once here so that device workers only see cache hits.
+        first = queue[0]
+        run_setup(build_parser().parse_args([*first.args, *passthrough, "--serial", str(serials[0])]))
+
+    used_ids = {str((e.get("sampled") or {}).get("run_id") or "") for e in entries.values()}
+    device_jobs: dict[Future, tuple[str, str | None]] = {}
+    busy: set[str | None] = set()
+    post_jobs: dict[Future[str], str] = {}
+    n_failed = 0
+    n_total = len(queue)
+
+    def finish_post(fut: Future[str]) -> None:
+        nonlocal n_failed
+        key = post_jobs.pop(fut)
+        e = entries[key]
+        try:
+            e["enriched_csv"] = fut.result()
+            e["status"] = "done"
+            print(f"[plan] post-processed {key} -> {e['enriched_csv']}")
+        except BaseException as ex:  # SystemExit from a stage lands here too
+            e["status"] = "sampled"  # device data is kept; the next invocation retries post-processing
+            e["error"] = f"post: {type(ex).__name__}: {ex}"
+            n_failed += 1
+            print(f"WARN: post-processing {key} failed: {ex}")
+        e["finished_at"] = _now()
+        save_state(args.state, state)
+
+    def finish_device(fut: Future, post_pool: ProcessPoolExecutor) -> None:
+        nonlocal n_failed
+        key, serial = device_jobs.pop(fut)
+        busy.discard(serial)
+        e = entries[key]
+        where = f" on {serial}" if multi else ""
+        try:
+            sampled, stage_results, profile = fut.result()
+        except BaseException as ex:
+            e["status"] = "failed"
+            e["error"] = f"device: {type(ex).__name__}: {ex}"
+            n_failed += 1
+            save_state(args.state, state)
+            print(f"WARN: {key} failed during the device phase{where}: {ex}")
+            return
+        e["status"] = "sampled"
+        e["sampled"] = _sampled_to_json(sampled)
+        e["stage_results"] = [asdict(r) for r in stage_results]
+        e["profile"] = profile
+        e["sampled_at"] = _now()
+        save_state(args.state, state)
+        print(f"[plan] sampled {key}{where} -> {sampled.run_csv}")
+        submit_post(key, post_pool)
+
+    def submit_post(key: str, post_pool: ProcessPoolExecutor) -> None:
+        e = entries[key]
+        post_jobs[
+            post_pool.submit(_post_worker, e["argv"], e["sampled"], e.get("stage_results", []), e.get("profile", []))
+        ] = key
+
+    device_pool = ProcessPoolExecutor(max_workers=len(serials))
+    post_pool = ProcessPoolExecutor(max_workers=max(1, int(args.post_jobs)))
+    with device_pool, post_pool:
+        for run in post_only:
+            print(f"[plan] {run.key}: device phase already done; post-processing only")
+            submit_post(run.key, post_pool)
+        try:
+            while queue or device_jobs or post_jobs:
+                for serial in serials:
+                    if serial in busy:
+                        continue
+                    run = pick_run(serial, queue, owner)
+                    if run is None:
+                        continue
+                    queue.remove(run)
+                    owner.setdefault(run.device_group, serial)
+                    run_id = _alloc_run_id(used_ids)
+                    argv = [*run.args, *passthrough, "--run-id", run_id]
+                    if serial is not None:
+                        argv += ["--serial", serial]
+                    log_path = args.log_dir / f"{re.sub(r'[^A-Za-z0-9_.-]', '_', serial)}.log" if serial else None
+                    entries[run.key] = {
+                        "status": "running",
+                        "plan_id": run.plan_id,
+                        "scenario": run.scenario,
+                        "repeat_index": run.repeat_index,
+                        "serial": serial,
+                        "log": str(log_path) if log_path is not None else None,
+                        "argv": argv,
+                        "started_at": _now(),
+                    }
+                    save_state(args.state, state)
+                    i = n_total - len(queue)
+                    where = f" on {serial}" if multi else ""
+                    print(f"[plan] {i}/{n_total} {run.key}{where}: sampling (run_id={run_id}, post jobs pending={len(post_jobs)})")
+                    device_jobs[device_pool.submit(_device_phase, argv, log_path)] = (run.key, serial)
+                    busy.add(serial)
+
+                if not device_jobs and not post_jobs:
+                    break  # nothing left that any device may take
+                done, _ = wait([*device_jobs, *post_jobs], return_when=FIRST_COMPLETED)
+                for fut in done:
+                    if fut in device_jobs:
+                        finish_device(fut, post_pool)
+                    else:
+                        finish_post(fut)
+        except KeyboardInterrupt:
+            for key, _ in device_jobs.values():
+                entries[key]["status"] = "failed"
+                entries[key]["error"] = "interrupted"
+            save_state(args.state, state)
+            raise
+
+    n_done = sum(1 for r in runs if (entries.get(r.key) or {}).get("status") == "done")
+    print(f"[plan] {n_done}/{len(runs)} runs done; state: {args.state}")
+    # Where the wall time of the plan's runs went (per stage; per span with --profile).
+    done = [entries[r.key] for r in runs if (entries.get(r.key) or {}).get("status") == "done"]
+    timings = [
+        Path("artifacts") / "reports" / Path(d["enriched_csv"]).stem / STAGE_TIMINGS_NAME
+        for d in done
+        if d.get("enriched_csv")
+    ]
+    timings = [t for t in timings if t.exists()]
+    if timings:
+        try:
+            out = write_stage_timings_summary(timings, args.state.with_name(args.state.stem + "_stage_timings.csv"))
+            print(f"Wrote: {out} ({len(timings)} runs)")
+        except Exception as e:
+            print(f"WARN: could not write the stage timing summary: {e}")
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+from _bootstrap import ensure_repo_root_on_sys_path
+
+ensure_repo_root_on_sys_path()
+
+from mp_power.dag import STAGE_TIMINGS_NAME
+from mp_power.profiling import summarize_stage_timings
+from mp_power.profiling import write_stage_timings_summary
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(
+        description=(
+            "Aggregate stage_timings.json over runs: wall/CPU time per pipeline stage and, for runs made with "
+            "pipeline_run.py --profile, per profiled sub-stage span."
+        )
+    )
+    ap.add_argument("--reports-dir", type=Path, default=Path("artifacts/reports"))
+    ap.add_argument("--pattern", default="*", help="Report dir glob under --reports-dir (e.g. '20260*_S2*')")
+    ap.add_argument("--out", type=Path, default=Path("artifacts/reports/stage_timings_summary.csv"))
+    ap.add_argument("--top", type=int, default=15, help="Rows to print (0: none)")
+    args = ap.parse_args()
+
+    paths = sorted(args.reports_dir.glob(f"{args.pattern}/{STAGE_TIMINGS_NAME}"))
+    if not paths:
+        raise SystemExit(f"no {STAGE_TIMINGS_NAME} under {args.reports_dir}/{args.pattern}")
+    out = write_stage_timings_summary(paths, args.out)
+    print(f"Wrote: {out} ({len(paths)} runs)")
+
+    if args.top > 0:
+        for r in summarize_stage_timings(paths)[: int(args.top)]:
+            cpu = "" if r["cpu_s_mean"] is None else f" cpu={r['cpu_s_mean']:.2f}s"
+            print(
+                f"  {r['kind']:5s} {r['name']:<40s} runs={r['runs']:<4d} "
+                f"median={r['wall_s_median']:.2f}s p90={r['wall_s_p90']:.2f}s{cpu}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
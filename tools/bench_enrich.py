@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+
+def _ensure_repo_root_on_sys_path() -> None:
+    # Repo root is the parent of this folder (tools/).
+    root = Path(__file__).resolve().parents[1]
+    root_str = str(root)
+    if root_str not in sys.path:
+        sys.path.insert(0, root_str)
+
+
+_ensure_repo_root_on_sys_path()
+
+from mp_power.pipeline_ops import ENRICH_ENGINES
+from mp_power.pipeline_ops import enrich_run_with_cpu_energy
+
+
+def make_synthetic_inputs(
+    out_dir: Path, *, rows: int, policies: list[int], n_freqs: int, seed: int = 0, ts_ns: bool = False
+) -> dict[str, Path]:
+    """Run CSV + policy map + cluster tables + power_profile.json shaped like the sampler's output.
+
+    Includes the awkward cases the engines must agree on: off-table frequencies, blank/garbage
+    voltage and charge cells, unparseable timestamps, display OFF rows and brightness gaps.
+    """
+    rng = np.random.default_rng(seed)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    mapping = {str(p): i for i, p in enumerate(policies)}
+    map_json = out_dir / "policy_cluster_map.json"
+    map_json.write_text(json.dumps({"mapping_policy_to_cluster": mapping}, indent=2) + "\n", encoding="utf-8")
+
+    freqs_by_policy: dict[int, list[int]] = {}
+    for i, p in enumerate(policies):
+        freqs = sorted(int(f) for f in rng.choice(np.arange(300_000, 3_000_000, 19_200), size=n_freqs, replace=False))
+        freqs_by_policy[p] = freqs
+        with (out_dir / f"cluster{i}_freq_power.csv").open("w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["freq_khz", "power_ma"])
+            for fr in freqs:
+                w.writerow([fr, round(5.0 + fr / 1e4 * (1 + i), 2)])
+
+    profile_json = out_dir / "power_profile.json"
+    profile_json.write_text(json.dumps({"items_ma": {"screen.on": 60.5, "screen.full": 310.0}}) + "\n", encoding="utf-8")
+
+    header = ["ts_pc"] + (["ts_ns"] if ts_ns else [])
+    header += ["battery_voltage_mv", "charge_counter_uAh", "brightness", "display_state"]
+    freq_cols: list[tuple[str, int]] = []
+    for p in policies:
+        # One extra off-table OPP per policy exercises the nearest-frequency path.
+        for fr in freqs_by_policy[p] + [freqs_by_policy[p][len(freqs_by_policy[p]) // 2] + 7]:
+            freq_cols.append((f"cpu_p{p}_freq{fr}_dt", p))
+    header += [c for c, _ in freq_cols]
+
+    run_csv = out_dir / "run.csv"
+    t = datetime(2026, 1, 1, 12, 0, 0)
+    charge = 4_700_000
+    with run_csv.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for i in range(rows):
+            t += timedelta(seconds=float(rng.choice([1.0, 2.0, 2.0, 2.5])))
+            charge -= int(rng.integers(0, 400))
+            ts = t.isoformat(timespec="milliseconds") if i % 997 else "n/a"
+            volt = "" if i % 501 == 7 else (f"{3800 + rng.random() * 400:.1f}" if i % 3 else str(3900 + i % 300))
+            ch = "x" if i % 733 == 5 else str(charge)
+            bright = "" if i % 211 == 3 else str(int(rng.integers(0, 256)))
+            disp = "OFF" if i % 50 < 5 else ("ON" if i % 7 else "")
+            row = [ts] + ([str(int(t.timestamp() * 1e9)) if i % 997 else ""] if ts_ns else []) + [volt, ch, bright, disp]
+            for _, p in freq_cols:
+                row.append(str(int(rng.integers(0, 2000))) if rng.random() < 0.3 else "0")
+            w.writerow(row)
+
+    return {"run_csv": run_csv, "map_json": map_json, "clusters_dir": out_dir, "profile_json": profile_json}
+
+
+def compare_outputs(a: Path, b: Path, tol: float = 1e-3) -> tuple[int, float, list[str]]:
+    """(n_mismatched_cells, max_abs_numeric_diff, sample mismatches) between two enriched CSVs."""
+    with a.open("r", encoding="utf-8", newline="") as fa, b.open("r", encoding="utf-8", newline="") as fb:
+        ra, rb = list(csv.reader(fa)), list(csv.reader(fb))
+    if ra[0] != rb[0]:
+        return 1, float("inf"), ["header differs"]
+    bad = 0
+    max_diff = 0.0
+    samples: list[str] = []
+    for i, (x, y) in enumerate(zip(ra[1:], rb[1:]), start=1):
+        for col, u, v in zip(ra[0], x, y):
+            if u == v:
+                continue
+            try:
+                d = abs(float(u) - float(v))
+            except ValueError:
+                d = float("inf")
+            max_diff = max(max_diff, d)
+            if d > tol:
+                bad += 1
+                if len(samples) < 5:
+                    samples.append(f"row {i} {col}: {u!r} vs {v!r}")
+    if len(ra) != len(rb):
+        bad += abs(len(ra) - len(rb))
+        samples.append(f"row count {len(ra)} vs {len(rb)}")
+    return bad, max_diff, samples
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size of this process in MiB (None where it cannot be measured)."""
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+    except Exception:
+        pass
+    try:
+        import psutil  # type: ignore[import-not-found]
+
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024.0 * 1024.0)
+    except Exception:
+        return None
+
+
+def parse_mode(mode: str) -> dict[str, object]:
+    """'rows' | 'vectorized' | 'chunked:N' | 'arrow:N' -> enrich_run_with_cpu_energy kwargs."""
+    name, _, n = mode.partition(":")
+    if name in ENRICH_ENGINES and not n:
+        return {"engine": name}
+    if name in ("chunked", "arrow") and n:
+        return {"engine": "vectorized", "chunk_rows": int(n), "chunk_reader": "arrow" if name == "arrow" else "pandas"}
+    raise ValueError(f"bad mode: {mode}")
+
+
+def _run_child(args: argparse.Namespace) -> int:
+    # One mode per process so ru_maxrss is that mode's peak, not the max over everything before it.
+    t0 = time.perf_counter()
+    enrich_run_with_cpu_energy(
+        run_csv=args.run_csv,
+        out_csv=args.out,
+        map_json=args.map_json,
+        clusters_dir=args.clusters_dir,
+        profile_json=args.profile_json,
+        **parse_mode(args.child),  # type: ignore[arg-type]
+    )
+    print(json.dumps({"seconds": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb()}))
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark + cross-check enrich_run_with_cpu_energy engines")
+    ap.add_argument("--rows", type=int, default=20000, help="Synthetic run rows (ignored with --run-csv)")
+    ap.add_argument("--policies", default="0,4,7")
+    ap.add_argument("--freqs-per-policy", type=int, default=24)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument(
+        "--modes",
+        default="rows,vectorized,chunked:5000",
+        help="Comma list of rows | vectorized | chunked:N | arrow:N (N = chunk rows); outputs are checked against 'rows'",
+    )
+    ap.add_argument("--ts-ns", action="store_true", help="Synthetic run also carries the sampler's ts_ns column")
+    ap.add_argument("--run-csv", type=Path, default=None, help="Benchmark a real run CSV instead of synthetic data")
+    ap.add_argument("--map-json", type=Path, default=Path("artifacts/android/power_profile/policy_cluster_map.json"))
+    ap.add_argument("--clusters-dir", type=Path, default=Path("artifacts/android/power_profile"))
+    ap.add_argument("--profile-json", type=Path, default=Path("artifacts/android/power_profile/power_profile.json"))
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    ap.add_argument("--out", type=Path, default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        return _run_child(args)
+
+    modes = [m.strip() for m in str(args.modes).split(",") if m.strip()]
+    for m in modes:
+        parse_mode(m)
+    if "rows" not in modes:
+        modes.insert(0, "rows")
+
+    with tempfile.TemporaryDirectory(prefix="bench_enrich_") as tmp:
+        tmp_dir = Path(tmp)
+        if args.run_csv is not None:
+            inputs = {
+                "run_csv": args.run_csv,
+                "map_json": args.map_json,
+                "clusters_dir": args.clusters_dir,
+                "profile_json": args.profile_json,
+            }
+        else:
+            policies = [int(p) for p in str(args.policies).split(",") if p.strip()]
+            inputs = make_synthetic_inputs(
+                tmp_dir / "in", rows=args.rows, policies=policies, n_freqs=args.freqs_per_policy, ts_ns=args.ts_ns
+            )
+
+        with inputs["run_csv"].open("r", encoding="utf-8") as f:
+            n_rows = sum(1 for _ in f) - 1
+
+        outs: dict[str, Path] = {}
+        failed = 0
+        for mode in modes:
+            out = tmp_dir / f"enriched_{mode.replace(':', '_')}.csv"
+            times: list[float] = []
+            rss: list[float] = []
+            for _ in range(max(1, int(args.repeat))):
+                cmd = [sys.executable, str(Path(__file__).resolve()), "--child", mode, "--out", str(out)]
+                cmd += ["--run-csv", str(inputs["run_csv"]), "--map-json", str(inputs["map_json"])]
+                cmd += ["--clusters-dir", str(inputs["clusters_dir"]), "--profile-json", str(inputs["profile_json"])]
+                proc = subprocess.run(cmd, capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(f"{mode:>14}: FAILED\n{proc.stderr.strip()}")
+                    break
+                res = json.loads(proc.stdout.strip().splitlines()[-1])
+                times.append(float(res["seconds"]))
+                if res.get("peak_rss_mb") is not None:
+                    rss.append(float(res["peak_rss_mb"]))
+            if not times:
+                failed += 1
+                continue
+            outs[mode] = out
+            best = min(times)
+            rss_s = f"{max(rss):.0f}MiB" if rss else "n/a"
+            print(
+                f"{mode:>14}: best={best:.3f}s median={float(np.median(times)):.3f}s "
+                f"rows/s={n_rows / best:,.0f} peak_rss={rss_s}"
+            )
+
+        bad_total = 0
+        for mode, out in outs.items():
+            if mode == "rows" or "rows" not in outs:
+                continue
+            bad, max_diff, samples = compare_outputs(outs["rows"], out)
+            bad_total += bad
+            print(f"cross-check rows vs {mode}: mismatched_cells={bad} max_abs_diff={max_diff:.3g} (tol 1e-3)")
+            for s in samples:
+                print(f"  {s}")
+        return 1 if (bad_total or failed) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())